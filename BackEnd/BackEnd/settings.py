@@ -10,12 +10,16 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
+import sys
 from pathlib import Path
 from datetime import timedelta
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
+TESTING = len(sys.argv) > 1 and sys.argv[1] == 'test'
+
 
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/5.2/howto/deployment/checklist/
@@ -125,6 +129,44 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# Use a shared backend (Redis/Memcached) in production so that every worker
+# sees the same RBAC permission sets and invalidations.
+
+# Permission sets, teacher scopes and token versions are invalidated through
+# the cache, so a deployment with more than one worker process must share it:
+# set CACHE_URL to redis://host:6379/0 or memcached://host:11211. Without it
+# each process keeps its own local-memory cache (fine for a single process).
+CACHE_URL = os.environ.get('CACHE_URL', '')
+if CACHE_URL.startswith(('redis://', 'rediss://')):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': CACHE_URL,
+        }
+    }
+elif CACHE_URL.startswith('memcached://'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.memcached.PyMemcacheCache',
+            'LOCATION': CACHE_URL.removeprefix('memcached://'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'university',
+        }
+    }
+
+# Seconds a compiled RBAC permission set stays cached. Grant changes
+# invalidate entries immediately via signals; this only bounds staleness.
+# Capped at 30 seconds when the cache is not shared between workers.
+RBAC_PERMISSION_CACHE_TIMEOUT = 3600
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -155,6 +197,10 @@ USE_I18N = True
 
 USE_TZ = True
 
+# Seconds a password reset token stays valid (tokens are also single use).
+# Expired rows are removed by `manage.py purge_reset_tokens`.
+PASSWORD_RESET_TIMEOUT = 60 * 60
+
 # Email settings for password reset
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'  # For development
 # EMAIL_HOST = 'smtp.gmail.com'
@@ -169,6 +215,9 @@ EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'  # For developm
 
 STATIC_URL = 'static/'
 
+MEDIA_URL = 'media/'
+MEDIA_ROOT = BASE_DIR / 'media'
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -219,15 +268,63 @@ LOGGING = {
     },
 }
 
+# Audit log pipeline (see university/audit.py). Entries are queued in-process
+# and written in batches by a background thread; set ASYNC to False to write
+# each entry synchronously inside the request.
+AUDIT_LOG = {
+    'ASYNC': not TESTING,
+    'BATCH_SIZE': 200,
+    'FLUSH_INTERVAL': 1.0,  # seconds
+    'QUEUE_SIZE': 10000,
+    'ENQUEUE_TIMEOUT': 0.05,  # seconds a full queue may block a request
+    'SPOOL_FILE': BASE_DIR / 'logs' / 'audit_spool.jsonl',
+}
+
+# Background exports (see university/export_jobs.py). Exports larger than
+# ASYNC_THRESHOLD rows, or requested with ?async=true, return 202 and are
+# rendered by WORKERS threads; results are kept for RESULT_TTL seconds and
+# removed by `manage.py purge_exports`.
+EXPORT_JOBS = {
+    'ASYNC': not TESTING,
+    'WORKERS': 2,
+    'ASYNC_THRESHOLD': 5000,  # rows
+    'RESULT_TTL': 24 * 3600,  # seconds
+    'STALE_AFTER': 3600,  # seconds before an unfinished job is considered lost
+}
+
+# Processes used to render batch student profile PDFs; None uses every core.
+PROFILE_PDF_WORKERS = 1 if TESTING else None
+# Batches smaller than this render in-process: starting the workers (each
+# imports reportlab) costs more than rendering a few PDFs.
+PROFILE_PDF_PARALLEL_THRESHOLD = 50
+
+# Retention for the audit_logs table; older rows are moved to monthly
+# compressed JSONL files by `manage.py archive_audit_logs`.
+AUDIT_LOG_RETENTION_DAYS = 365
+AUDIT_LOG_ARCHIVE_DIR = BASE_DIR / 'logs' / 'audit_archive'
+
+# Login throttling (see university/throttling.py). Failed attempts are
+# counted per IP and per username/email over a sliding WINDOW (seconds).
+LOGIN_THROTTLE = {
+    'WINDOW': 300,
+    'IP_LIMIT': 20,
+    'IDENTIFIER_LIMIT': 5,
+    'SUMMARY_INTERVAL': 300,
+}
+
 # REST Framework settings
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'university.authentication.ClaimsJWTAuthentication',
         'rest_framework.authentication.TokenAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.AllowAny',
     ],
+    # Keyset pagination on the view's ordering; no COUNT(*) unless a client
+    # asks for one with ?include_count=true.
+    'DEFAULT_PAGINATION_CLASS': 'university.pagination.KeysetPagination',
+    'PAGE_SIZE': 50,
 }
 
 # Add template configuration
@@ -239,3 +336,22 @@ SIMPLE_JWT = {
     'ROTATE_REFRESH_TOKENS': True,
     'BLACKLIST_AFTER_ROTATION': True,
 }
+
+# Seconds between incremental syncs of the in-memory refresh-token blacklist.
+# Tokens blacklisted by another worker are visible immediately through a
+# shared cache backend, otherwise after at most this long.
+TOKEN_BLACKLIST_SYNC_INTERVAL = 30
+
+# Maximum age in seconds of the cached admin dashboard snapshot. Writes to
+# the summarised tables invalidate it earlier.
+DASHBOARD_SNAPSHOT_TTL = 300
+
+# Embed role, profile IDs and a permission bitmask in access tokens so that
+# authenticated requests are authorised without loading the user row.
+# Requires a shared cache (CACHE_URL); startup is refused without one.
+STATELESS_JWT_AUTH = False
+
+# Seconds a user's token version stays cached in stateless mode; capped at
+# the access token lifetime. Revocations are immediate through the shared
+# cache, this only bounds how long a lost invalidation can matter.
+JWT_TOKEN_VERSION_CACHE_TIMEOUT = 60
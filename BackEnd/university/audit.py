@@ -0,0 +1,272 @@
+"""
+Buffered audit log pipeline.
+
+``log_audit_action`` hands entries to an in-process bounded queue instead of
+inserting them inside the request. A daemon thread drains the queue and
+writes batches with ``bulk_create`` every ``FLUSH_INTERVAL`` seconds or as
+soon as ``BATCH_SIZE`` entries are waiting. When the queue is full callers
+wait up to ``ENQUEUE_TIMEOUT`` seconds before the entry is dropped.
+
+Entries still queued at interpreter exit are flushed by an ``atexit`` hook;
+batches that cannot be written because the database is unavailable are
+appended to a JSONL spool file and replayed the next time the writer starts.
+Entries rejected by the database itself (constraint violations) are dropped
+individually so one bad row cannot poison its batch.
+"""
+import atexit
+import gzip
+import json
+import logging
+import os
+import queue
+import threading
+from datetime import datetime
+
+from django.conf import settings
+from django.db import DataError, IntegrityError, close_old_connections, transaction
+
+from .models import AuditLog
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'ASYNC': True,
+    'BATCH_SIZE': 200,
+    'FLUSH_INTERVAL': 1.0,
+    'QUEUE_SIZE': 10000,
+    'ENQUEUE_TIMEOUT': 0.05,
+    'SPOOL_FILE': None,
+}
+
+
+def audit_settings():
+    return {**DEFAULTS, **getattr(settings, 'AUDIT_LOG', {})}
+
+
+class AuditLogWriter:
+    def __init__(self, batch_size=200, flush_interval=1.0, queue_size=10000, enqueue_timeout=0.05, spool_file=None):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.enqueue_timeout = enqueue_timeout
+        self.spool_file = spool_file
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = None
+        self._pid = None
+        self.counters = {
+            'enqueued': 0,
+            'written': 0,
+            'backpressured': 0,
+            'dropped': 0,
+            'spooled': 0,
+            'flush_errors': 0,
+        }
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self.counters[name] += amount
+
+    @property
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counters)
+        stats['queued'] = self._queue.qsize()
+        return stats
+
+    def start(self):
+        """Start the drain thread in this process (idempotent, fork-aware)."""
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+                return
+            self._pid = os.getpid()
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name='audit-log-writer', daemon=True)
+            self._thread.start()
+        atexit.register(self.shutdown)
+
+    def submit(self, entry):
+        """Queue an AuditLog field dict; returns False if it had to be dropped."""
+        try:
+            self._queue.put_nowait(entry)
+        except queue.Full:
+            self._count('backpressured')
+            self._wakeup.set()
+            try:
+                self._queue.put(entry, timeout=self.enqueue_timeout)
+            except queue.Full:
+                self._count('dropped')
+                return False
+        self._count('enqueued')
+        if self._queue.qsize() >= self.batch_size:
+            self._wakeup.set()
+        return True
+
+    def _drain(self):
+        batch = []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def flush(self):
+        """Write everything currently queued; returns the number of entries handled."""
+        handled = 0
+        with self._flush_lock:
+            while True:
+                batch = self._drain()
+                if not batch:
+                    return handled
+                self._write(batch)
+                handled += len(batch)
+
+    def _write(self, batch):
+        try:
+            with transaction.atomic():
+                AuditLog.objects.bulk_create([AuditLog(**entry) for entry in batch])
+            self._count('written', len(batch))
+        except (IntegrityError, DataError):
+            if len(batch) == 1:
+                # A malformed entry would fail again on every replay.
+                logger.exception('Dropping unwritable audit log entry: %r', batch[0])
+                self._count('dropped')
+                return
+            for entry in batch:
+                self._write([entry])
+        except Exception:
+            logger.exception('Failed to write %d audit log entries', len(batch))
+            self._count('flush_errors')
+            self._spool(batch)
+
+    def _spool(self, batch):
+        if not self.spool_file:
+            self._count('dropped', len(batch))
+            return
+        try:
+            with open(self.spool_file, 'a', encoding='utf-8') as spool:
+                for entry in batch:
+                    spool.write(json.dumps(entry, default=str) + '\n')
+            self._count('spooled', len(batch))
+        except OSError:
+            logger.exception('Failed to spool %d audit log entries', len(batch))
+            self._count('dropped', len(batch))
+
+    def replay_spool(self):
+        """Re-queue entries left in the spool file by an earlier process."""
+        if not self.spool_file or not os.path.exists(self.spool_file):
+            return 0
+        replay_path = f'{self.spool_file}.replay'
+        os.replace(self.spool_file, replay_path)
+        replayed = 0
+        with open(replay_path, encoding='utf-8') as spool:
+            batch = []
+            for line in spool:
+                entry = json.loads(line)
+                entry['timestamp'] = datetime.fromisoformat(entry['timestamp'])
+                batch.append(entry)
+                if len(batch) >= self.batch_size:
+                    self._write(batch)
+                    replayed += len(batch)
+                    batch = []
+            if batch:
+                self._write(batch)
+                replayed += len(batch)
+        os.remove(replay_path)
+        return replayed
+
+    def _run(self):
+        try:
+            self.replay_spool()
+        except Exception:
+            logger.exception('Failed to replay audit log spool file')
+        while not self._stopping.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            close_old_connections()
+            self.flush()
+        close_old_connections()
+
+    def shutdown(self):
+        """Stop the drain thread and flush whatever is still queued."""
+        self._stopping.set()
+        self._wakeup.set()
+        if self._thread is not None and self._pid == os.getpid():
+            self._thread.join(timeout=5)
+        self.flush()
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_writer():
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                config = audit_settings()
+                _writer = AuditLogWriter(
+                    batch_size=config['BATCH_SIZE'],
+                    flush_interval=config['FLUSH_INTERVAL'],
+                    queue_size=config['QUEUE_SIZE'],
+                    enqueue_timeout=config['ENQUEUE_TIMEOUT'],
+                    spool_file=config['SPOOL_FILE'],
+                )
+    _writer.start()
+    return _writer
+
+
+def record(entry):
+    """Persist an AuditLog field dict, buffered unless ``AUDIT_LOG['ASYNC']`` is off."""
+    if audit_settings()['ASYNC']:
+        get_writer().submit(entry)
+    else:
+        AuditLog.objects.create(**entry)
+
+
+def writer_stats():
+    return _writer.stats if _writer is not None else None
+
+
+def _archive_row(row):
+    return {**row, 'timestamp': row['timestamp'].isoformat()}
+
+
+def archive_audit_logs(before, archive_dir, batch_size=5000):
+    """
+    Move audit rows older than ``before`` into per-month compressed JSONL
+    files (``audit_logs_YYYY-MM.jsonl.gz``) under ``archive_dir``.
+
+    Rows are read oldest first through the timestamp index and deleted in
+    batches once written, so each batch holds the write lock only briefly.
+    Delivery is at-least-once: a crash between writing and deleting a batch
+    leaves those rows in both places.
+    """
+    os.makedirs(archive_dir, exist_ok=True)
+    fields = [field.attname for field in AuditLog._meta.concrete_fields]
+    archived = 0
+    while True:
+        rows = list(
+            AuditLog.objects.filter(timestamp__lt=before)
+            .order_by('timestamp', 'id')
+            .values(*fields)[:batch_size]
+        )
+        if not rows:
+            return archived
+
+        by_month = {}
+        for row in rows:
+            by_month.setdefault(row['timestamp'].strftime('%Y-%m'), []).append(row)
+        for month, month_rows in by_month.items():
+            path = os.path.join(archive_dir, f'audit_logs_{month}.jsonl.gz')
+            with gzip.open(path, 'at', encoding='utf-8') as archive:
+                for row in month_rows:
+                    archive.write(json.dumps(_archive_row(row)) + '\n')
+
+        with transaction.atomic():
+            AuditLog.objects.filter(id__in=[row['id'] for row in rows]).delete()
+        archived += len(rows)
@@ -0,0 +1,189 @@
+"""
+Stateless JWT mode.
+
+With ``STATELESS_JWT_AUTH`` enabled, access tokens carry the user's role,
+profile IDs and a bitmask of their RBAC permissions, so authenticating and
+authorising a request needs neither the ``users`` row nor the M2M tables.
+Tokens also carry the user's ``token_version``; bumping it (on deactivation,
+password resets or grant changes) revokes every outstanding access token and
+forces the client through the refresh endpoint, which re-issues fresh claims.
+
+Token versions are cached for ``token_version_timeout()`` seconds (at most
+the access token lifetime), and revocations reach other workers through the
+cache, so this mode requires a shared cache backend; see checks.py.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F
+from rest_framework.permissions import BasePermission
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+from .models import User, Permission
+from .rbac import get_user_permissions
+from .tokens import CachedBlacklistRefreshToken
+
+TOKEN_VERSION_KEY = 'jwt:token_version:{user_id}'
+
+# Bit positions follow PERMISSION_CHOICES, so new permissions must only ever
+# be appended to that list.
+PERMISSION_BITS = {name: bit for bit, (name, _) in enumerate(Permission.PERMISSION_CHOICES)}
+
+
+def stateless_enabled():
+    return getattr(settings, 'STATELESS_JWT_AUTH', False)
+
+
+def encode_permissions(names):
+    mask = 0
+    for name in names:
+        bit = PERMISSION_BITS.get(name)
+        if bit is not None:
+            mask |= 1 << bit
+    return mask
+
+
+def decode_permissions(mask):
+    return frozenset(name for name, bit in PERMISSION_BITS.items() if mask >> bit & 1)
+
+
+def token_version_timeout():
+    """Seconds a token version stays cached; never longer than an access token lives."""
+    timeout = getattr(settings, 'JWT_TOKEN_VERSION_CACHE_TIMEOUT', 60)
+    return min(timeout, int(api_settings.ACCESS_TOKEN_LIFETIME.total_seconds()))
+
+
+def get_token_version(user_id):
+    """Current token version for ``user_id``, or ``None`` if the user is gone."""
+    key = TOKEN_VERSION_KEY.format(user_id=user_id)
+    version = cache.get(key)
+    if version is None:
+        version = User.objects.filter(pk=user_id).values_list('token_version', flat=True).first()
+        version = -1 if version is None else version
+        cache.set(key, version, token_version_timeout())
+    return None if version < 0 else version
+
+
+def revoke_user_tokens(*user_ids):
+    """Invalidate every access token issued so far to the given users."""
+    if not user_ids:
+        return
+    User.objects.filter(pk__in=user_ids).update(token_version=F('token_version') + 1)
+    cache.delete_many([TOKEN_VERSION_KEY.format(user_id=user_id) for user_id in user_ids])
+
+
+def add_user_claims(token, user):
+    token['role'] = user.role
+    token['student_profile'] = user.student_profile_id
+    token['teacher_profile'] = user.teacher_profile_id
+    token['perms'] = encode_permissions(get_user_permissions(user))
+    token['ver'] = user.token_version
+    return token
+
+
+def issue_tokens(user):
+    """Return the ``refresh``/``access`` pair handed out at login."""
+    refresh = CachedBlacklistRefreshToken.for_user(user)
+    access = refresh.access_token
+    if stateless_enabled():
+        add_user_claims(access, user)
+    return {'refresh': str(refresh), 'access': str(access)}
+
+
+class ClaimsUser:
+    """
+    Request user rebuilt from access-token claims.
+
+    Authorisation attributes are answered from the token. Anything else
+    (``username``, ``save()``, ...) transparently loads the ``User`` row on
+    first access, so views that need the full model keep working.
+    """
+    is_authenticated = True
+    is_anonymous = False
+    is_active = True
+
+    _claim_fields = ('id', 'role', 'student_profile_id', 'teacher_profile_id', '_permissions', '_user')
+
+    def __init__(self, token):
+        object.__setattr__(self, 'id', int(token[api_settings.USER_ID_CLAIM]))
+        object.__setattr__(self, 'role', token['role'])
+        object.__setattr__(self, 'student_profile_id', token.get('student_profile'))
+        object.__setattr__(self, 'teacher_profile_id', token.get('teacher_profile'))
+        object.__setattr__(self, '_permissions', decode_permissions(token['perms']))
+        object.__setattr__(self, '_user', None)
+
+    @property
+    def pk(self):
+        return self.id
+
+    def has_permission(self, permission_name):
+        return permission_name in self._permissions
+
+    def get_all_permissions(self, obj=None):
+        return set(self._permissions)
+
+    def get_user(self):
+        if self._user is None:
+            object.__setattr__(self, '_user', User.objects.get(pk=self.id))
+        return self._user
+
+    def __getattr__(self, name):
+        if name.startswith('__'):
+            raise AttributeError(name)
+        return getattr(self.get_user(), name)
+
+    def __setattr__(self, name, value):
+        if name in self._claim_fields:
+            object.__setattr__(self, name, value)
+        else:
+            setattr(self.get_user(), name, value)
+
+    def __eq__(self, other):
+        return getattr(other, 'pk', None) == self.id
+
+    def __hash__(self):
+        return hash(self.id)
+
+    def __str__(self):
+        return f"{self.id} - {self.role}"
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    """
+    JWT authentication that serves the user from token claims when present.
+
+    Tokens without embedded claims (stateless mode off, or issued before it
+    was enabled) fall back to the regular database lookup.
+    """
+
+    def get_user(self, validated_token):
+        if 'perms' not in validated_token:
+            return super().get_user(validated_token)
+
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        if user_id is None:
+            raise InvalidToken('Token contained no recognizable user identification')
+
+        if validated_token.get('ver') != get_token_version(user_id):
+            raise InvalidToken('Token has been revoked')
+
+        return ClaimsUser(validated_token)
+
+
+def require_permission(permission_name):
+    """
+    Build a DRF permission class granting access to users holding
+    ``permission_name``. With stateless tokens this is answered from the
+    ``perms`` claim without touching the database.
+    """
+
+    class HasRBACPermission(BasePermission):
+        message = 'Permission denied'
+
+        def has_permission(self, request, view):
+            user = request.user
+            return bool(user and user.is_authenticated and user.has_permission(permission_name))
+
+    HasRBACPermission.__name__ = f'HasRBACPermission_{permission_name}'
+    return HasRBACPermission
@@ -0,0 +1,19 @@
+from django.conf import settings
+from django.core.checks import Error, register
+
+from .rbac import cache_is_shared
+
+
+@register()
+def stateless_jwt_cache_check(app_configs, **kwargs):
+    """
+    Stateless JWT revocation travels through the cache; with a per-process
+    cache other workers would keep accepting revoked tokens.
+    """
+    if getattr(settings, 'STATELESS_JWT_AUTH', False) and not cache_is_shared():
+        return [Error(
+            'STATELESS_JWT_AUTH requires a cache shared by every worker.',
+            hint='Set CACHE_URL to a Redis or Memcached server, or turn STATELESS_JWT_AUTH off.',
+            id='university.E001',
+        )]
+    return []
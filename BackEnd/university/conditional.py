@@ -0,0 +1,235 @@
+"""
+Conditional GET (ETag) for the API viewsets.
+
+Every tracked model has version stamps in the ``change_stamps`` table: one
+for the whole model, one per object and one for bulk changes with unknown
+rows. A stamp is the time of the last change in nanoseconds, written by
+signals on save/delete/m2m changes (see signals.py) inside the transaction
+that makes the change, so every worker sees it as soon as the change is
+committed and a rolled back change leaves it alone. Changes to child rows
+such as a student's grades or enrollments also stamp their parent
+(``PARENTS``). Paths that bypass signals (``queryset.update()``,
+``bulk_create``) call ``touch``/``touch_all`` themselves.
+
+``ConditionalGetMixin`` builds the validators from those stamps alone:
+
+* list: the model stamp plus the stamps of every model its serializer reads
+  (taken from the serializer's eager-loading plan);
+* detail: the object and bulk stamps plus the same dependency stamps,
+  leaving out children, which already stamp the object.
+
+Both are combined with the stamps of what decides which rows the user may
+see (``access_keys``: their user row, roles and permissions and, for
+teachers, their assignments and schedules), the path and the negotiated
+media type. All stamps are read in one query; a request whose
+``If-None-Match`` still matches gets a 304 before the queryset is evaluated
+or anything is serialized. No ``Last-Modified`` is sent: access changes alter
+what a user may see without any data stamp moving, so a date alone could
+revalidate a response the user's scope no longer matches.
+"""
+import hashlib
+import time
+from collections import defaultdict
+from functools import lru_cache, partial, wraps
+
+from django.db.models import Prefetch
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import quote_etag
+
+from .models import (
+    User, Role, Permission, Teacher, Schedule, Grade, FinalGrade, Enrollment, Payment, Invoice,
+    StudentAcademicSummary, ChangeStamp,
+)
+
+VERSION_KEY = '{label}'
+OBJECT_VERSION_KEY = '{label}:{pk}'
+BULK_VERSION_KEY = '{label}:*'
+
+# child model -> foreign keys to the parents whose representation includes it
+PARENTS = {
+    Grade: ('student',),
+    FinalGrade: ('student',),
+    Enrollment: ('student',),
+    Payment: ('student',),
+    Invoice: ('student',),
+    StudentAcademicSummary: ('student',),
+}
+
+
+def _label(model):
+    return model._meta.label_lower
+
+
+def model_key(model):
+    return VERSION_KEY.format(label=_label(model))
+
+
+def object_key(model, pk):
+    return OBJECT_VERSION_KEY.format(label=_label(model), pk=pk)
+
+
+def bulk_key(model):
+    return BULK_VERSION_KEY.format(label=_label(model))
+
+
+def get_versions(keys):
+    """Return the stamps stored under ``keys``, in order; 0 for keys never stamped."""
+    stamps = dict(ChangeStamp.objects.filter(key__in=keys).values_list('key', 'version'))
+    return [stamps.get(key, 0) for key in keys]
+
+
+def _stamp(keys):
+    now = time.time_ns()
+    # Sorted so that concurrent writers lock the rows in the same order.
+    ChangeStamp.objects.bulk_create(
+        [ChangeStamp(key=key, version=now) for key in sorted(keys)],
+        update_conflicts=True, unique_fields=['key'], update_fields=['version'], batch_size=500,
+    )
+
+
+def touch(model, *pks):
+    """Record that the given rows of ``model`` changed."""
+    _stamp({model_key(model), *(object_key(model, pk) for pk in pks)})
+
+
+def touch_all(model):
+    """Record that unknown rows of ``model`` changed, e.g. after ``queryset.update()``."""
+    _stamp({model_key(model), bulk_key(model)})
+
+
+def access_keys(user):
+    """
+    Stamps of everything that decides which rows ``user`` may see: their
+    grants (roles and custom permissions stamp the user row, see signals.py)
+    and, for teachers, their data scope (see rbac.compile_teacher_scope).
+    """
+    if user.pk is None:
+        return []
+    keys = [object_key(User, user.pk), model_key(Role), model_key(Permission)]
+    teacher_id = getattr(user, 'teacher_profile_id', None)
+    if teacher_id:
+        keys += [object_key(Teacher, teacher_id), model_key(Schedule)]
+    return keys
+
+
+def touch_instance(instance):
+    """Stamp ``instance`` and the parents it is listed under."""
+    touch_instances([instance])
+
+
+def touch_instances(instances):
+    """``touch_instance`` for many rows at once; for bulk write paths."""
+    changed = defaultdict(set)
+    parents = {}
+    for instance in instances:
+        model = type(instance)
+        if model not in parents:
+            parents[model] = [model._meta.get_field(name) for name in PARENTS.get(model, ())]
+        changed[model].add(instance.pk)
+        for field in parents[model]:
+            parent_pk = getattr(instance, field.attname)
+            if parent_pk is not None:
+                changed[field.related_model].add(parent_pk)
+    for model, pks in changed.items():
+        touch(model, *pks)
+
+
+def _lookup_paths(lookup):
+    if not isinstance(lookup, Prefetch):
+        return [lookup]
+    paths = [lookup.prefetch_through]
+    queryset = lookup.queryset
+    if queryset is not None and isinstance(queryset.query.select_related, dict):
+        stack = [(lookup.prefetch_through, queryset.query.select_related)]
+        while stack:
+            prefix, related = stack.pop()
+            for name, nested in related.items():
+                paths.append(f'{prefix}__{name}')
+                stack.append((f'{prefix}__{name}', nested))
+    return paths
+
+
+@lru_cache(maxsize=None)
+def dependency_models(model, serializer_class):
+    """Models other than ``model`` whose rows ``serializer_class`` renders."""
+    select, prefetch = serializer_class.eager_loading_plan() if hasattr(serializer_class, 'eager_loading_plan') else ((), ())
+    models = set()
+    for lookup in (*select, *prefetch):
+        for path in _lookup_paths(lookup):
+            current = model
+            for name in path.split('__'):
+                current = current._meta.get_field(name).related_model
+                models.add(current)
+    models.discard(model)
+    return frozenset(models)
+
+
+def children(model):
+    return {
+        child for child, fields in PARENTS.items()
+        if any(child._meta.get_field(field).related_model is model for field in fields)
+    }
+
+
+class ConditionalGetMixin:
+    """
+    ETag validators for ``list`` and ``retrieve`` (and extra
+    actions decorated with ``conditional_action``); unchanged resources get a
+    304 without being queried or serialized.
+    """
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(request, partial(super().list, request, *args, **kwargs))
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_response(request, partial(super().retrieve, request, *args, **kwargs))
+
+    def version_keys(self, dependencies=()):
+        model = self.queryset.model
+        models = dependency_models(model, self.get_serializer_class()) | set(dependencies)
+        pk = self.kwargs.get(self.lookup_url_kwarg or self.lookup_field)
+        if pk is None:
+            keys = [model_key(model)]
+        else:
+            keys = [object_key(model, pk), bulk_key(model)]
+            models -= children(model)
+        return keys + sorted(model_key(dependency) for dependency in models)
+
+    def conditional_response(self, request, respond, dependencies=()):
+        if request.method not in ('GET', 'HEAD'):
+            return respond()
+
+        user = request.user
+        versions = get_versions(access_keys(user) + self.version_keys(dependencies))
+        parts = [
+            request.get_full_path(),
+            getattr(request, 'accepted_media_type', ''),
+            user.pk, getattr(user, 'role', None),
+            getattr(user, 'student_profile_id', None), getattr(user, 'teacher_profile_id', None),
+            *versions,
+        ]
+        etag = quote_etag(hashlib.blake2b(repr(parts).encode(), digest_size=16).hexdigest())
+
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = respond()
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+            # Always revalidate: the validators are cheap, stale data is not.
+            patch_cache_control(response, private=True, no_cache=True)
+            patch_vary_headers(response, ['Authorization'])
+        return response
+
+
+def conditional_action(*dependencies):
+    """
+    Make an extra action of a ``ConditionalGetMixin`` viewset conditional;
+    ``dependencies`` are models it reads beyond the viewset's serializer.
+    Place it below ``@action``.
+    """
+    def decorator(method):
+        @wraps(method)
+        def wrapper(self, request, *args, **kwargs):
+            return self.conditional_response(request, partial(method, self, request, *args, **kwargs), dependencies)
+        return wrapper
+    return decorator
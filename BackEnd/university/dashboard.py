@@ -0,0 +1,74 @@
+"""
+Admin dashboard snapshot.
+
+The dashboard figures are computed with one conditional aggregation per
+table and cached as a single snapshot. The snapshot is dropped by signals
+when any table it summarises changes and is otherwise refreshed after
+``DASHBOARD_SNAPSHOT_TTL`` seconds.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+
+from .models import User, Student, Teacher, Class, Subject, Payment
+
+SNAPSHOT_KEY = 'dashboard:snapshot'
+
+
+def compute_snapshot():
+    from .serializers import UserSerializer, StudentSerializer
+
+    user_stats = User.objects.aggregate(
+        total_users=Count('id'),
+        active_users=Count('id', filter=Q(is_active=True)),
+        inactive_users=Count('id', filter=Q(is_active=False)),
+        admin_count=Count('id', filter=Q(role='Admin')),
+        teacher_count=Count('id', filter=Q(role='Teacher')),
+        student_count=Count('id', filter=Q(role='Student')),
+    )
+    student_stats = Student.objects.aggregate(
+        total_students=Count('pk'),
+        active_students=Count('pk', filter=Q(study_status='Active')),
+    )
+    teacher_stats = Teacher.objects.aggregate(
+        total_teachers=Count('pk', filter=Q(status='Active')),
+    )
+    financial_stats = Payment.objects.aggregate(
+        total_payments=Sum('amount', filter=Q(status='Paid')),
+        pending_payments=Sum('amount', filter=Q(status='Unpaid')),
+    )
+
+    recent_users = UserSerializer.setup_eager_loading(User.objects.order_by('-date_joined'))[:5]
+    recent_students = StudentSerializer.setup_eager_loading(Student.objects.order_by('-created_at'))[:5]
+
+    return {
+        'user_stats': user_stats,
+        'student_stats': student_stats,
+        'teacher_stats': teacher_stats,
+        'academic_stats': {
+            'total_classes': Class.objects.count(),
+            'total_subjects': Subject.objects.count(),
+        },
+        'financial_stats': {
+            'total_payments': float(financial_stats['total_payments'] or 0),
+            'pending_payments': float(financial_stats['pending_payments'] or 0),
+        },
+        'recent_activity': {
+            'recent_users': [dict(row) for row in UserSerializer(recent_users, many=True).data],
+            'recent_students': [dict(row) for row in StudentSerializer(recent_students, many=True).data],
+        },
+        'generated_at': timezone.now(),
+    }
+
+
+def get_snapshot():
+    snapshot = cache.get(SNAPSHOT_KEY)
+    if snapshot is None:
+        snapshot = compute_snapshot()
+        cache.set(SNAPSHOT_KEY, snapshot, getattr(settings, 'DASHBOARD_SNAPSHOT_TTL', 300))
+    return snapshot
+
+
+def invalidate_snapshot():
+    cache.delete(SNAPSHOT_KEY)
@@ -0,0 +1,142 @@
+"""
+Background export jobs.
+
+Exports that would tie up a request worker are recorded as ``ExportJob`` rows
+and rendered by a small in-process thread pool. Each job is given a
+``writer(fileobj)`` callable that renders into a temporary file; the result
+is stored under ``MEDIA_ROOT/exports`` and can be downloaded from
+``/exports/<id>/download/`` until ``RESULT_TTL`` seconds after it finished.
+
+There is no external broker: jobs still pending when the process exits are
+lost and are marked failed by ``purge_exports`` once they are older than
+``STALE_AFTER``. With ``ASYNC`` disabled (tests) jobs run inline.
+"""
+import logging
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from .models import ExportJob
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'ASYNC': True,
+    'WORKERS': 2,
+    'ASYNC_THRESHOLD': 5000,
+    'RESULT_TTL': 24 * 3600,
+    'STALE_AFTER': 3600,
+}
+
+
+def export_settings():
+    return {**DEFAULTS, **getattr(settings, 'EXPORT_JOBS', {})}
+
+
+class ExportJobRunner:
+    def __init__(self, workers=2, result_ttl=24 * 3600, run_async=True):
+        self.workers = workers
+        self.result_ttl = result_ttl
+        self.run_async = run_async
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def executor(self):
+        """Return this process's pool, creating it after a fork (idempotent)."""
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='export-job')
+            return self._executor
+
+    def submit(self, kind, filename, content_type, writer, user=None):
+        """Record a job and schedule ``writer`` to render it; returns the ``ExportJob``."""
+        job = ExportJob.objects.create(
+            kind=kind,
+            requested_by=user if user is not None and user.is_authenticated else None,
+            filename=filename,
+            content_type=content_type,
+            expires_at=timezone.now() + timedelta(seconds=self.result_ttl),
+        )
+        if self.run_async:
+            transaction.on_commit(lambda: self.executor().submit(self.run, job.pk, writer))
+        else:
+            self.run(job.pk, writer)
+            job.refresh_from_db()
+        return job
+
+    def run(self, job_id, writer):
+        if self.run_async:
+            close_old_connections()
+        try:
+            ExportJob.objects.filter(pk=job_id).update(status='Running', started_at=timezone.now())
+            job = ExportJob.objects.get(pk=job_id)
+            with tempfile.TemporaryFile() as spool:
+                writer(spool)
+                spool.seek(0)
+                job.file.save(job.filename, File(spool), save=False)
+            job.status = 'Completed'
+            job.finished_at = timezone.now()
+            job.expires_at = job.finished_at + timedelta(seconds=self.result_ttl)
+            job.save(update_fields=['status', 'file', 'finished_at', 'expires_at'])
+        except Exception as exc:
+            logger.exception('Export job %s failed', job_id)
+            ExportJob.objects.filter(pk=job_id).update(status='Failed', error=str(exc), finished_at=timezone.now())
+        finally:
+            if self.run_async:
+                close_old_connections()
+
+
+_runner = None
+
+
+def get_runner():
+    global _runner
+    if _runner is None:
+        config = export_settings()
+        _runner = ExportJobRunner(
+            workers=config['WORKERS'],
+            result_ttl=config['RESULT_TTL'],
+            run_async=config['ASYNC'],
+        )
+    return _runner
+
+
+def submit(kind, filename, content_type, writer, user=None):
+    return get_runner().submit(kind, filename, content_type, writer, user)
+
+
+def is_large(queryset):
+    """Whether ``queryset`` has more rows than ``ASYNC_THRESHOLD`` (bounded count)."""
+    threshold = export_settings()['ASYNC_THRESHOLD']
+    return queryset.order_by()[:threshold + 1].count() > threshold
+
+
+def purge_expired_jobs(batch_size=500):
+    """
+    Mark jobs interrupted by a restart as failed, then delete expired jobs
+    and their files. Returns the number of jobs deleted.
+    """
+    stale_before = timezone.now() - timedelta(seconds=export_settings()['STALE_AFTER'])
+    ExportJob.objects.filter(status__in=['Pending', 'Running'], created_at__lt=stale_before).update(
+        status='Failed', error='Interrupted before completion', finished_at=timezone.now(),
+    )
+
+    purged = 0
+    while True:
+        jobs = list(ExportJob.objects.filter(expires_at__lt=timezone.now()).order_by('expires_at')[:batch_size])
+        if not jobs:
+            return purged
+        for job in jobs:
+            if job.file:
+                job.file.delete(save=False)
+        ExportJob.objects.filter(pk__in=[job.pk for job in jobs]).delete()
+        purged += len(jobs)
@@ -0,0 +1,214 @@
+"""
+Streaming exports.
+
+Rows are read with ``values_list(...).iterator()`` so memory use stays flat
+regardless of the size of the export. CSV is encoded on the fly and the
+response starts as soon as the first chunk is ready. Excel files are written
+by an openpyxl write-only workbook (which spools each sheet to disk) into a
+temporary file that is then streamed back and removed once sent.
+"""
+import csv
+import tempfile
+import zlib
+
+import openpyxl
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.platypus import SimpleDocTemplate, Paragraph
+from rest_framework.renderers import BaseRenderer
+
+from .profile_pdf import styled_table, write_profile
+
+CHUNK_SIZE = 2000
+FLUSH_BYTES = 64 * 1024
+
+XLSX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+PDF_CONTENT_TYPE = 'application/pdf'
+ZIP_CONTENT_TYPE = 'application/zip'
+
+STUDENT_COLUMNS = [
+    ('student_id', 'Student ID'),
+    ('full_name', 'Name'),
+    ('gender', 'Gender'),
+    ('class_enrolled__class_name', 'Class'),
+    ('academic_year', 'Academic Year'),
+    ('study_status', 'Status'),
+]
+
+FINAL_GRADE_COLUMNS = [
+    ('rank', 'Rank'),
+    ('student__student_id', 'Student ID'),
+    ('student__full_name', 'Student Name'),
+    ('final_score', 'Final Score'),
+    ('final_grade', 'Final Grade'),
+]
+
+
+class Echo:
+    """File-like object whose ``write`` hands the value back to the caller."""
+
+    def write(self, value):
+        return value
+
+
+def export_rows(queryset, fields):
+    """Iterate ``queryset`` as tuples of ``fields`` in chunks, skipping model instantiation."""
+    return queryset.prefetch_related(None).values_list(*fields).iterator(chunk_size=CHUNK_SIZE)
+
+
+def csv_chunks(header, rows):
+    """Encode ``rows`` as CSV, yielding roughly ``FLUSH_BYTES`` at a time."""
+    writer = csv.writer(Echo())
+    buffer = [writer.writerow(header)]
+    size = len(buffer[0])
+    for row in rows:
+        line = writer.writerow(row)
+        buffer.append(line)
+        size += len(line)
+        if size >= FLUSH_BYTES:
+            yield ''.join(buffer).encode('utf-8')
+            buffer, size = [], 0
+    if buffer:
+        yield ''.join(buffer).encode('utf-8')
+
+
+def write_csv(fileobj, header, rows, compress=False):
+    """Write ``rows`` as CSV to the binary file ``fileobj``."""
+    chunks = csv_chunks(header, rows)
+    for chunk in gzip_chunks(chunks) if compress else chunks:
+        fileobj.write(chunk)
+
+
+def gzip_chunks(chunks):
+    compressor = zlib.compressobj(wbits=31)  # gzip container
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def csv_response(filename, header, rows, compress=False):
+    """Return a ``StreamingHttpResponse`` with ``rows`` as CSV, optionally gzipped."""
+    chunks = csv_chunks(header, rows)
+    if compress:
+        response = StreamingHttpResponse(gzip_chunks(chunks), content_type='application/gzip')
+        filename = f'{filename}.gz'
+    else:
+        response = StreamingHttpResponse(chunks, content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+def write_xlsx(fileobj, sheet_title, header, rows):
+    """Write ``rows`` to ``fileobj`` as a single-sheet workbook without holding them in memory."""
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet(sheet_title)
+    sheet.append(header)
+    for row in rows:
+        sheet.append(row)
+    workbook.save(fileobj)
+
+
+def file_response(filename, content_type, writer):
+    """Render ``writer(fileobj)`` into a temporary file and stream it back as a download."""
+    spool = tempfile.TemporaryFile()
+    try:
+        writer(spool)
+    except Exception:
+        spool.close()
+        raise
+    spool.seek(0)
+    # FileResponse closes (and so deletes) the temporary file once sent
+    return FileResponse(spool, as_attachment=True, filename=filename, content_type=content_type)
+
+
+def xlsx_response(filename, sheet_title, header, rows):
+    """Return a ``FileResponse`` streaming ``rows`` as an .xlsx file."""
+    return file_response(filename, XLSX_CONTENT_TYPE, lambda fileobj: write_xlsx(fileobj, sheet_title, header, rows))
+
+
+def pdf_response(filename, writer):
+    """Render ``writer(fileobj)`` straight into a PDF download response."""
+    response = HttpResponse(content_type=PDF_CONTENT_TYPE)
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    writer(response)
+    return response
+
+
+def write_student_profile_pdf(fileobj, student, grades, gpa=None):
+    write_profile(fileobj, {
+        'student_id': student.student_id,
+        'full_name': student.full_name,
+        'gender': student.gender,
+        'class_name': student.class_enrolled.class_name,
+        'academic_year': student.academic_year,
+        'study_status': student.study_status,
+        'grades': [(grade.subject.subject_name, grade.score, grade.grade, grade.remark) for grade in grades],
+        'gpa': gpa,
+    })
+
+
+def write_final_grades_pdf(fileobj, queryset, semester, year):
+    doc = SimpleDocTemplate(fileobj, pagesize=letter)
+    styles = getSampleStyleSheet()
+    elements = []
+
+    # Title
+    elements.append(Paragraph(f"Final Grades Report - {semester} {year}", styles['Title']))
+    first = queryset.first()
+    elements.append(Paragraph(f"Subject: {first.subject.subject_name if first else 'N/A'}", styles['Heading2']))
+
+    # Table
+    data = [['Rank', 'Student ID', 'Name', 'Final Score', 'Grade']]
+    for rank, student_id, full_name, final_score, final_grade in export_rows(queryset, [field for field, _ in FINAL_GRADE_COLUMNS]):
+        data.append([str(rank), student_id, full_name, str(round(final_score, 2)), final_grade])
+    elements.append(styled_table(data))
+
+    doc.build(elements)
+
+
+def write_invoice_pdf(fileobj, invoice):
+    doc = SimpleDocTemplate(fileobj, pagesize=letter)
+    styles = getSampleStyleSheet()
+    elements = []
+
+    # Title
+    elements.append(Paragraph(f"Invoice: {invoice.invoice_number}", styles['Title']))
+
+    # Invoice Info
+    elements.append(styled_table([
+        ['Invoice Number', invoice.invoice_number],
+        ['Student', invoice.student.full_name],
+        ['Student ID', invoice.student.student_id],
+        ['Total Amount', f"${invoice.total_amount}"],
+        ['Issued Date', invoice.issued_date.strftime('%Y-%m-%d')],
+        ['Due Date', invoice.due_date.strftime('%Y-%m-%d')],
+        ['Status', invoice.status],
+    ]))
+
+    doc.build(elements)
+
+
+class FileRenderer(BaseRenderer):
+    """
+    Lets ``?format=<name>`` select a file download on actions that return
+    their own ``HttpResponse``; DRF would otherwise answer 404 for a format
+    it has no renderer for.
+    """
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return data
+
+
+class ExcelRenderer(FileRenderer):
+    media_type = XLSX_CONTENT_TYPE
+    format = 'excel'
+
+
+class PDFRenderer(FileRenderer):
+    media_type = PDF_CONTENT_TYPE
+    format = 'pdf'
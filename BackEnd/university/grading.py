@@ -0,0 +1,118 @@
+"""
+Cohort final-grade engine.
+
+Final scores for a subject are computed for the whole cohort at once: the
+subject's assessments and every grade on them are read in two queries into
+NumPy arrays (a student x assessment score matrix plus weight and max-score
+vectors), and the weighted scores and letter grades come out of one
+vectorized pass.
+
+A student's final score is ``sum(score / max_score * weight) / sum(weight)
+* 100`` over the assessments set for their class that they have a grade on;
+students with no such grade get no final grade. If a cell somehow holds
+several grades, the last one by grade_id counts.
+"""
+import numpy as np
+from django.db import transaction
+
+from . import conditional, summaries
+from .models import LETTER_THRESHOLDS, Assessment, FinalGrade, Grade, next_ids
+
+
+def letter_grades(scores):
+    """Vectorized ``models.letter_grade`` over an array of scores."""
+    return np.select([scores >= threshold for threshold, _ in LETTER_THRESHOLDS],
+                     [letter for _, letter in LETTER_THRESHOLDS], 'F')
+
+
+def compute_final_scores(subject, student_ids=None):
+    """
+    Return ``{student_id: (final_score, letter)}`` for ``student_ids``, or by
+    default for every student whose class takes ``subject``.
+    """
+    assessments = list(
+        Assessment.objects.filter(subject=subject).order_by('assessment_id')
+        .values_list('assessment_id', 'class_enrolled_id', 'weight', 'max_score')
+    )
+    if not assessments:
+        return {}
+
+    grades = Grade.objects.filter(assessment__subject=subject)
+    if student_ids is None:
+        grades = grades.filter(student__class_enrolled__subjects=subject)
+    else:
+        grades = grades.filter(student_id__in=student_ids)
+    grades = list(
+        grades.order_by('grade_id').values_list('student_id', 'student__class_enrolled_id', 'assessment_id', 'score')
+    )
+    if not grades:
+        return {}
+
+    columns = {assessment_id: column for column, (assessment_id, *_) in enumerate(assessments)}
+    assessment_classes = np.array([class_id for _, class_id, _, _ in assessments], dtype=object)
+    weights = np.array([weight for _, _, weight, _ in assessments], dtype=float)
+    max_scores = np.array([max_score for _, _, _, max_score in assessments], dtype=float)
+
+    students = {}
+    student_classes = []
+    for student_id, class_id, _, _ in grades:
+        if student_id not in students:
+            students[student_id] = len(students)
+            student_classes.append(class_id)
+
+    scores = np.full((len(students), len(assessments)), np.nan)
+    rows = np.fromiter((students[student_id] for student_id, *_ in grades), dtype=np.intp, count=len(grades))
+    cols = np.fromiter((columns[assessment_id] for _, _, assessment_id, _ in grades), dtype=np.intp, count=len(grades))
+    scores[rows, cols] = np.fromiter((score for *_, score in grades), dtype=float, count=len(grades))
+
+    # Only graded assessments set for the student's own class count
+    counted = ~np.isnan(scores) & (np.array(student_classes, dtype=object)[:, None] == assessment_classes[None, :])
+    weighted = np.where(counted, np.nan_to_num(scores) / max_scores * weights, 0.0).sum(axis=1)
+    total_weight = np.where(counted, weights, 0.0).sum(axis=1)
+
+    has_weight = total_weight != 0
+    final_scores = np.divide(weighted, total_weight, out=np.zeros_like(weighted), where=has_weight) * 100
+    letters = letter_grades(final_scores)
+
+    return {
+        student_id: (float(final_scores[row]), str(letters[row]))
+        for student_id, row in students.items()
+        if has_weight[row]
+    }
+
+
+def save_final_grades(subject, semester, year, results):
+    """
+    Upsert ``results`` (from ``compute_final_scores``) as the subject's final
+    grades for the term with one bulk insert and one bulk update. Returns the
+    saved ``FinalGrade`` rows; raises ``IntegrityError``, with nothing written,
+    when a concurrent calculation took the same IDs or rows.
+    """
+    with transaction.atomic():
+        existing = {
+            final_grade.student_id: final_grade
+            for final_grade in FinalGrade.objects.filter(subject=subject, semester=semester, year=year)
+            if final_grade.student_id in results
+        }
+        created, updated = [], []
+        for student_id, (final_score, letter) in results.items():
+            final_grade = existing.get(student_id)
+            if final_grade is None:
+                final_grade = FinalGrade(student_id=student_id, subject=subject, semester=semester, year=year)
+                created.append(final_grade)
+            else:
+                updated.append(final_grade)
+            final_grade.final_score = final_score
+            final_grade.final_grade = letter
+
+        if created:
+            for final_grade, final_grade_id in zip(created, next_ids(FinalGrade, 'FG', len(created))):
+                final_grade.final_grade_id = final_grade_id
+            FinalGrade.objects.bulk_create(created, batch_size=1000)
+        FinalGrade.objects.bulk_update(updated, ['final_score', 'final_grade'], batch_size=1000)
+
+    # bulk_create/bulk_update send no signals
+    saved = created + updated
+    summaries.schedule_refresh(results)
+    conditional.touch_instances(saved)
+    return saved
@@ -0,0 +1,200 @@
+"""
+Bulk student import from CSV or Excel uploads.
+
+Rows are streamed from the upload (``csv`` over the file, or an openpyxl
+read-only workbook) and handled ``CHUNK_SIZE`` at a time: every row of a
+chunk is checked with the model's field validators, classes are resolved
+from a map read once up front, student IDs are checked for uniqueness with
+one query per chunk and the valid rows are written with ``bulk_create`` in
+their own transaction. Invalid rows are reported back by row number; they
+never stop the rest of the import. A file that cannot be read past some row
+(bad encoding, malformed CSV) keeps the chunks already written and reports
+where reading stopped.
+
+``bulk_create`` sends no signals, so the search index, dashboard snapshot
+and conditional-GET stamps are refreshed here.
+"""
+import csv
+import io
+import os
+import zipfile
+
+import openpyxl
+from openpyxl.utils.exceptions import InvalidFileException
+from django.core.exceptions import ValidationError
+from django.db import transaction
+
+from . import conditional, dashboard, search
+from .models import Class, Student
+
+CHUNK_SIZE = 1000
+
+# Errors raised part-way through reading a file
+READ_ERRORS = (UnicodeDecodeError, csv.Error)
+
+FIELDS = ('student_id', 'full_name', 'gender', 'date_of_birth', 'class_enrolled', 'academic_year', 'address', 'study_status')
+REQUIRED_FIELDS = ('student_id', 'full_name', 'gender', 'date_of_birth', 'class_enrolled', 'academic_year', 'address')
+
+# Header spellings accepted besides the field names, including the export headers
+HEADER_ALIASES = {
+    'name': 'full_name',
+    'class': 'class_enrolled',
+    'class_id': 'class_enrolled',
+    'class_enrolled_id': 'class_enrolled',
+    'status': 'study_status',
+    'dob': 'date_of_birth',
+}
+
+
+def normalize_header(header):
+    name = str(header or '').strip().lower().replace(' ', '_')
+    return HEADER_ALIASES.get(name, name)
+
+
+def read_rows(upload):
+    """Yield ``(row number, {field: value})`` for each data row of ``upload``."""
+    extension = os.path.splitext(upload.name or '')[1].lower()
+    if extension in ('.xlsx', '.xlsm'):
+        try:
+            workbook = openpyxl.load_workbook(upload, read_only=True, data_only=True)
+        except (zipfile.BadZipFile, InvalidFileException):
+            raise ValueError('The file is not a valid Excel workbook.')
+        try:
+            rows = workbook.worksheets[0].iter_rows(values_only=True)
+            yield from _rows(rows)
+        finally:
+            workbook.close()
+    elif extension == '.csv':
+        yield from _rows(csv.reader(io.TextIOWrapper(upload, encoding='utf-8-sig', newline='')))
+    else:
+        raise ValueError('Upload a .csv or .xlsx file.')
+
+
+def _rows(rows):
+    header = next(rows, None)
+    if header is None:
+        raise ValueError('The file is empty.')
+    columns = [normalize_header(name) for name in header]
+    missing = [field for field in REQUIRED_FIELDS if field not in columns]
+    if missing:
+        raise ValueError(f"Missing columns: {', '.join(missing)}")
+    # Row 1 is the header
+    for number, values in enumerate(rows, start=2):
+        row = {
+            column: value.strip() if isinstance(value, str) else value
+            for column, value in zip(columns, values)
+            if column in FIELDS
+        }
+        if any(value not in (None, '') for value in row.values()):
+            yield number, row
+
+
+def class_map():
+    """Map class IDs, and class names where unambiguous, to class IDs."""
+    classes = list(Class.objects.values_list('class_id', 'class_name'))
+    names = {}
+    for class_id, class_name in classes:
+        names[class_name] = class_id if class_name not in names else None
+    mapping = {name: class_id for name, class_id in names.items() if class_id}
+    mapping.update((class_id, class_id) for class_id, _ in classes)
+    return mapping
+
+
+def build_student(row, classes):
+    """Return an unsaved ``Student`` for ``row``, or raise ``ValidationError``."""
+    errors = {}
+    class_key = row.get('class_enrolled')
+    class_id = classes.get(str(class_key)) if class_key not in (None, '') else None
+    if class_id is None:
+        errors['class_enrolled'] = ['Class enrollment is required.' if class_key in (None, '') else f'Unknown class "{class_key}".']
+
+    values = {field: row.get(field) for field in FIELDS if field != 'class_enrolled'}
+    values['student_id'] = str(values['student_id'] or '')
+    if values['study_status'] in (None, ''):
+        values.pop('study_status')
+    for field in ('full_name', 'gender', 'address'):
+        values[field] = '' if values[field] is None else str(values[field])
+    student = Student(class_enrolled_id=class_id, **values)
+    try:
+        student.clean_fields(exclude=['class_enrolled'])
+    except ValidationError as exc:
+        errors.update(exc.message_dict)
+    if errors:
+        raise ValidationError(errors)
+    return student
+
+
+def read_chunk(rows, size):
+    """Return up to ``size`` rows and the read error that cut the chunk short, if any."""
+    chunk = []
+    try:
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) >= size:
+                break
+    except READ_ERRORS as exc:
+        return chunk, exc
+    return chunk, None
+
+
+def import_students(upload, chunk_size=None):
+    """
+    Import the students in ``upload``. Returns a report dict with the number
+    of rows created and failed and a per-row list of errors.
+    """
+    rows = read_rows(upload)
+    classes = class_map()
+    seen = set()
+    created, errors = 0, []
+    last_row = 1  # row 1 is the header
+
+    try:
+        while True:
+            chunk, read_error = read_chunk(rows, chunk_size or CHUNK_SIZE)
+            if read_error is not None:
+                # The rows read so far are still imported; the rest of the file is not
+                errors.append({
+                    'row': (chunk[-1][0] if chunk else last_row) + 1,
+                    'student_id': None,
+                    'errors': {'file': [f'Could not read the file from this row on: {read_error}']},
+                })
+            if not chunk:
+                break
+            last_row = chunk[-1][0]
+
+            students = []
+            for number, row in chunk:
+                try:
+                    student = build_student(row, classes)
+                except ValidationError as exc:
+                    errors.append({'row': number, 'student_id': row.get('student_id'), 'errors': exc.message_dict})
+                    continue
+                if student.pk in seen:
+                    errors.append({'row': number, 'student_id': student.pk, 'errors': {'student_id': ['Duplicate student ID in file.']}})
+                    continue
+                seen.add(student.pk)
+                students.append((number, student))
+
+            existing = set(Student.objects.filter(pk__in=[student.pk for _, student in students]).values_list('pk', flat=True))
+            valid = []
+            for number, student in students:
+                if student.pk in existing:
+                    errors.append({'row': number, 'student_id': student.pk, 'errors': {'student_id': ['Student ID must be unique.']}})
+                else:
+                    valid.append(student)
+
+            if valid:
+                with transaction.atomic():
+                    Student.objects.bulk_create(valid)
+                    search.index_objects('student', [student.pk for student in valid])
+                created += len(valid)
+            if read_error is not None:
+                break
+    finally:
+        # Chunks already written stay committed, whatever stopped the import
+        if created:
+            dashboard.invalidate_snapshot()
+            conditional.touch(Student)
+
+    errors.sort(key=lambda error: error['row'])
+    return {'created': created, 'failed': len(errors), 'errors': errors}
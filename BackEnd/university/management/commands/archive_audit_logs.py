@@ -0,0 +1,24 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from university.audit import archive_audit_logs
+
+
+class Command(BaseCommand):
+    help = 'Move audit log rows past the retention period into monthly compressed JSONL archives'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.AUDIT_LOG_RETENTION_DAYS,
+                            help='Keep rows newer than this many days (default: AUDIT_LOG_RETENTION_DAYS)')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--archive-dir', default=str(settings.AUDIT_LOG_ARCHIVE_DIR))
+
+    def handle(self, *args, **options):
+        before = timezone.now() - timedelta(days=options['days'])
+        archived = archive_audit_logs(before, options['archive_dir'], options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Archived {archived} audit log entries older than {before:%Y-%m-%d} to {options['archive_dir']}"
+        ))
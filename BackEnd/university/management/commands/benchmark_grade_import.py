@@ -0,0 +1,61 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from university.models import Class, Grade, Student, Subject
+from university.serializers import GradeSerializer
+
+PREFIX = 'BM'
+
+
+class Command(BaseCommand):
+    help = 'Time a bulk grade import through GradeSerializer(many=True) on synthetic data (rolled back afterwards)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=100000)
+        parser.add_argument('--students', type=int, default=1000)
+        parser.add_argument('--best-effort', action='store_true', help='Validate in best_effort mode')
+
+    def handle(self, *args, **options):
+        rows, student_count = options['rows'], options['students']
+        if Grade.objects.filter(grade_id__startswith=PREFIX).exists() or Class.objects.filter(pk=PREFIX).exists():
+            raise CommandError(f'Rows with the {PREFIX} prefix already exist')
+
+        with transaction.atomic():
+            test_class = Class.objects.create(class_id=PREFIX, class_name='Benchmark', department='Benchmark', year=2024)
+            subject = Subject.objects.create(subject_id=PREFIX, subject_name='Benchmark', credit=3)
+            students = Student.objects.bulk_create([
+                Student(
+                    student_id=f'{PREFIX}{index:06d}', full_name=f'Benchmark {index}', gender='Other',
+                    date_of_birth='2000-01-01', class_enrolled=test_class, academic_year=2024, address='-',
+                )
+                for index in range(student_count)
+            ])
+            payload = [
+                {
+                    'grade_id': f'{PREFIX}{index:07d}',
+                    'student': students[index % student_count].pk,
+                    'subject': subject.pk,
+                    'score': index % 101,
+                    'grade': 'B',
+                }
+                for index in range(rows)
+            ]
+
+            serializer = GradeSerializer(data=payload, many=True, context={'best_effort': options['best_effort']})
+            started = time.perf_counter()
+            if not serializer.is_valid():
+                raise CommandError(f'Validation failed: {str(serializer.errors)[:500]}')
+            validated = time.perf_counter()
+            grades = serializer.save()
+            saved = time.perf_counter()
+
+            # Leave the database as it was
+            transaction.set_rollback(True)
+
+        total = saved - started
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(grades)} grades: validated in {validated - started:.2f}s, inserted in {saved - validated:.2f}s '
+            f'({len(grades) / total:,.0f} rows/s)'
+        ))
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from university.models import Student
+from university.report_cards import load_profiles, write_profiles_merged, write_profiles_zip
+
+
+class Command(BaseCommand):
+    help = 'Render student profile PDFs for a class (or every student) into a ZIP or one merged PDF'
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', help='Path of the .zip or .pdf file to write')
+        parser.add_argument('--class', dest='class_id', help='Only students enrolled in this class')
+        parser.add_argument('--year', type=int, help='Only students in this academic year')
+        parser.add_argument('--workers', type=int, default=None,
+                            help='Rendering processes (defaults to PROFILE_PDF_WORKERS or the number of cores)')
+
+    def handle(self, *args, **options):
+        students = Student.objects.order_by('student_id')
+        if options['class_id']:
+            students = students.filter(class_enrolled_id=options['class_id'])
+        if options['year']:
+            students = students.filter(academic_year=options['year'])
+
+        profiles = load_profiles(students)
+        if not profiles:
+            raise CommandError('No students matched')
+
+        with open(options['output'], 'wb') as fileobj:
+            if options['output'].lower().endswith('.pdf'):
+                write_profiles_merged(fileobj, profiles)
+            else:
+                write_profiles_zip(fileobj, profiles, options['workers'])
+        self.stdout.write(self.style.SUCCESS(f"Wrote {len(profiles)} profiles to {options['output']}"))
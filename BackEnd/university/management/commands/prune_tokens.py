@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from university.tokens import prune_expired_tokens
+
+
+class Command(BaseCommand):
+    help = 'Delete expired outstanding and blacklisted JWT refresh tokens in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--pause', type=float, default=0,
+                            help='Seconds to sleep between batches to limit write-lock contention')
+
+    def handle(self, *args, **options):
+        pruned = prune_expired_tokens(options['batch_size'], options['pause'])
+        self.stdout.write(self.style.SUCCESS(f'Pruned {pruned} expired tokens'))
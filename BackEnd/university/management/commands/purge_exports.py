@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from university.export_jobs import purge_expired_jobs
+
+
+class Command(BaseCommand):
+    help = 'Delete expired export jobs and their result files'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        purged = purge_expired_jobs(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Purged {purged} expired export jobs'))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from university.models import PasswordResetToken
+
+
+class Command(BaseCommand):
+    help = 'Delete expired password reset tokens in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        purged = PasswordResetToken.purge_expired(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Purged {purged} expired password reset tokens'))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from university.summaries import rebuild_summaries
+
+
+class Command(BaseCommand):
+    help = 'Recompute the GPA summary of every student from their grades'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        written = rebuild_summaries(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {written} academic summaries'))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from university.search import rebuild_index
+
+
+class Command(BaseCommand):
+    help = 'Recreate the full-text search documents for students, teachers and subjects'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        counts = rebuild_index(options['batch_size'])
+        summary = ', '.join(f'{count} {kind}s' for kind, count in counts.items())
+        self.stdout.write(self.style.SUCCESS(f'Indexed {summary}'))
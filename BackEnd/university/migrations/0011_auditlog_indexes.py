@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('university', '0010_user_token_version'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='auditlog',
+            index=models.Index(fields=['timestamp'], name='audit_logs_timestamp_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='auditlog',
+            index=models.Index(fields=['user', 'timestamp'], name='audit_logs_user_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='auditlog',
+            index=models.Index(fields=['model_name', 'object_id', 'timestamp'], name='audit_logs_object_ts_idx'),
+        ),
+    ]
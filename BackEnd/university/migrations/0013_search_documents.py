@@ -0,0 +1,99 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:35
+
+from django.db import migrations, models
+
+# The full-text schema as of this migration; kept here rather than imported
+# so later changes to university.search cannot change what this migration does.
+SQLITE_SCHEMA = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS search_documents_fts USING fts5(
+        title, body,
+        content='search_documents', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS search_documents_ai AFTER INSERT ON search_documents BEGIN
+        INSERT INTO search_documents_fts(rowid, title, body) VALUES (new.id, new.title, new.body);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS search_documents_ad AFTER DELETE ON search_documents BEGIN
+        INSERT INTO search_documents_fts(search_documents_fts, rowid, title, body) VALUES ('delete', old.id, old.title, old.body);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS search_documents_au AFTER UPDATE ON search_documents BEGIN
+        INSERT INTO search_documents_fts(search_documents_fts, rowid, title, body) VALUES ('delete', old.id, old.title, old.body);
+        INSERT INTO search_documents_fts(rowid, title, body) VALUES (new.id, new.title, new.body);
+    END""",
+]
+
+SQLITE_DROP = [
+    'DROP TRIGGER IF EXISTS search_documents_au',
+    'DROP TRIGGER IF EXISTS search_documents_ad',
+    'DROP TRIGGER IF EXISTS search_documents_ai',
+    'DROP TABLE IF EXISTS search_documents_fts',
+]
+
+POSTGRES_SCHEMA = [
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+    """CREATE INDEX IF NOT EXISTS search_documents_tsv_idx ON search_documents
+        USING GIN (to_tsvector('simple', title || ' ' || body))""",
+    """CREATE INDEX IF NOT EXISTS search_documents_title_trgm_idx ON search_documents
+        USING GIN (title gin_trgm_ops)""",
+]
+
+POSTGRES_DROP = [
+    'DROP INDEX IF EXISTS search_documents_title_trgm_idx',
+    'DROP INDEX IF EXISTS search_documents_tsv_idx',
+]
+
+
+def populate_documents(apps, schema_editor):
+    SearchDocument = apps.get_model('university', 'SearchDocument')
+    sources = [
+        ('student', apps.get_model('university', 'Student'), 'full_name', 'student_id'),
+        ('teacher', apps.get_model('university', 'Teacher'), 'full_name', 'email'),
+        ('subject', apps.get_model('university', 'Subject'), 'subject_name', 'subject_id'),
+    ]
+    for kind, model, title_field, body_field in sources:
+        SearchDocument.objects.bulk_create(
+            [
+                SearchDocument(kind=kind, object_id=str(pk), title=title or '', body=body or '')
+                for pk, title, body in model.objects.values_list('pk', title_field, body_field)
+            ],
+            batch_size=500,
+        )
+
+
+def _execute(schema_editor, statements):
+    for statement in statements.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(statement)
+
+
+def create_search_schema(apps, schema_editor):
+    _execute(schema_editor, {'sqlite': SQLITE_SCHEMA, 'postgresql': POSTGRES_SCHEMA})
+
+
+def drop_search_schema(apps, schema_editor):
+    _execute(schema_editor, {'sqlite': SQLITE_DROP, 'postgresql': POSTGRES_DROP})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('university', '0012_password_reset_tokens'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchDocument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('student', 'Student'), ('teacher', 'Teacher'), ('subject', 'Subject')], max_length=20)),
+                ('object_id', models.CharField(max_length=50)),
+                ('title', models.CharField(max_length=200)),
+                ('body', models.TextField(blank=True)),
+            ],
+            options={
+                'db_table': 'search_documents',
+                'unique_together': {('kind', 'object_id')},
+            },
+        ),
+        migrations.RunPython(create_search_schema, drop_search_schema),
+        migrations.RunPython(populate_documents, migrations.RunPython.noop),
+    ]
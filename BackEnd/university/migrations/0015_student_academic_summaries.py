@@ -0,0 +1,78 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:46
+
+from collections import defaultdict
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Avg
+
+
+def _weighted_mean(pairs):
+    credits = sum(max(credit, 0) for _, credit in pairs)
+    if not credits:
+        return sum(score for score, _ in pairs) / len(pairs)
+    return sum(score * max(credit, 0) for score, credit in pairs) / credits
+
+
+def populate_summaries(apps, schema_editor):
+    # The rules of university.summaries as of this migration, on the
+    # historical models so later changes there cannot change the backfill.
+    Grade = apps.get_model('university', 'Grade')
+    FinalGrade = apps.get_model('university', 'FinalGrade')
+    StudentAcademicSummary = apps.get_model('university', 'StudentAcademicSummary')
+
+    subject_scores = defaultdict(dict)  # student -> subject -> (score, credit)
+    grade_rows = (
+        Grade.objects.values('student_id', 'subject_id', 'subject__credit')
+        .annotate(score=Avg('score')).order_by()
+    )
+    for row in grade_rows.iterator(chunk_size=2000):
+        subject_scores[row['student_id']][row['subject_id']] = (row['score'], row['subject__credit'])
+
+    finals = defaultdict(lambda: defaultdict(list))  # student -> subject -> [(score, credit)]
+    terms = defaultdict(lambda: defaultdict(list))  # student -> term -> [(score, credit)]
+    final_rows = FinalGrade.objects.values_list('student_id', 'subject_id', 'subject__credit', 'semester', 'year', 'final_score').order_by()
+    for student_id, subject_id, credit, semester, year, final_score in final_rows.iterator(chunk_size=2000):
+        finals[student_id][subject_id].append((final_score, credit))
+        terms[student_id][f'{semester} {year}'].append((final_score, credit))
+    for student_id, subjects in finals.items():
+        for subject_id, pairs in subjects.items():
+            subject_scores[student_id][subject_id] = (sum(score for score, _ in pairs) / len(pairs), pairs[0][1])
+
+    StudentAcademicSummary.objects.bulk_create(
+        [
+            StudentAcademicSummary(
+                student_id=student_id,
+                gpa=_weighted_mean(list(subjects.values())),
+                total_credits=sum(max(credit, 0) for _, credit in subjects.values()),
+                term_gpa={term: _weighted_mean(pairs) for term, pairs in sorted(terms[student_id].items())},
+            )
+            for student_id, subjects in subject_scores.items()
+        ],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('university', '0014_export_jobs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StudentAcademicSummary',
+            fields=[
+                ('student', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='academic_summary', serialize=False, to='university.student')),
+                ('gpa', models.FloatField(blank=True, null=True)),
+                ('total_credits', models.PositiveIntegerField(default=0)),
+                ('term_gpa', models.JSONField(blank=True, default=dict)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'student_academic_summaries',
+                'indexes': [models.Index(fields=['-gpa'], name='academic_summary_gpa_idx')],
+            },
+        ),
+        migrations.RunPython(populate_summaries, migrations.RunPython.noop),
+    ]
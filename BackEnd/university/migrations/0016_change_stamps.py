@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('university', '0015_student_academic_summaries'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangeStamp',
+            fields=[
+                ('key', models.CharField(max_length=255, primary_key=True, serialize=False)),
+                ('version', models.BigIntegerField()),
+            ],
+            options={
+                'db_table': 'change_stamps',
+            },
+        ),
+    ]
@@ -1,7 +1,16 @@
-from django.db import models
+import hashlib
+import re
+import secrets
+import uuid
+from datetime import timedelta
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models import F, Max, Window
+from django.db.models.functions import Cast, DenseRank, Rank, RowNumber, Substr
 from django.utils import timezone
 from django.contrib.auth.models import AbstractUser
 from django.contrib.auth.hashers import make_password
+from .rbac import get_user_permissions
 
 class Permission(models.Model):
     PERMISSION_CHOICES = [
@@ -75,8 +84,8 @@ class User(AbstractUser):
     profile_picture = models.ImageField(upload_to='profile_pictures/', blank=True, null=True)
     is_2fa_enabled = models.BooleanField(default=False)
     two_factor_secret = models.CharField(max_length=32, blank=True, null=True)
-    reset_token = models.CharField(max_length=32, blank=True, null=True)
     last_login_ip = models.GenericIPAddressField(blank=True, null=True)
+    token_version = models.PositiveIntegerField(default=0)
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -94,36 +103,69 @@ class User(AbstractUser):
         super().save(*args, **kwargs)
 
     def has_permission(self, permission_name):
-        # Check custom permissions
-        if self.custom_permissions.filter(name=permission_name).exists():
-            return True
+        return permission_name in get_user_permissions(self)
 
-        # Check role permissions
-        for role in self.roles.all():
-            if role.permissions.filter(name=permission_name).exists():
-                return True
+    def get_all_permissions(self, obj=None):
+        return set(get_user_permissions(self))
 
-        return False
-
-    def get_all_permissions(self):
-        permissions = set()
-
-        # Add custom permissions
-        for perm in self.custom_permissions.all():
-            permissions.add(perm.name)
+    def __str__(self):
+        return f"{self.username} - {self.role}"
 
-        # Add role permissions
-        for role in self.roles.all():
-            for perm in role.permissions.all():
-                permissions.add(perm.name)
+    class Meta:
+        db_table = 'users'
 
-        return permissions
+class PasswordResetToken(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='password_reset_tokens')
+    token_hash = models.CharField(max_length=64, unique=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    expires_at = models.DateTimeField(db_index=True)
+    used_at = models.DateTimeField(blank=True, null=True)
 
     def __str__(self):
-        return f"{self.username} - {self.role}"
+        return f"{self.user.username} - {self.expires_at}"
 
     class Meta:
-        db_table = 'users'
+        db_table = 'password_reset_tokens'
+
+    @staticmethod
+    def hash_token(token):
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    @classmethod
+    def issue(cls, user):
+        """Create a token for ``user`` and return the raw value; only its hash is stored."""
+        token = secrets.token_urlsafe(32)
+        now = timezone.now()
+        with transaction.atomic():
+            # Only the most recently requested token stays usable
+            cls.objects.filter(user=user, used_at__isnull=True).update(used_at=now)
+            cls.objects.create(
+                user=user,
+                token_hash=cls.hash_token(token),
+                created_at=now,
+                expires_at=now + timedelta(seconds=settings.PASSWORD_RESET_TIMEOUT),
+            )
+        return token
+
+    @classmethod
+    def consume(cls, token):
+        """Mark ``token`` as used and return its user, or ``None`` if invalid, used or expired."""
+        token_hash = cls.hash_token(token)
+        now = timezone.now()
+        claimed = cls.objects.filter(token_hash=token_hash, used_at__isnull=True, expires_at__gt=now).update(used_at=now)
+        if not claimed:
+            return None
+        return cls.objects.select_related('user').get(token_hash=token_hash).user
+
+    @classmethod
+    def purge_expired(cls, batch_size=1000):
+        purged = 0
+        while True:
+            ids = list(cls.objects.filter(expires_at__lt=timezone.now()).values_list('id', flat=True)[:batch_size])
+            if not ids:
+                return purged
+            cls.objects.filter(id__in=ids).delete()
+            purged += len(ids)
 
 class Class(models.Model):
     class_id = models.CharField(max_length=10, primary_key=True)
@@ -250,6 +292,47 @@ class Enrollment(models.Model):
     class Meta:
         db_table = 'enrollments'
 
+LETTER_THRESHOLDS = ((90, 'A'), (80, 'B'), (70, 'C'), (60, 'D'))
+
+
+def letter_grade(score):
+    """Letter grade for a score out of 100."""
+    for threshold, letter in LETTER_THRESHOLDS:
+        if score >= threshold:
+            return letter
+    return 'F'
+
+
+def next_ids(model, prefix, count, width=6):
+    """
+    Return ``count`` unused primary keys ``<prefix><zero-padded number>`` for
+    ``model``, numbered after the highest such key in use. For bulk inserts of
+    models whose character keys are otherwise chosen by the client.
+
+    Keys of exactly ``width`` digits sort like their numbers, so the highest
+    is found by walking the primary key index down from ``<prefix>99...9``;
+    only once the numbers outgrow ``width`` digits is every key compared.
+    """
+    pk_name = model._meta.pk.name
+    pattern = re.compile(rf'{re.escape(prefix)}[0-9]{{{width}}}')
+    keys = (
+        model.objects.filter(**{f'{pk_name}__gte': f'{prefix}{"0" * width}', f'{pk_name}__lte': f'{prefix}{"9" * width}'})
+        .order_by(f'-{pk_name}').values_list(pk_name, flat=True)
+    )
+    highest = 0
+    for key in keys.iterator(chunk_size=100):
+        if pattern.fullmatch(key):
+            highest = int(key[len(prefix):])
+            break
+    if highest + count >= 10 ** width:
+        highest = (
+            model.objects.filter(**{f'{pk_name}__regex': rf'^{re.escape(prefix)}[0-9]+$'})
+            .annotate(number=Cast(Substr(pk_name, len(prefix) + 1), models.BigIntegerField()))
+            .aggregate(highest=Max('number'))['highest']
+        ) or 0
+    return [f'{prefix}{number:0{width}d}' for number in range(highest + 1, highest + count + 1)]
+
+
 class Grade(models.Model):
     grade_id = models.CharField(max_length=10, primary_key=True)
     student = models.ForeignKey(Student, on_delete=models.CASCADE, related_name='grades')
@@ -396,46 +479,50 @@ class FinalGrade(models.Model):
 
     @staticmethod
     def calculate_final_grade(student, subject, semester, year):
-        assessments = Assessment.objects.filter(subject=subject, class_enrolled=student.class_enrolled)
-        total_weighted_score = 0
-        total_weight = 0
-
-        for assessment in assessments:
-            try:
-                grade = Grade.objects.get(student=student, assessment=assessment)
-                weighted_score = (grade.score / assessment.max_score) * assessment.weight
-                total_weighted_score += weighted_score
-                total_weight += assessment.weight
-            except Grade.DoesNotExist:
-                continue
-
-        if total_weight == 0:
-            return None
-
-        final_score = (total_weighted_score / total_weight) * 100
+        """Return ``(final score, letter grade)`` for one student, or None; see grading.py."""
+        from .grading import compute_final_scores
 
-        # Determine letter grade
-        if final_score >= 90:
-            letter_grade = 'A'
-        elif final_score >= 80:
-            letter_grade = 'B'
-        elif final_score >= 70:
-            letter_grade = 'C'
-        elif final_score >= 60:
-            letter_grade = 'D'
-        else:
-            letter_grade = 'F'
+        return compute_final_scores(subject, [student.pk]).get(student.pk)
 
-        return final_score, letter_grade
+    # tie mode -> window function; competition ranks 1, 2, 2, 4, dense 1, 2, 2, 3
+    # and ordinal 1, 2, 3, 4 (ties broken by student ID)
+    RANK_FUNCTIONS = {
+        'competition': Rank,
+        'dense': DenseRank,
+        'ordinal': RowNumber,
+    }
 
     @staticmethod
-    def calculate_ranks(subject, semester, year):
-        final_grades = FinalGrade.objects.filter(subject=subject, semester=semester, year=year).order_by('-final_score')
-        rank = 1
-        for fg in final_grades:
-            fg.rank = rank
-            fg.save()
-            rank += 1
+    def calculate_ranks(subject, semester, year, tie_mode='competition', per_class=False):
+        """
+        Rank the subject's final grades for the term by final score, highest
+        first, with one window-function query, and write the ranks that changed
+        with ``bulk_update``. ``per_class`` ranks each class separately.
+        Returns the number of ranks changed.
+        """
+        from .conditional import touch_instances
+
+        if tie_mode not in FinalGrade.RANK_FUNCTIONS:
+            raise ValueError(f"Unknown tie mode {tie_mode!r}; use one of {', '.join(FinalGrade.RANK_FUNCTIONS)}")
+        partition_by = [F('subject'), F('semester'), F('year')]
+        if per_class:
+            partition_by.append(F('student__class_enrolled'))
+        order_by = [F('final_score').desc()]
+        if tie_mode == 'ordinal':
+            order_by.append(F('student_id').asc())
+
+        ranked = FinalGrade.objects.filter(subject=subject, semester=semester, year=year).annotate(
+            new_rank=Window(FinalGrade.RANK_FUNCTIONS[tie_mode](), partition_by=partition_by, order_by=order_by),
+        ).values_list('pk', 'student_id', 'rank', 'new_rank')
+        changed = [
+            FinalGrade(pk=pk, student_id=student_id, rank=new_rank)
+            for pk, student_id, rank, new_rank in ranked
+            if rank != new_rank
+        ]
+        FinalGrade.objects.bulk_update(changed, ['rank'], batch_size=1000)
+        # bulk_update sends no signals
+        touch_instances(changed)
+        return len(changed)
 
 class AuditLog(models.Model):
     ACTION_CHOICES = [
@@ -463,3 +550,101 @@ class AuditLog(models.Model):
     class Meta:
         db_table = 'audit_logs'
         ordering = ['-timestamp']
+        indexes = [
+            models.Index(fields=['timestamp'], name='audit_logs_timestamp_idx'),
+            models.Index(fields=['user', 'timestamp'], name='audit_logs_user_ts_idx'),
+            models.Index(fields=['model_name', 'object_id', 'timestamp'], name='audit_logs_object_ts_idx'),
+        ]
+
+class SearchDocument(models.Model):
+    """
+    One searchable row per student, teacher and subject, kept in sync by
+    signals. The full-text index over these rows is backend specific and
+    created by migration, see search.py.
+    """
+    KIND_CHOICES = [
+        ('student', 'Student'),
+        ('teacher', 'Teacher'),
+        ('subject', 'Subject'),
+    ]
+
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    object_id = models.CharField(max_length=50)
+    title = models.CharField(max_length=200)
+    body = models.TextField(blank=True)
+
+    def __str__(self):
+        return f"{self.kind} - {self.object_id}"
+
+    class Meta:
+        db_table = 'search_documents'
+        unique_together = ('kind', 'object_id')
+
+class ExportJob(models.Model):
+    """An export rendered in the background; the result file lives under MEDIA_ROOT until it expires."""
+    STATUS_CHOICES = [
+        ('Pending', 'Pending'),
+        ('Running', 'Running'),
+        ('Completed', 'Completed'),
+        ('Failed', 'Failed'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    kind = models.CharField(max_length=50)
+    requested_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='export_jobs')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='Pending')
+    filename = models.CharField(max_length=255)
+    content_type = models.CharField(max_length=100)
+    file = models.FileField(upload_to='exports/%Y/%m/%d', blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    started_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"{self.kind} - {self.status}"
+
+    class Meta:
+        db_table = 'export_jobs'
+        ordering = ['-created_at']
+
+    @property
+    def is_expired(self):
+        return self.expires_at <= timezone.now()
+
+class StudentAcademicSummary(models.Model):
+    """
+    Denormalised academic standing of a student, maintained by signals on
+    Grade/FinalGrade and rebuildable in bulk, see summaries.py. Scores are on
+    the same 0-100 scale as grades; GPA is weighted by subject credits.
+    """
+    student = models.OneToOneField(Student, on_delete=models.CASCADE, primary_key=True, related_name='academic_summary')
+    gpa = models.FloatField(blank=True, null=True)
+    total_credits = models.PositiveIntegerField(default=0)
+    term_gpa = models.JSONField(default=dict, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.student_id} - {self.gpa}"
+
+    class Meta:
+        db_table = 'student_academic_summaries'
+        indexes = [
+            models.Index(fields=['-gpa'], name='academic_summary_gpa_idx'),
+        ]
+
+class ChangeStamp(models.Model):
+    """
+    Version of a model, one of its rows or its bulk changes, rewritten in the
+    same transaction as the change; the source of API ETags, see
+    conditional.py.
+    """
+    key = models.CharField(max_length=255, primary_key=True)
+    version = models.BigIntegerField()
+
+    def __str__(self):
+        return f"{self.key} - {self.version}"
+
+    class Meta:
+        db_table = 'change_stamps'
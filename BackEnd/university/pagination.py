@@ -0,0 +1,178 @@
+from django.core.exceptions import FieldDoesNotExist
+from django.db import connections
+from django.db.models import F, Model, Q
+from rest_framework.pagination import CursorPagination, _reverse_ordering
+from rest_framework.response import Response
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Cursor (keyset) pagination for every list endpoint.
+
+    Pages are located with ``WHERE <sort key> > <cursor>`` on the ordering
+    the view's queryset already applies (so ``sort_by``/``sort_order`` keep
+    working), falling back to the model's default ordering and then the
+    primary key. No ``COUNT(*)`` is issued unless the client asks for one
+    with ``?include_count=true``, and even then the count is bounded by
+    ``count_limit`` (or read from planner statistics on PostgreSQL).
+
+    A nullable sort key sorts its NULLs after every value in the requested
+    direction, and a NULL position is carried in the cursor as
+    ``NULL_POSITION`` so paging continues through the NULL rows.
+    """
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+    count_query_param = 'include_count'
+    count_limit = 10000
+    ordering = ('pk',)
+    NULL_POSITION = '\x00'
+
+    def get_ordering(self, request, queryset, view):
+        ordering = [field for field in queryset.query.order_by if isinstance(field, str)]
+        if not ordering and queryset.query.default_ordering:
+            ordering = [field for field in queryset.model._meta.ordering if isinstance(field, str)]
+        if not ordering:
+            return tuple(self.ordering)
+
+        # Append the primary key so pages are stable for non-unique sort keys
+        pk_names = {'pk', queryset.model._meta.pk.name}
+        if not any(field.lstrip('-') in pk_names for field in ordering):
+            ordering.append('-pk' if ordering[0].startswith('-') else 'pk')
+        return tuple(ordering)
+
+    def _get_position_from_instance(self, instance, ordering):
+        value = instance
+        for part in ordering[0].lstrip('-').split('__'):
+            if value is None:
+                break
+            value = value[part] if isinstance(value, dict) else getattr(value, part)
+        if isinstance(value, Model):
+            value = value.pk
+        return self.NULL_POSITION if value is None else str(value)
+
+    @staticmethod
+    def is_nullable(model, path):
+        """Whether the sort key ``path`` can be NULL; unknown keys (annotations) are assumed to be."""
+        try:
+            for name in path.split('__'):
+                field = model._meta.get_field(name)
+                if field.null:
+                    return True
+                model = field.related_model
+        except FieldDoesNotExist:
+            return True
+        return False
+
+    def order_queryset(self, queryset, reverse):
+        """Order by ``self.ordering`` (reversed for previous pages), NULL sort keys last."""
+        ordering = _reverse_ordering(self.ordering) if reverse else self.ordering
+        if not self.nullable:
+            return queryset.order_by(*ordering)
+        key = ordering[0]
+        # NULLs stay after the values going forward, so they come first going back
+        nulls = {'nulls_first': True} if reverse else {'nulls_last': True}
+        order = F(key.lstrip('-'))
+        order = order.desc(**nulls) if key.startswith('-') else order.asc(**nulls)
+        return queryset.order_by(order, *ordering[1:])
+
+    def filter_position(self, queryset, position, reverse):
+        """Keep the rows strictly after ``position`` (before it for previous pages)."""
+        order = self.ordering[0]
+        order_attr = order.lstrip('-')
+        if position == self.NULL_POSITION:
+            # Every value sorts before NULL and nothing sorts after it
+            return queryset.filter(**{order_attr + '__isnull': False}) if reverse else queryset.none()
+
+        # Test for: (cursor reversed) XOR (queryset reversed)
+        lookup = '__lt' if reverse != order.startswith('-') else '__gt'
+        condition = Q(**{order_attr + lookup: position})
+        if self.nullable and not reverse:
+            condition |= Q(**{order_attr + '__isnull': True})
+        return queryset.filter(condition)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.total_count = None
+        if request.query_params.get(self.count_query_param, '').lower() in ('1', 'true'):
+            self.total_count = self.estimate_count(queryset)
+
+        # CursorPagination.paginate_queryset, with NULL-aware ordering and filtering
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.nullable = self.is_nullable(queryset.model, self.ordering[0].lstrip('-'))
+
+        self.cursor = self.decode_cursor(request)
+        if self.cursor is None:
+            (offset, reverse, current_position) = (0, False, None)
+        else:
+            (offset, reverse, current_position) = self.cursor
+
+        queryset = self.order_queryset(queryset, reverse)
+        if current_position is not None:
+            queryset = self.filter_position(queryset, current_position, reverse)
+
+        # Fetch one extra row to tell whether another page follows
+        results = list(queryset[offset:offset + self.page_size + 1])
+        self.page = list(results[:self.page_size])
+
+        if len(results) > len(self.page):
+            has_following_position = True
+            following_position = self._get_position_from_instance(results[-1], self.ordering)
+        else:
+            has_following_position = False
+            following_position = None
+
+        if reverse:
+            # The query ran backwards, so put the page back in order
+            self.page = list(reversed(self.page))
+            self.has_next = (current_position is not None) or (offset > 0)
+            self.has_previous = has_following_position
+            if self.has_next:
+                self.next_position = current_position
+            if self.has_previous:
+                self.previous_position = following_position
+        else:
+            self.has_next = has_following_position
+            self.has_previous = (current_position is not None) or (offset > 0)
+            if self.has_next:
+                self.next_position = following_position
+            if self.has_previous:
+                self.previous_position = current_position
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+
+        return self.page
+
+    def estimate_count(self, queryset):
+        """Return ``(count, is_exact)`` without an unbounded table scan."""
+        connection = connections[queryset.db]
+        if connection.vendor == 'postgresql' and not queryset.query.where:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE relname = %s', [queryset.model._meta.db_table])
+                row = cursor.fetchone()
+            if row and row[0] >= 0:
+                return row[0], False
+        count = queryset.order_by()[:self.count_limit + 1].count()
+        return min(count, self.count_limit), count <= self.count_limit
+
+    def get_paginated_response(self, data):
+        payload = {
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        }
+        if self.total_count is not None:
+            payload['count'], payload['count_is_exact'] = self.total_count
+        return Response(payload)
+
+    def get_paginated_response_schema(self, schema):
+        schema = super().get_paginated_response_schema(schema)
+        schema['properties']['count'] = {'type': 'integer', 'nullable': True}
+        schema['properties']['count_is_exact'] = {'type': 'boolean', 'nullable': True}
+        return schema
@@ -0,0 +1,86 @@
+"""
+Student profile PDF rendering.
+
+This module only depends on reportlab and works on plain ``profile`` dicts
+(see ``report_cards.load_profiles``), so it can be imported and run by
+process-pool workers that never set up Django or touch the database.
+"""
+from io import BytesIO
+
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.platypus import PageBreak, Paragraph, SimpleDocTemplate, Table, TableStyle
+
+TABLE_STYLE = [
+    ('BACKGROUND', (0, 0), (-1, 0), (0.8, 0.8, 0.8)),
+    ('TEXTCOLOR', (0, 0), (-1, 0), (0, 0, 0)),
+    ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+    ('BACKGROUND', (0, 1), (-1, -1), (0.9, 0.9, 0.9)),
+]
+
+
+def styled_table(data):
+    table = Table(data)
+    table.setStyle(TableStyle(TABLE_STYLE))
+    return table
+
+
+def profile_elements(profile, styles):
+    elements = []
+
+    # Title
+    elements.append(Paragraph(f"Student Profile: {profile['full_name']}", styles['Title']))
+
+    # Student Info
+    elements.append(styled_table([
+        ['Student ID', profile['student_id']],
+        ['Name', profile['full_name']],
+        ['Gender', profile['gender']],
+        ['Class', profile['class_name']],
+        ['Academic Year', str(profile['academic_year'])],
+        ['Status', profile['study_status']],
+    ]))
+    elements.append(Paragraph("<br/>", styles['Normal']))
+
+    # Grades: (subject name, score, grade, remark)
+    grades = profile['grades']
+    if grades:
+        elements.append(Paragraph("Academic Results", styles['Heading2']))
+        grade_data = [['Subject', 'Score', 'Grade', 'Remark']]
+        for subject_name, score, grade, remark in grades:
+            grade_data.append([subject_name, str(score), grade, remark or ''])
+        elements.append(styled_table(grade_data))
+
+        # Credit-weighted, from the student's academic summary
+        gpa = profile.get('gpa')
+        elements.append(Paragraph(f"GPA: {gpa:.2f}" if gpa is not None else "GPA: N/A", styles['Normal']))
+
+    return elements
+
+
+def profile_filename(profile):
+    return f"{profile['student_id']}_profile.pdf"
+
+
+def write_profile(fileobj, profile):
+    SimpleDocTemplate(fileobj, pagesize=letter).build(profile_elements(profile, getSampleStyleSheet()))
+
+
+def render_profile(profile):
+    """Return ``(filename, pdf bytes)`` for one profile; the process-pool task."""
+    buffer = BytesIO()
+    write_profile(buffer, profile)
+    return profile_filename(profile), buffer.getvalue()
+
+
+def write_merged(fileobj, profiles):
+    """Write every profile into one PDF, one student per page group."""
+    styles = getSampleStyleSheet()
+    elements = []
+    for profile in profiles:
+        if elements:
+            elements.append(PageBreak())
+        elements.extend(profile_elements(profile, styles))
+    SimpleDocTemplate(fileobj, pagesize=letter).build(elements)
@@ -0,0 +1,175 @@
+"""
+Permission resolution for the RBAC models.
+
+A user's effective permission set is the union of their custom permissions
+and the permissions of every role they hold. Resolving it walks three M2M
+tables, so the result is compiled once into a frozenset and kept in the
+shared cache. Cache keys embed a global RBAC version (bumped when a role's
+permissions change) and a per-user version (bumped when the user's roles or
+custom permissions change), so invalidation never has to enumerate keys.
+
+Teacher data scoping is cached the same way: the classes a teacher may see
+(classes scheduled for subjects they teach plus classes assigned to them)
+and the schedules of their subjects are compiled into a ``TeacherScope``
+keyed by a global and a per-teacher version.
+
+A version that is missing or evicted is recreated from the clock rather than
+from 0 or 1, so sets cached under an earlier version can never become live
+again. Invalidation only reaches other worker processes through a shared
+cache backend (see ``CACHE_URL`` in settings); with the per-process
+local-memory cache, entries are kept for ``LOCAL_CACHE_TIMEOUT`` seconds at
+most, which bounds how long another worker serves a stale set.
+"""
+import time
+from typing import NamedTuple
+
+from django.conf import settings
+from django.core.cache import cache
+
+GLOBAL_VERSION_KEY = 'rbac:version'
+USER_VERSION_KEY = 'rbac:user_version:{user_id}'
+PERMISSIONS_KEY = 'rbac:permissions:{user_id}:{global_version}:{user_version}'
+
+TEACHER_GLOBAL_VERSION_KEY = 'rbac:teacher_scope_version'
+TEACHER_VERSION_KEY = 'rbac:teacher_scope_version:{teacher_id}'
+TEACHER_SCOPE_KEY = 'rbac:teacher_scope:{teacher_id}:{global_version}:{teacher_version}'
+
+
+class TeacherScope(NamedTuple):
+    class_ids: frozenset
+    schedule_ids: frozenset
+
+
+# Longest a cached set may live when the cache is not shared between workers
+LOCAL_CACHE_TIMEOUT = 30
+
+
+def cache_is_shared():
+    """Whether the default cache is seen by every worker process."""
+    backend = settings.CACHES['default']['BACKEND']
+    return not backend.endswith(('.LocMemCache', '.DummyCache'))
+
+
+def _timeout():
+    timeout = getattr(settings, 'RBAC_PERMISSION_CACHE_TIMEOUT', 3600)
+    return timeout if cache_is_shared() else min(timeout, LOCAL_CACHE_TIMEOUT)
+
+
+def _versions(global_key, own_key):
+    keys = [global_key, own_key]
+    versions = cache.get_many(keys)
+    missing = [key for key in keys if key not in versions]
+    if missing:
+        # Never fall back to a constant: sets cached under it may still exist
+        seed = time.time_ns()
+        for key in missing:
+            cache.add(key, seed, None)
+        versions.update(cache.get_many(missing))
+        return tuple(versions.get(key, seed) for key in keys)
+    return versions[global_key], versions[own_key]
+
+
+def _bump(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Key is missing or was evicted; restart from the clock so the new
+        # version differs from every one used before.
+        cache.set(key, time.time_ns(), None)
+
+
+def compile_permissions(user):
+    """Build the permission name set for ``user`` from the database."""
+    permissions = set(user.custom_permissions.values_list('name', flat=True))
+    permissions.update(
+        user.roles.values_list('permissions__name', flat=True).exclude(permissions__name=None)
+    )
+    return frozenset(permissions)
+
+
+def prefetched_permissions(user):
+    """
+    Compile the permission set from ``prefetch_related('roles__permissions',
+    'custom_permissions')`` data without queries; ``None`` if not prefetched.
+    """
+    prefetched = getattr(user, '_prefetched_objects_cache', {})
+    if 'roles' not in prefetched or 'custom_permissions' not in prefetched:
+        return None
+    roles = user.roles.all()
+    if any('permissions' not in getattr(role, '_prefetched_objects_cache', {}) for role in roles):
+        return None
+    permissions = {perm.name for perm in user.custom_permissions.all()}
+    for role in roles:
+        permissions.update(perm.name for perm in role.permissions.all())
+    return frozenset(permissions)
+
+
+def get_user_permissions(user):
+    """
+    Return the frozenset of permission names granted to ``user``.
+
+    The set is memoised on the instance for the lifetime of the request and
+    shared between workers through the cache, so steady-state checks issue
+    no queries.
+    """
+    if user.pk is None:
+        return frozenset()
+
+    versions = _versions(GLOBAL_VERSION_KEY, USER_VERSION_KEY.format(user_id=user.pk))
+    memo = getattr(user, '_rbac_permissions', None)
+    if memo is not None and memo[0] == versions:
+        return memo[1]
+
+    key = PERMISSIONS_KEY.format(user_id=user.pk, global_version=versions[0], user_version=versions[1])
+    permissions = cache.get(key)
+    if permissions is None:
+        permissions = compile_permissions(user)
+        cache.set(key, permissions, _timeout())
+
+    user._rbac_permissions = (versions, permissions)
+    return permissions
+
+
+def invalidate_user_permissions(*user_ids):
+    """Drop the cached permission sets of the given users."""
+    for user_id in user_ids:
+        _bump(USER_VERSION_KEY.format(user_id=user_id))
+
+
+def invalidate_all_permissions():
+    """Drop every cached permission set, e.g. after a role's grants change."""
+    _bump(GLOBAL_VERSION_KEY)
+
+
+def compile_teacher_scope(teacher_id):
+    """Build the ``TeacherScope`` of ``teacher_id`` from the database."""
+    from .models import Schedule, Teacher
+
+    rows = Schedule.objects.filter(subject__assigned_teachers=teacher_id).values_list('schedule_id', 'class_enrolled_id')
+    schedule_ids = {schedule_id for schedule_id, _ in rows}
+    class_ids = {class_id for _, class_id in rows}
+    class_ids.update(Teacher.classes.through.objects.filter(teacher_id=teacher_id).values_list('class_id', flat=True))
+    return TeacherScope(frozenset(class_ids), frozenset(schedule_ids))
+
+
+def get_teacher_scope(teacher_id):
+    """Return the cached ``TeacherScope`` of ``teacher_id``."""
+    versions = _versions(TEACHER_GLOBAL_VERSION_KEY, TEACHER_VERSION_KEY.format(teacher_id=teacher_id))
+    key = TEACHER_SCOPE_KEY.format(teacher_id=teacher_id, global_version=versions[0], teacher_version=versions[1])
+    scope = cache.get(key)
+    if scope is None:
+        scope = compile_teacher_scope(teacher_id)
+        cache.set(key, scope, _timeout())
+    return scope
+
+
+def invalidate_teacher_scopes(*teacher_ids):
+    """Drop the cached scopes of the given teachers."""
+    for teacher_id in teacher_ids:
+        _bump(TEACHER_VERSION_KEY.format(teacher_id=teacher_id))
+
+
+def invalidate_all_teacher_scopes():
+    """Drop every cached teacher scope, e.g. after a schedule changes."""
+    _bump(TEACHER_GLOBAL_VERSION_KEY)
+
@@ -0,0 +1,85 @@
+"""
+Batch student profile PDFs ("report cards").
+
+``load_profiles`` reads a whole set of students and their grades in two
+queries. ``write_profiles_zip`` writes their PDFs into a ZIP in order,
+rendering batches of ``PROFILE_PDF_PARALLEL_THRESHOLD`` profiles or more in
+parallel on a ``ProcessPoolExecutor`` (one worker per core by default) and
+smaller ones in-process. ``write_profiles_merged``
+produces a single PDF instead; that is one reportlab document, so it is
+built serially.
+"""
+import multiprocessing
+import os
+import zipfile
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+
+from .models import Grade
+from .profile_pdf import render_profile, write_merged
+
+STUDENT_FIELDS = (
+    'student_id', 'full_name', 'gender', 'class_enrolled__class_name', 'academic_year', 'study_status',
+    'academic_summary__gpa',
+)
+
+
+def load_profiles(students):
+    """Return plain profile dicts for the ``students`` queryset, in its order."""
+    students = students.prefetch_related(None)
+    grades = defaultdict(list)
+    rows = (
+        Grade.objects.filter(student__in=students.order_by().values('pk'))
+        .order_by('pk')
+        .values_list('student_id', 'subject__subject_name', 'score', 'grade', 'remark')
+    )
+    for student_id, *grade in rows.iterator(chunk_size=2000):
+        grades[student_id].append(tuple(grade))
+
+    return [
+        {
+            'student_id': student_id,
+            'full_name': full_name,
+            'gender': gender,
+            'class_name': class_name,
+            'academic_year': academic_year,
+            'study_status': study_status,
+            'grades': grades.get(student_id, []),
+            'gpa': gpa,
+        }
+        for student_id, full_name, gender, class_name, academic_year, study_status, gpa in students.values_list(*STUDENT_FIELDS)
+    ]
+
+
+def worker_count(workers=None):
+    if workers is None:
+        workers = getattr(settings, 'PROFILE_PDF_WORKERS', None)
+    return workers or os.cpu_count() or 1
+
+
+def parallel_threshold():
+    return getattr(settings, 'PROFILE_PDF_PARALLEL_THRESHOLD', 50)
+
+
+def render_profiles(profiles, workers=None):
+    """Yield ``(filename, pdf bytes)`` for each profile, in order."""
+    workers = min(worker_count(workers), len(profiles))
+    if workers <= 1 or len(profiles) < parallel_threshold():
+        yield from map(render_profile, profiles)
+        return
+    # Spawned workers only import profile_pdf (reportlab), never Django, and
+    # avoid forking a process that is running request and writer threads.
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+        yield from pool.map(render_profile, profiles, chunksize=max(1, len(profiles) // (workers * 4)))
+
+
+def write_profiles_zip(fileobj, profiles, workers=None):
+    with zipfile.ZipFile(fileobj, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for filename, content in render_profiles(profiles, workers):
+            archive.writestr(filename, content)
+
+
+def write_profiles_merged(fileobj, profiles):
+    write_merged(fileobj, profiles)
@@ -0,0 +1,168 @@
+"""
+Ranked full-text search over students, teachers and subjects.
+
+``SearchDocument`` holds one row per indexed object. The full-text index over
+it depends on the database:
+
+* SQLite: an external-content FTS5 table (``search_documents_fts``) kept in
+  step with ``search_documents`` by triggers, ranked with bm25 and using
+  prefix indexes for type-ahead queries.
+* PostgreSQL: GIN indexes on the ``simple`` tsvector of title and body and on
+  the title trigrams, ranked with ``ts_rank_cd`` plus trigram similarity.
+* Anything else: ``icontains`` over ``search_documents`` so the endpoint
+  keeps working without a full-text index.
+
+The full-text tables, triggers and indexes are created by migration 0013.
+
+Documents are written by signals on save/delete. Bulk paths that bypass
+signals call ``index_objects``; ``rebuild_index`` recreates everything.
+"""
+import re
+
+from django.core.exceptions import EmptyResultSet
+from django.db import connection, transaction
+from django.db.models import Q
+
+from .models import Student, Teacher, Subject, SearchDocument
+
+# kind -> (model, title field, body fields)
+SOURCES = {
+    'student': (Student, 'full_name', ('student_id',)),
+    'teacher': (Teacher, 'full_name', ('email',)),
+    'subject': (Subject, 'subject_name', ('subject_id',)),
+}
+
+MODEL_KINDS = {model: kind for kind, (model, _, _) in SOURCES.items()}
+
+FTS_TABLE = 'search_documents_fts'
+
+
+def document_fields(kind, obj):
+    """Return ``(title, body)`` for ``obj`` (an instance or a values dict)."""
+    _, title_field, body_fields = SOURCES[kind]
+    get = obj.get if isinstance(obj, dict) else lambda field: getattr(obj, field)
+    return get(title_field) or '', ' '.join(str(get(field) or '') for field in body_fields)
+
+
+def index_instance(instance):
+    kind = MODEL_KINDS[type(instance)]
+    title, body = document_fields(kind, instance)
+    SearchDocument.objects.update_or_create(
+        kind=kind, object_id=str(instance.pk), defaults={'title': title, 'body': body},
+    )
+
+
+def remove_instance(instance):
+    SearchDocument.objects.filter(kind=MODEL_KINDS[type(instance)], object_id=str(instance.pk)).delete()
+
+
+def index_objects(kind, object_ids, batch_size=500):
+    """(Re)index the given objects of ``kind``; used by bulk write paths."""
+    model, title_field, body_fields = SOURCES[kind]
+    object_ids = [str(object_id) for object_id in object_ids]
+    with transaction.atomic():
+        SearchDocument.objects.filter(kind=kind, object_id__in=object_ids).delete()
+        rows = model.objects.filter(pk__in=object_ids).values('pk', title_field, *body_fields)
+        documents = []
+        for row in rows.iterator(chunk_size=batch_size):
+            title, body = document_fields(kind, row)
+            documents.append(SearchDocument(kind=kind, object_id=str(row['pk']), title=title, body=body))
+        SearchDocument.objects.bulk_create(documents, batch_size=batch_size)
+
+
+def rebuild_index(batch_size=500):
+    """Recreate every search document. Returns the number indexed per kind."""
+    counts = {}
+    with transaction.atomic():
+        SearchDocument.objects.all().delete()
+        for kind, (model, title_field, body_fields) in SOURCES.items():
+            rows = model.objects.order_by().values('pk', title_field, *body_fields).iterator(chunk_size=batch_size)
+            documents = []
+            counts[kind] = 0
+            for row in rows:
+                title, body = document_fields(kind, row)
+                documents.append(SearchDocument(kind=kind, object_id=str(row['pk']), title=title, body=body))
+                if len(documents) >= batch_size:
+                    SearchDocument.objects.bulk_create(documents)
+                    counts[kind] += len(documents)
+                    documents = []
+            SearchDocument.objects.bulk_create(documents)
+            counts[kind] += len(documents)
+        if connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+    return counts
+
+
+def _terms(query):
+    return re.findall(r'\w+', query.lower())
+
+
+def _scope_filter(scopes):
+    """
+    SQL and params restricting each kind in ``scopes`` to the objects of its
+    queryset, plus the kinds whose queryset can match nothing.
+    """
+    clauses, params, empty = [], [], set()
+    for kind, queryset in scopes.items():
+        if not queryset.query.where:
+            continue
+        try:
+            sql, sql_params = queryset.order_by().values('pk').query.sql_with_params()
+        except EmptyResultSet:
+            empty.add(kind)
+            continue
+        clauses.append(f' AND (d.kind <> %s OR d.object_id IN ({sql}))')
+        params += [kind, *sql_params]
+    return ''.join(clauses), params, empty
+
+
+def search(query, kinds=None, limit=20, scopes=None):
+    """
+    Return up to ``limit`` hits for ``query`` as dicts with kind, object_id,
+    title, body and score (higher is better). Every term is prefix-matched
+    and all terms must match. ``scopes`` maps kinds to querysets of the
+    objects that may be returned; the restriction is applied in the query so
+    the limit counts only visible hits.
+    """
+    scopes = scopes or {}
+    terms = _terms(query)
+    scope_sql, scope_params, empty = _scope_filter(scopes)
+    kinds = [kind for kind in (kinds or SOURCES) if kind in SOURCES and kind not in empty]
+    if not terms or not kinds:
+        return []
+
+    kind_placeholders = ', '.join(['%s'] * len(kinds))
+    if connection.vendor == 'sqlite':
+        sql = f"""
+            SELECT d.kind, d.object_id, d.title, d.body, -bm25({FTS_TABLE}, 10.0, 1.0) AS score
+            FROM {FTS_TABLE} JOIN search_documents d ON d.id = {FTS_TABLE}.rowid
+            WHERE {FTS_TABLE} MATCH %s AND d.kind IN ({kind_placeholders}){scope_sql}
+            ORDER BY score DESC LIMIT %s
+        """
+        params = [' '.join(f'"{term}"*' for term in terms), *kinds, *scope_params, limit]
+    elif connection.vendor == 'postgresql':
+        sql = f"""
+            SELECT d.kind, d.object_id, d.title, d.body,
+                   ts_rank_cd(to_tsvector('simple', d.title || ' ' || d.body), q) + similarity(d.title, %s) AS score
+            FROM search_documents d, to_tsquery('simple', %s) q
+            WHERE (to_tsvector('simple', d.title || ' ' || d.body) @@ q OR d.title %% %s)
+              AND d.kind IN ({kind_placeholders}){scope_sql}
+            ORDER BY score DESC LIMIT %s
+        """
+        params = [query, ' & '.join(f'{term}:*' for term in terms), query, *kinds, *scope_params, limit]
+    else:
+        documents = SearchDocument.objects.filter(kind__in=kinds)
+        for kind, queryset in scopes.items():
+            documents = documents.filter(~Q(kind=kind) | Q(object_id__in=queryset.values('pk')))
+        for term in terms:
+            documents = documents.filter(Q(title__icontains=term) | Q(body__icontains=term))
+        return [
+            {**row, 'score': 0.0}
+            for row in documents.order_by('title').values('kind', 'object_id', 'title', 'body')[:limit]
+        ]
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        columns = [column[0] for column in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
@@ -1,13 +1,65 @@
+from django.db import transaction
+from django.db.models import Prefetch
+from django.urls import reverse
 from rest_framework import serializers
-from .models import Student, Teacher, Subject, Class, Enrollment, Grade, Payment, Schedule, Invoice, Assessment, FinalGrade, User, Role, Permission
-
-class StudentSerializer(serializers.ModelSerializer):
+from rest_framework.validators import UniqueValidator
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken
+from .models import Student, Teacher, Subject, Class, Enrollment, Grade, Payment, Schedule, Invoice, Assessment, FinalGrade, User, Role, Permission, AuditLog, ExportJob
+from .authentication import add_user_claims, stateless_enabled
+from .tokens import CachedBlacklistRefreshToken
+from .rbac import prefetched_permissions
+from . import conditional, summaries
+
+class EagerLoadingMixin:
+    """
+    Lets a serializer declare the relations its fields read.
+
+    ``Meta.select_related`` and ``Meta.prefetch_related`` map a field name to
+    the lookups (strings or ``Prefetch`` objects) that field needs.
+    ``setup_eager_loading`` applies the lookups of every field the serializer
+    actually renders, so listings cost a fixed number of queries.
+    """
+
+    @classmethod
+    def eager_loading_plan(cls):
+        plan = cls.__dict__.get('_eager_loading_plan')
+        if plan is None:
+            meta = getattr(cls, 'Meta', None)
+            rendered = [name for name, field in cls().fields.items() if not field.write_only]
+            select, prefetch = [], []
+            for name in rendered:
+                for lookup in getattr(meta, 'select_related', {}).get(name, ()):
+                    if lookup not in select:
+                        select.append(lookup)
+                for lookup in getattr(meta, 'prefetch_related', {}).get(name, ()):
+                    if lookup not in prefetch:
+                        prefetch.append(lookup)
+            plan = (tuple(select), tuple(prefetch))
+            cls._eager_loading_plan = plan
+        return plan
+
+    @classmethod
+    def setup_eager_loading(cls, queryset):
+        select, prefetch = cls.eager_loading_plan()
+        if select:
+            queryset = queryset.select_related(*select)
+        if prefetch:
+            queryset = queryset.prefetch_related(*prefetch)
+        return queryset
+
+class StudentSerializer(EagerLoadingMixin, serializers.ModelSerializer):
     class_enrolled_name = serializers.SerializerMethodField()
     subjects = serializers.SerializerMethodField()
 
     class Meta:
         model = Student
         fields = '__all__'
+        select_related = {'class_enrolled_name': ['class_enrolled']}
+        prefetch_related = {
+            'subjects': [Prefetch('enrollments', queryset=Enrollment.objects.select_related('subject'))],
+        }
 
     def get_class_enrolled_name(self, obj):
         return obj.class_enrolled.class_name if obj.class_enrolled else ''
@@ -32,7 +84,7 @@ class StudentSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("Class enrollment is required.")
         return value
 
-class TeacherSerializer(serializers.ModelSerializer):
+class TeacherSerializer(EagerLoadingMixin, serializers.ModelSerializer):
     subjects = serializers.ListField(child=serializers.CharField(), write_only=True, required=False)
     subject_names = serializers.SerializerMethodField()
     classes = serializers.SerializerMethodField()
@@ -42,6 +94,11 @@ class TeacherSerializer(serializers.ModelSerializer):
     class Meta:
         model = Teacher
         fields = '__all__'
+        prefetch_related = {
+            'subject_names': ['subjects'],
+            'classes': ['classes'],
+            'class_names': ['classes'],
+        }
 
     def get_profile_picture_url(self, obj):
         if obj.profile_picture:
@@ -91,13 +148,17 @@ class TeacherSerializer(serializers.ModelSerializer):
             teacher.subjects.set(subjects)
         return teacher
 
-class SubjectSerializer(serializers.ModelSerializer):
+class SubjectSerializer(EagerLoadingMixin, serializers.ModelSerializer):
     assigned_teachers = serializers.SerializerMethodField()
     assigned_classes = serializers.SerializerMethodField()
 
     class Meta:
         model = Subject
         fields = '__all__'
+        prefetch_related = {
+            'assigned_teachers': ['assigned_teachers'],
+            'assigned_classes': ['assigned_classes'],
+        }
 
     def get_assigned_teachers(self, obj):
         return [teacher.teacher_id for teacher in obj.assigned_teachers.all()]
@@ -118,13 +179,17 @@ class SubjectSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("Credit must be greater than 0.")
         return value
 
-class ClassSerializer(serializers.ModelSerializer):
+class ClassSerializer(EagerLoadingMixin, serializers.ModelSerializer):
     subjects = serializers.SerializerMethodField()
     subject_names = serializers.SerializerMethodField()
 
     class Meta:
         model = Class
         fields = '__all__'
+        prefetch_related = {
+            'subjects': ['subjects'],
+            'subject_names': ['subjects'],
+        }
 
     def get_subjects(self, obj):
         return [subject.subject_id for subject in obj.subjects.all()]
@@ -155,13 +220,17 @@ class EnrollmentSerializer(serializers.ModelSerializer):
         model = Enrollment
         fields = '__all__'
 
-class AssessmentSerializer(serializers.ModelSerializer):
+class AssessmentSerializer(EagerLoadingMixin, serializers.ModelSerializer):
     subject_name = serializers.CharField(source='subject.subject_name', read_only=True)
     class_name = serializers.CharField(source='class_enrolled.class_name', read_only=True)
 
     class Meta:
         model = Assessment
         fields = '__all__'
+        select_related = {
+            'subject_name': ['subject'],
+            'class_name': ['class_enrolled'],
+        }
 
     def validate_weight(self, value):
         if value < 0 or value > 100:
@@ -173,14 +242,99 @@ class AssessmentSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("Max score must be greater than 0.")
         return value
 
-class GradeSerializer(serializers.ModelSerializer):
+class PrefetchedPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """
+    Resolves primary keys from ``context['prefetched'][model]`` when a bulk
+    list serializer has loaded them, instead of one query per row.
+    """
+
+    def to_internal_value(self, data):
+        prefetched = self.context.get('prefetched', {}).get(self.queryset.model)
+        if prefetched is None:
+            return super().to_internal_value(data)
+        if isinstance(data, bool):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        try:
+            return prefetched[str(data)]
+        except KeyError:
+            self.fail('does_not_exist', pk_value=data)
+
+
+class GradeListSerializer(serializers.ListSerializer):
+    """
+    Set-based validation and insert for ``GradeSerializer(many=True)``.
+
+    Every student, subject and assessment the batch refers to is read with one
+    ``in_bulk`` query each, and grade IDs are checked for uniqueness with one
+    more, instead of queries per row. Valid rows are inserted with a single
+    ``bulk_create``. With ``best_effort`` in the context invalid rows are kept
+    in ``row_errors`` (by index) and the rest are still saved; otherwise any
+    invalid row fails the whole batch.
+    """
+    batch_size = 1000
+
+    def prefetch(self, rows):
+        prefetched = {}
+        for name, field in self.child.fields.items():
+            if isinstance(field, PrefetchedPrimaryKeyRelatedField) and not field.read_only:
+                keys = {str(row[name]) for row in rows if row.get(name) not in (None, '')}
+                prefetched[field.queryset.model] = field.queryset.in_bulk(keys)
+        return prefetched
+
+    def to_internal_value(self, data):
+        if not isinstance(data, list):
+            return super().to_internal_value(data)
+        rows = [row for row in data if isinstance(row, dict)]
+        self._context['prefetched'] = self.prefetch(rows)
+
+        # Uniqueness of grade IDs is checked once for the batch below
+        grade_id = self.child.fields['grade_id']
+        grade_id.validators = [validator for validator in grade_id.validators if not isinstance(validator, UniqueValidator)]
+        taken = set(Grade.objects.filter(pk__in={str(row.get('grade_id')) for row in rows}).values_list('pk', flat=True))
+
+        validated, errors, seen = [], {}, set()
+        for index, item in enumerate(data):
+            try:
+                attrs = self.run_child_validation(item)
+                if attrs['grade_id'] in taken or attrs['grade_id'] in seen:
+                    raise serializers.ValidationError({'grade_id': ['grade with this grade id already exists.']})
+            except serializers.ValidationError as exc:
+                errors[index] = exc.detail
+            else:
+                seen.add(attrs['grade_id'])
+                validated.append(attrs)
+
+        self.row_errors = errors
+        if errors and not self.context.get('best_effort'):
+            raise serializers.ValidationError(errors)
+        return validated
+
+    def create(self, validated_data):
+        grades = [Grade(**attrs) for attrs in validated_data]
+        with transaction.atomic():
+            Grade.objects.bulk_create(grades, batch_size=self.batch_size)
+        # bulk_create sends no signals
+        summaries.schedule_refresh({grade.student_id for grade in grades})
+        conditional.touch_instances(grades)
+        return grades
+
+
+class GradeSerializer(EagerLoadingMixin, serializers.ModelSerializer):
     student_name = serializers.CharField(source='student.full_name', read_only=True)
     assessment_name = serializers.SerializerMethodField()
     subject_name = serializers.CharField(source='subject.subject_name', read_only=True)
 
+    serializer_related_field = PrefetchedPrimaryKeyRelatedField
+
     class Meta:
         model = Grade
         fields = '__all__'
+        list_serializer_class = GradeListSerializer
+        select_related = {
+            'student_name': ['student'],
+            'assessment_name': ['assessment'],
+            'subject_name': ['subject'],
+        }
 
     def get_assessment_name(self, obj):
         return obj.assessment.name if obj.assessment else None
@@ -190,15 +344,19 @@ class GradeSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("Score must be between 0 and 100.")
         return value
 
-class FinalGradeSerializer(serializers.ModelSerializer):
+class FinalGradeSerializer(EagerLoadingMixin, serializers.ModelSerializer):
     student_name = serializers.CharField(source='student.full_name', read_only=True)
     subject_name = serializers.CharField(source='subject.subject_name', read_only=True)
 
     class Meta:
         model = FinalGrade
         fields = '__all__'
+        select_related = {
+            'student_name': ['student'],
+            'subject_name': ['subject'],
+        }
 
-class PaymentSerializer(serializers.ModelSerializer):
+class PaymentSerializer(EagerLoadingMixin, serializers.ModelSerializer):
     student_name = serializers.CharField(source='student.full_name', read_only=True)
     student_id = serializers.CharField(write_only=True, required=True)
 
@@ -206,6 +364,7 @@ class PaymentSerializer(serializers.ModelSerializer):
         model = Payment
         fields = '__all__'
         read_only_fields = ['payment_id']
+        select_related = {'student_name': ['student']}
 
     def validate_amount(self, value):
         if value <= 0:
@@ -228,13 +387,17 @@ class PaymentSerializer(serializers.ModelSerializer):
 
         return super().create(validated_data)
 
-class InvoiceSerializer(serializers.ModelSerializer):
+class InvoiceSerializer(EagerLoadingMixin, serializers.ModelSerializer):
     student_name = serializers.CharField(source='student.full_name', read_only=True)
     payment_details = serializers.SerializerMethodField()
 
     class Meta:
         model = Invoice
         fields = '__all__'
+        select_related = {
+            'student_name': ['student'],
+            'payment_details': ['payment'],
+        }
 
     def get_payment_details(self, obj):
         return {
@@ -243,7 +406,7 @@ class InvoiceSerializer(serializers.ModelSerializer):
             'status': obj.payment.status,
         }
 
-class ScheduleSerializer(serializers.ModelSerializer):
+class ScheduleSerializer(EagerLoadingMixin, serializers.ModelSerializer):
     subject_name = serializers.CharField(source='subject.subject_name', read_only=True)
     class_name = serializers.CharField(source='class_enrolled.class_name', read_only=True)
     teacher_name = serializers.CharField(source='teacher.full_name', read_only=True)
@@ -251,6 +414,11 @@ class ScheduleSerializer(serializers.ModelSerializer):
     class Meta:
         model = Schedule
         fields = '__all__'
+        select_related = {
+            'subject_name': ['subject'],
+            'class_name': ['class_enrolled'],
+            'teacher_name': ['teacher'],
+        }
 
     def validate(self, data):
         # Conflict detection
@@ -282,7 +450,7 @@ class ScheduleSerializer(serializers.ModelSerializer):
 
         return data
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(EagerLoadingMixin, serializers.ModelSerializer):
     roles = serializers.SlugRelatedField(
         many=True,
         slug_field='name',
@@ -311,9 +479,18 @@ class UserSerializer(serializers.ModelSerializer):
         extra_kwargs = {
             'password': {'write_only': True}
         }
+        prefetch_related = {
+            'roles': ['roles'],
+            'custom_permissions': ['custom_permissions'],
+            'all_permissions': ['roles__permissions', 'custom_permissions'],
+        }
 
     def get_all_permissions(self, obj):
-        return list(obj.get_all_permissions())
+        # Listings prefetch roles__permissions and custom_permissions
+        permissions = prefetched_permissions(obj)
+        if permissions is None:
+            permissions = obj.get_all_permissions()
+        return sorted(permissions)
 
     def create(self, validated_data):
         roles_data = validated_data.pop('roles', [])
@@ -384,7 +561,7 @@ class UserSerializer(serializers.ModelSerializer):
 
         return instance
 
-class RoleSerializer(serializers.ModelSerializer):
+class RoleSerializer(EagerLoadingMixin, serializers.ModelSerializer):
     permissions = serializers.SlugRelatedField(
         many=True,
         slug_field='name',
@@ -394,8 +571,44 @@ class RoleSerializer(serializers.ModelSerializer):
     class Meta:
         model = Role
         fields = ['id', 'name', 'description', 'permissions', 'is_default']
+        prefetch_related = {'permissions': ['permissions']}
 
 class PermissionSerializer(serializers.ModelSerializer):
     class Meta:
         model = Permission
-        fields = ['id', 'name', 'description']
\ No newline at end of file
+        fields = ['id', 'name', 'description']
+
+class AuditLogSerializer(EagerLoadingMixin, serializers.ModelSerializer):
+    username = serializers.CharField(source='user.username', read_only=True, default=None)
+
+    class Meta:
+        model = AuditLog
+        fields = ['id', 'user', 'username', 'action', 'model_name', 'object_id', 'details', 'ip_address', 'user_agent', 'timestamp']
+        select_related = {'username': ['user']}
+
+class ExportJobSerializer(serializers.ModelSerializer):
+    url = serializers.HyperlinkedIdentityField(view_name='exportjob-detail')
+    download_url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ExportJob
+        fields = ['id', 'url', 'kind', 'status', 'filename', 'error', 'created_at', 'started_at', 'finished_at', 'expires_at', 'download_url']
+
+    def get_download_url(self, obj):
+        if obj.status != 'Completed':
+            return None
+        request = self.context.get('request')
+        path = reverse('exportjob-download', kwargs={'pk': obj.pk})
+        return request.build_absolute_uri(path) if request else path
+
+class ClaimsTokenRefreshSerializer(TokenRefreshSerializer):
+    token_class = CachedBlacklistRefreshToken
+
+    def validate(self, attrs):
+        data = super().validate(attrs)
+        if stateless_enabled():
+            # Re-issue claims so grant changes take effect on refresh
+            access = AccessToken(data['access'])
+            user = User.objects.get(pk=access[api_settings.USER_ID_CLAIM])
+            data['access'] = str(add_user_claims(access, user))
+        return data
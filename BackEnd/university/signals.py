@@ -0,0 +1,157 @@
+from django.db.models.signals import m2m_changed, pre_delete, post_delete, post_save
+from django.dispatch import receiver
+
+from .models import (
+    User, Role, Permission, Student, Teacher, Class, Subject, Payment, Schedule, Grade, FinalGrade,
+    Enrollment, Assessment, Invoice, StudentAcademicSummary,
+)
+from .rbac import (
+    invalidate_user_permissions, invalidate_all_permissions,
+    invalidate_teacher_scopes, invalidate_all_teacher_scopes,
+)
+from .authentication import revoke_user_tokens
+from .dashboard import invalidate_snapshot
+from . import conditional, search, summaries
+
+M2M_ACTIONS = ('post_add', 'post_remove', 'post_clear')
+
+
+@receiver(m2m_changed, sender=User.roles.through)
+@receiver(m2m_changed, sender=User.custom_permissions.through)
+def user_grants_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in M2M_ACTIONS:
+        return
+    if not reverse:
+        user_ids = [instance.pk]
+        invalidate_user_permissions(instance.pk)
+    elif pk_set:
+        # role.users.add(...) / permission.users.add(...)
+        user_ids = list(pk_set)
+        invalidate_user_permissions(*pk_set)
+    else:
+        # Reverse clear: the affected users are no longer known.
+        user_ids = list(User.objects.values_list('pk', flat=True))
+        invalidate_all_permissions()
+    # Permission claims embedded in stateless access tokens are now stale.
+    revoke_user_tokens(*user_ids)
+
+
+@receiver(m2m_changed, sender=Role.permissions.through)
+def role_permissions_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in M2M_ACTIONS:
+        return
+    invalidate_all_permissions()
+    if not reverse:
+        users = User.objects.filter(roles=instance)
+    elif pk_set:
+        users = User.objects.filter(roles__in=pk_set)
+    else:
+        users = User.objects.filter(roles__isnull=False)
+    revoke_user_tokens(*users.values_list('pk', flat=True).distinct())
+
+
+@receiver(pre_delete, sender=Role)
+def role_deleting(sender, instance, **kwargs):
+    revoke_user_tokens(*instance.users.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Role)
+@receiver(post_delete, sender=Permission)
+def rbac_object_deleted(sender, **kwargs):
+    invalidate_all_permissions()
+
+
+@receiver(m2m_changed, sender=Teacher.subjects.through)
+@receiver(m2m_changed, sender=Teacher.classes.through)
+def teacher_assignments_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in M2M_ACTIONS:
+        return
+    if not reverse:
+        invalidate_teacher_scopes(instance.pk)
+    elif pk_set:
+        # subject.assigned_teachers.add(...) / class.assigned_teachers.add(...)
+        invalidate_teacher_scopes(*pk_set)
+    else:
+        invalidate_all_teacher_scopes()
+
+
+@receiver(post_save, sender=Schedule)
+@receiver(post_delete, sender=Schedule)
+@receiver(post_delete, sender=Subject)
+@receiver(post_delete, sender=Class)
+def teacher_scope_data_changed(sender, **kwargs):
+    # A schedule can move between subjects, so any teacher may be affected.
+    invalidate_all_teacher_scopes()
+
+
+DASHBOARD_MODELS = (User, Student, Teacher, Class, Subject, Payment)
+
+# Saves that touch only these fields do not affect any dashboard figure
+DASHBOARD_IGNORED_FIELDS = {'last_login', 'last_login_ip', 'token_version'}
+
+
+def dashboard_data_changed(sender, update_fields=None, **kwargs):
+    if update_fields and set(update_fields) <= DASHBOARD_IGNORED_FIELDS:
+        return
+    invalidate_snapshot()
+
+
+for model in DASHBOARD_MODELS:
+    post_save.connect(dashboard_data_changed, sender=model, dispatch_uid=f'dashboard_post_save_{model.__name__}')
+    post_delete.connect(dashboard_data_changed, sender=model, dispatch_uid=f'dashboard_post_delete_{model.__name__}')
+
+
+def search_source_saved(sender, instance, **kwargs):
+    search.index_instance(instance)
+
+
+def search_source_deleted(sender, instance, **kwargs):
+    search.remove_instance(instance)
+
+
+for model in search.MODEL_KINDS:
+    post_save.connect(search_source_saved, sender=model, dispatch_uid=f'search_post_save_{model.__name__}')
+    post_delete.connect(search_source_deleted, sender=model, dispatch_uid=f'search_post_delete_{model.__name__}')
+
+
+@receiver(post_save, sender=Grade)
+@receiver(post_delete, sender=Grade)
+@receiver(post_save, sender=FinalGrade)
+@receiver(post_delete, sender=FinalGrade)
+def academic_record_changed(sender, instance, **kwargs):
+    summaries.schedule_refresh([instance.student_id])
+
+
+@receiver(post_save, sender=Subject)
+def subject_saved(sender, instance, created, **kwargs):
+    # The credit weighting of every student graded in the subject may change.
+    if not created:
+        student_ids = set(Grade.objects.filter(subject=instance).values_list('student_id', flat=True))
+        student_ids.update(FinalGrade.objects.filter(subject=instance).values_list('student_id', flat=True))
+        summaries.schedule_refresh(student_ids)
+
+
+CONDITIONAL_MODELS = (
+    User, Role, Permission, Student, Teacher, Class, Subject, Enrollment, Assessment,
+    Grade, FinalGrade, Payment, Invoice, Schedule, StudentAcademicSummary,
+)
+
+
+def conditional_data_changed(sender, instance, **kwargs):
+    conditional.touch_instance(instance)
+
+
+for model in CONDITIONAL_MODELS:
+    post_save.connect(conditional_data_changed, sender=model, dispatch_uid=f'conditional_post_save_{model.__name__}')
+    post_delete.connect(conditional_data_changed, sender=model, dispatch_uid=f'conditional_post_delete_{model.__name__}')
+
+
+@receiver(m2m_changed, dispatch_uid='conditional_m2m_changed')
+def conditional_relations_changed(sender, instance, action, model, pk_set, **kwargs):
+    if action not in M2M_ACTIONS:
+        return
+    conditional.touch(type(instance), instance.pk)
+    if pk_set:
+        conditional.touch(model, *pk_set)
+    else:
+        conditional.touch_all(model)
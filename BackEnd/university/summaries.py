@@ -0,0 +1,125 @@
+"""
+Denormalised GPA table (``StudentAcademicSummary``).
+
+A student's score in a subject is their mean ``FinalGrade.final_score`` for
+that subject when one exists, otherwise the mean of their ``Grade`` scores.
+GPA is the credit-weighted mean of those subject scores and stays on the
+0-100 scale of the grades; ``total_credits`` is the sum of the credits of the
+subjects counted. ``term_gpa`` holds the credit-weighted final scores per
+term, keyed like ``"Fall 2024"``.
+
+Rows are refreshed by signals whenever a Grade or FinalGrade changes, once
+the surrounding transaction commits (so cascading deletes of a student do
+not recreate its row); bulk paths that bypass signals call
+``schedule_refresh`` themselves and ``rebuild_summaries`` recomputes every
+row.
+"""
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Avg
+
+from . import conditional
+from .models import Grade, FinalGrade, Student, StudentAcademicSummary
+
+SUMMARY_FIELDS = ['gpa', 'total_credits', 'term_gpa', 'updated_at']
+
+
+def _weighted_mean(pairs):
+    """Credit-weighted mean of ``(score, credit)`` pairs; plain mean if no credits."""
+    pairs = list(pairs)
+    if not pairs:
+        return None
+    credits = sum(max(credit, 0) for _, credit in pairs)
+    if not credits:
+        return sum(score for score, _ in pairs) / len(pairs)
+    return sum(score * max(credit, 0) for score, credit in pairs) / credits
+
+
+def compute_summaries(student_ids):
+    """Return ``{student pk: StudentAcademicSummary}`` for students that have any grade."""
+    student_ids = list(student_ids)
+    subject_scores = defaultdict(dict)  # student -> subject -> (score, credit)
+    terms = defaultdict(lambda: defaultdict(list))  # student -> term -> [(score, credit)]
+
+    grade_rows = (
+        Grade.objects.filter(student_id__in=student_ids)
+        .values('student_id', 'subject_id', 'subject__credit')
+        .annotate(score=Avg('score'))
+        .order_by()
+    )
+    for row in grade_rows:
+        subject_scores[row['student_id']][row['subject_id']] = (row['score'], row['subject__credit'])
+
+    final_rows = (
+        FinalGrade.objects.filter(student_id__in=student_ids)
+        .values('student_id', 'subject_id', 'subject__credit', 'semester', 'year', 'final_score')
+        .order_by()
+    )
+    finals = defaultdict(lambda: defaultdict(list))  # student -> subject -> [(score, credit)]
+    for row in final_rows:
+        pair = (row['final_score'], row['subject__credit'])
+        finals[row['student_id']][row['subject_id']].append(pair)
+        terms[row['student_id']][f"{row['semester']} {row['year']}"].append(pair)
+    for student_id, subjects in finals.items():
+        for subject_id, pairs in subjects.items():
+            subject_scores[student_id][subject_id] = (sum(score for score, _ in pairs) / len(pairs), pairs[0][1])
+
+    summaries = {}
+    for student_id, subjects in subject_scores.items():
+        summaries[student_id] = StudentAcademicSummary(
+            student_id=student_id,
+            gpa=_weighted_mean(subjects.values()),
+            total_credits=sum(max(credit, 0) for _, credit in subjects.values()),
+            term_gpa={term: _weighted_mean(pairs) for term, pairs in sorted(terms[student_id].items())},
+        )
+    return summaries
+
+
+def refresh_students(student_ids):
+    """Recompute the summaries of ``student_ids``; students with no grades lose theirs."""
+    student_ids = set(student_ids)
+    if not student_ids:
+        return
+    summaries = compute_summaries(student_ids)
+    with transaction.atomic():
+        StudentAcademicSummary.objects.filter(student_id__in=student_ids - summaries.keys()).delete()
+        StudentAcademicSummary.objects.bulk_create(
+            summaries.values(),
+            update_conflicts=True,
+            unique_fields=['student'],
+            update_fields=SUMMARY_FIELDS,
+        )
+    # bulk_create sends no signals
+    conditional.touch(StudentAcademicSummary, *student_ids)
+    conditional.touch(Student, *student_ids)
+
+
+def schedule_refresh(student_ids):
+    """Refresh the summaries of ``student_ids`` when the current transaction commits."""
+    student_ids = set(student_ids)
+    if student_ids:
+        transaction.on_commit(lambda: refresh_students(student_ids))
+
+
+def rebuild_summaries(batch_size=1000):
+    """Recompute every summary in batches of students. Returns the number of rows written."""
+    written = 0
+    with transaction.atomic():
+        StudentAcademicSummary.objects.all().delete()
+        student_ids = Student.objects.order_by('pk').values_list('pk', flat=True)
+        batch = []
+        for student_id in student_ids.iterator(chunk_size=batch_size):
+            batch.append(student_id)
+            if len(batch) >= batch_size:
+                written += _write(compute_summaries(batch))
+                batch = []
+        written += _write(compute_summaries(batch))
+    conditional.touch_all(StudentAcademicSummary)
+    conditional.touch_all(Student)
+    return written
+
+
+def _write(summaries):
+    StudentAcademicSummary.objects.bulk_create(summaries.values())
+    return len(summaries)
@@ -1,14 +1,50 @@
+import gzip
+import importlib
 import json
-from django.test import TestCase
+import os
+import tempfile
+import zipfile
+from io import BytesIO, StringIO
+from datetime import datetime, timedelta, timezone as dt_timezone
+from unittest import mock
+import openpyxl
+from django.db import connection, OperationalError
+from django.conf import settings
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.files.uploadedfile import SimpleUploadedFile
 from django.contrib.auth import get_user_model
 from django.urls import reverse
+from django.apps import apps as django_apps
 from django.db.models import Avg
 from rest_framework.test import APITestCase
 from rest_framework import status
-from .models import Student, Teacher, Class, Subject, Grade
+from .models import Student, Teacher, Class, Subject, Enrollment, Assessment, Grade, FinalGrade, Schedule, Role, Permission, AuditLog, PasswordResetToken, SearchDocument, ExportJob, StudentAcademicSummary, next_ids
+from .authentication import get_token_version, revoke_user_tokens
+from .checks import stateless_jwt_cache_check
+from . import grading, rbac
+from .audit import AuditLogWriter, archive_audit_logs
+from .throttling import login_throttle
+from .tokens import blacklist_cache, prune_expired_tokens
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
 
 User = get_user_model()
 
+def create_student(student_id, test_class, **fields):
+    """Create a student in ``test_class`` with placeholder details; ``fields`` override them."""
+    details = {
+        'full_name': 'Test Student',
+        'gender': 'Male',
+        'date_of_birth': '2000-01-01',
+        'academic_year': 2024,
+        'address': 'Test Address',
+    }
+    details.update(fields)
+    return Student.objects.create(student_id=student_id, class_enrolled=test_class, **details)
+
 class AuthenticationTestCase(APITestCase):
     def setUp(self):
         self.register_url = reverse('register')
@@ -206,6 +242,1193 @@ class PermissionTestCase(APITestCase):
         # Should only see their own data or assigned data
         self.assertEqual(response.status_code, status.HTTP_200_OK)
 
+class PermissionCacheTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.view_user = Permission.objects.create(name='view_user')
+        self.add_user = Permission.objects.create(name='add_user')
+        self.role = Role.objects.create(name='Auditor')
+        self.role.permissions.add(self.view_user)
+        self.user = User.objects.create_user(username='rbac', password='rbac12345')
+        self.user.roles.add(self.role)
+
+    def test_steady_state_checks_are_query_free(self):
+        """Test that repeated permission checks are served from the cache"""
+        self.assertTrue(self.user.has_permission('view_user'))
+        fresh = User.objects.get(pk=self.user.pk)
+        with self.assertNumQueries(0):
+            self.assertTrue(fresh.has_permission('view_user'))
+            self.assertFalse(fresh.has_permission('add_user'))
+
+    def test_grant_changes_invalidate_cache(self):
+        """Test that M2M changes on users and roles invalidate cached sets"""
+        self.assertFalse(self.user.has_permission('add_user'))
+        self.user.custom_permissions.add(self.add_user)
+        self.assertTrue(self.user.has_permission('add_user'))
+
+        self.role.permissions.remove(self.view_user)
+        self.assertFalse(self.user.has_permission('view_user'))
+
+        self.role.users.remove(self.user)
+        self.role.permissions.add(self.view_user)
+        self.assertFalse(self.user.has_permission('view_user'))
+
+    def test_evicted_version_does_not_revive_old_sets(self):
+        """Test that losing a version key never brings back a set cached before a revoke"""
+        self.assertTrue(self.user.has_permission('view_user'))
+        cache.delete(rbac.USER_VERSION_KEY.format(user_id=self.user.pk))
+        self.user.roles.remove(self.role)
+        self.assertFalse(User.objects.get(pk=self.user.pk).has_permission('view_user'))
+
+    def test_local_cache_bounds_staleness(self):
+        """Test that sets are only cached briefly when the cache is not shared between workers"""
+        self.assertFalse(rbac.cache_is_shared())
+        self.assertEqual(rbac._timeout(), rbac.LOCAL_CACHE_TIMEOUT)
+        with override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': 'redis://cache'}}):
+            self.assertEqual(rbac._timeout(), 3600)
+
+@override_settings(STATELESS_JWT_AUTH=True)
+class StatelessJWTTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        role = Role.objects.create(name='Administrator')
+        role.permissions.add(Permission.objects.create(name='view_user'))
+        self.user = User.objects.create_user(username='claims', password='claims12345', role='Admin')
+        self.user.roles.add(role)
+        self.user.refresh_from_db()
+        tokens = self.client.post(reverse('login'), {'username': 'claims', 'password': 'claims12345'}, format='json').data
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {tokens['access']}")
+        self.refresh = tokens['refresh']
+
+    def test_authorization_served_from_claims(self):
+        """Test that authenticated RBAC checks need no database queries"""
+        url = reverse('system_health')
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_200_OK)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(url).status_code, status.HTTP_200_OK)
+
+    def test_revoked_token_rejected_until_refresh(self):
+        """Test that bumping the token version forces a claims refresh"""
+        url = reverse('system_health')
+        revoke_user_tokens(self.user.pk)
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_401_UNAUTHORIZED)
+
+        response = self.client.post(reverse('token_refresh'), {'refresh': self.refresh}, format='json')
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.data['access']}")
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_200_OK)
+
+    def test_token_versions_expire_and_need_a_shared_cache(self):
+        """Test that cached token versions expire and that a per-process cache is refused"""
+        with mock.patch('university.authentication.cache') as version_cache:
+            version_cache.get.return_value = None
+            get_token_version(self.user.pk)
+        timeout = version_cache.set.call_args.args[2]
+        self.assertIsNotNone(timeout)
+        self.assertLessEqual(timeout, settings.SIMPLE_JWT['ACCESS_TOKEN_LIFETIME'].total_seconds())
+
+        self.assertEqual([error.id for error in stateless_jwt_cache_check(None)], ['university.E001'])
+        with override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': 'redis://cache'}}):
+            self.assertEqual(stateless_jwt_cache_check(None), [])
+
+class AuditLogWriterTestCase(TestCase):
+    def entry(self, **overrides):
+        return {'action': 'VIEW', 'model_name': 'Student', 'user_agent': '', 'timestamp': timezone.now(), **overrides}
+
+    def test_batched_flush_and_backpressure(self):
+        """Test that queued entries are bulk-written and overflow is counted"""
+        writer = AuditLogWriter(batch_size=2, queue_size=3, enqueue_timeout=0)
+        accepted = [writer.submit(self.entry(object_id=str(i))) for i in range(4)]
+        self.assertEqual(accepted, [True, True, True, False])
+        self.assertEqual(writer.stats['backpressured'], 1)
+        self.assertEqual(writer.stats['dropped'], 1)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(writer.flush(), 3)
+        self.assertEqual(sum(q['sql'].startswith('INSERT') for q in queries), 2)
+        self.assertEqual(AuditLog.objects.count(), 3)
+        self.assertEqual(writer.stats['written'], 3)
+
+    def test_failed_batches_are_spooled_and_replayed(self):
+        """Test that batches survive in the spool file when the database is unavailable"""
+        with tempfile.TemporaryDirectory() as tmp:
+            spool = os.path.join(tmp, 'audit.jsonl')
+            writer = AuditLogWriter(spool_file=spool)
+            writer.submit(self.entry(object_id='spooled'))
+            writer.submit(self.entry(action=None))
+            with mock.patch.object(AuditLog.objects, 'bulk_create', side_effect=OperationalError('database is locked')):
+                writer.flush()
+            self.assertEqual(writer.stats['spooled'], 2)
+            self.assertEqual(AuditLog.objects.count(), 0)
+
+            replayer = AuditLogWriter(spool_file=spool)
+            self.assertEqual(replayer.replay_spool(), 2)
+            self.assertFalse(os.path.exists(spool))
+            self.assertEqual(replayer.stats['dropped'], 1)
+            self.assertTrue(AuditLog.objects.filter(object_id='spooled').exists())
+
+class AuditLogQueryTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        role = Role.objects.create(name='Auditor')
+        role.permissions.add(Permission.objects.create(name='view_audit_log'))
+        self.auditor = User.objects.create_user(username='auditor', password='auditor123')
+        self.auditor.roles.add(role)
+        start = datetime(2024, 1, 30, tzinfo=dt_timezone.utc)
+        for day in range(5):
+            AuditLog.objects.create(action='UPDATE', model_name='Student', object_id='STU001',
+                                    timestamp=start + timedelta(days=day))
+        AuditLog.objects.create(action='DELETE', model_name='Payment', object_id='P000001', timestamp=start)
+
+    def test_keyset_pages_and_filters(self):
+        """Test that the audit endpoint filters and pages by cursor"""
+        self.client.force_authenticate(user=self.auditor)
+        url = reverse('auditlog-list')
+        response = self.client.get(url, {'model_name': 'Student', 'page_size': 3})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), 3)
+        self.assertNotIn('count', response.data)
+
+        second = self.client.get(response.data['next'])
+        timestamps = [row['timestamp'] for row in response.data['results'] + second.data['results']]
+        self.assertEqual(len(timestamps), 5)
+        self.assertEqual(timestamps, sorted(timestamps, reverse=True))
+
+    def test_filters_parse_timestamps_and_reject_bad_input(self):
+        """Test that since/until accept dates and that malformed filters get a 400"""
+        self.client.force_authenticate(user=self.auditor)
+        url = reverse('auditlog-list')
+        response = self.client.get(url, {'model_name': 'Student', 'since': '2024-01-31', 'until': '2024-02-02T00:00:00Z'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), 2)
+
+        for params in ({'since': 'garbage'}, {'until': '2024-13-45'}, {'user_id': 'abc'}):
+            self.assertEqual(self.client.get(url, params).status_code, status.HTTP_400_BAD_REQUEST, params)
+
+    def test_teacher_activity_limit_is_clamped(self):
+        """Test that a non-positive activity limit still returns the latest entry"""
+        Teacher.objects.create(teacher_id='T001', full_name='Alan Turing', gender='Male', phone='1', email='alan@test.com')
+        AuditLog.objects.create(action='UPDATE', model_name='Teacher', object_id='T001')
+        url = reverse('teacher-activity-log', args=['T001'])
+        for limit in (-5, 0):
+            response = self.client.get(url, {'limit': limit})
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(len(response.data['activity']), 1)
+
+    def test_requires_audit_permission(self):
+        """Test that users without view_audit_log are refused"""
+        self.client.force_authenticate(user=User.objects.create_user(username='plain', password='plain12345'))
+        self.assertEqual(self.client.get(reverse('auditlog-list')).status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_archive_moves_rows_into_monthly_files(self):
+        """Test that archived rows are written per month and deleted"""
+        with tempfile.TemporaryDirectory() as tmp:
+            archived = archive_audit_logs(datetime(2024, 2, 2, tzinfo=dt_timezone.utc), tmp, batch_size=2)
+            self.assertEqual(archived, 4)
+            self.assertEqual(sorted(os.listdir(tmp)), ['audit_logs_2024-01.jsonl.gz', 'audit_logs_2024-02.jsonl.gz'])
+            with gzip.open(os.path.join(tmp, 'audit_logs_2024-01.jsonl.gz'), 'rt') as archive:
+                rows = [json.loads(line) for line in archive]
+            self.assertEqual(len(rows), 3)
+        self.assertEqual(AuditLog.objects.count(), 2)
+
+class LoginThrottleTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        User.objects.create_user(username='target', password='correct-horse')
+
+    def test_rejects_before_authenticating(self):
+        """Test that over-limit attempts are refused without hashing or queries"""
+        url = reverse('login')
+        for _ in range(5):
+            response = self.client.post(url, {'username': 'target', 'password': 'wrong'}, format='json')
+            self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        with self.assertNumQueries(0), mock.patch('university.views.authenticate') as authenticate:
+            response = self.client.post(url, {'username': 'Target', 'password': 'correct-horse'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertIn('Retry-After', response)
+        authenticate.assert_not_called()
+
+    def test_failures_collapse_into_summary_records(self):
+        """Test that repeated failures produce a single summary audit entry"""
+        for _ in range(3):
+            self.client.post(reverse('login'), {'username': 'target', 'password': 'wrong'}, format='json')
+        self.assertEqual(AuditLog.objects.filter(action='LOGIN').count(), 1)
+        stats = login_throttle.stats()
+        self.assertEqual(stats['failures'], 3)
+        self.assertEqual(stats['summaries'], 1)
+
+class TokenBlacklistTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        blacklist_cache.reset()
+        self.user = User.objects.create_user(username='rotator', password='rotator123')
+        self.refresh = self.client.post(reverse('login'), {'username': 'rotator', 'password': 'rotator123'}, format='json').data['refresh']
+
+    def test_rotated_token_rejected_from_memory(self):
+        """Test that reusing a rotated refresh token is refused without a blacklist query"""
+        url = reverse('token_refresh')
+        self.assertEqual(self.client.post(url, {'refresh': self.refresh}, format='json').status_code, status.HTTP_200_OK)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(url, {'refresh': self.refresh}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertFalse(any('blacklistedtoken' in q['sql'] for q in queries))
+
+    def test_prune_removes_only_expired_tokens(self):
+        """Test that expired outstanding and blacklisted rows are pruned in batches"""
+        past = timezone.now() - timedelta(days=2)
+        for jti in ('old-1', 'old-2'):
+            token = OutstandingToken.objects.create(user=self.user, jti=jti, token=jti, expires_at=past)
+            BlacklistedToken.objects.create(token=token)
+
+        self.assertEqual(prune_expired_tokens(batch_size=1), 2)
+        self.assertEqual(OutstandingToken.objects.count(), 1)
+        self.assertFalse(BlacklistedToken.objects.exists())
+
+class PasswordResetTokenTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='forgetful', email='forgetful@test.com', password='old-password')
+
+    def test_token_is_hashed_and_single_use(self):
+        """Test that reset tokens are stored hashed and can be used once"""
+        token = PasswordResetToken.issue(self.user)
+        self.assertFalse(PasswordResetToken.objects.filter(token_hash=token).exists())
+
+        url = reverse('password_reset_confirm')
+        response = self.client.post(url, {'token': token, 'new_password': 'new-password'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.check_password('new-password'))
+
+        response = self.client.post(url, {'token': token, 'new_password': 'again'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_expired_tokens_rejected_and_purged(self):
+        """Test that expired tokens cannot be used and are purged"""
+        token = PasswordResetToken.issue(self.user)
+        PasswordResetToken.objects.update(expires_at=timezone.now() - timedelta(minutes=1))
+        self.assertIsNone(PasswordResetToken.consume(token))
+        self.assertEqual(PasswordResetToken.purge_expired(), 1)
+
+class DashboardSnapshotTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.test_class = Class.objects.create(class_id='CS101', class_name='Computer Science 101', department='Computer Science', year=2024)
+
+    def test_snapshot_is_cached_until_data_changes(self):
+        """Test that the dashboard is served from cache and invalidated on writes"""
+        url = reverse('system_stats')
+        first = self.client.get(url)
+        self.assertEqual(first.data['student_stats']['total_students'], 0)
+        self.assertIn('generated_at', first.data)
+
+        with self.assertNumQueries(0):
+            self.client.get(url)
+
+        create_student('STU001', self.test_class)
+        self.assertEqual(self.client.get(url).data['student_stats']['total_students'], 1)
+
+class UserListingQueryTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.role = Role.objects.create(name='Administrator')
+        self.role.permissions.add(Permission.objects.create(name='view_user'), Permission.objects.create(name='add_user'))
+        self.custom = Permission.objects.create(name='view_student')
+        self.admin = User.objects.create_user(username='admin', password='admin12345', role='Admin')
+        self.admin.roles.add(self.role)
+        self.client.force_authenticate(user=self.admin)
+
+    def add_users(self, count):
+        for i in range(count):
+            user = User.objects.create_user(username=f'user{User.objects.count()}', password='pass12345')
+            user.roles.add(self.role)
+            user.custom_permissions.add(self.custom)
+
+    def count_list_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('user-list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return len(queries)
+
+    def test_query_count_independent_of_page_size(self):
+        """Test that listing users costs the same number of queries for any size"""
+        self.add_users(2)
+        self.count_list_queries()
+        small = self.count_list_queries()
+        self.add_users(10)
+        self.assertEqual(self.count_list_queries(), small)
+
+    def test_prefetched_permissions_match_resolved(self):
+        """Test that serialized permissions match the RBAC resolver"""
+        self.add_users(1)
+        response = self.client.get(reverse('user-list'))
+        for row in response.data['results']:
+            user = User.objects.get(pk=row['id'])
+            self.assertEqual(set(row['all_permissions']), user.get_all_permissions())
+
+class KeysetPaginationTestCase(APITestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(username='admin', password='adminpass123', role='Admin')
+        self.client.force_authenticate(user=self.admin)
+        self.test_class = Class.objects.create(
+            class_id='CS101',
+            class_name='Computer Science 101',
+            department='Computer Science',
+            year=2024
+        )
+        for i in range(5):
+            create_student(f'STU00{i}', self.test_class, full_name=f'Student {i % 2}')
+
+    def walk(self, params, url_name='student-list', key='student_id'):
+        response = self.client.get(reverse(url_name), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        rows = list(response.data['results'])
+        while response.data['next']:
+            response = self.client.get(response.data['next'])
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            rows.extend(response.data['results'])
+        return [row[key] for row in rows]
+
+    def test_pages_follow_requested_sort(self):
+        """Test that cursor pages respect sort_by/sort_order without gaps"""
+        self.assertEqual(self.walk({'page_size': 2, 'sort_order': 'desc'}), [f'STU00{i}' for i in reversed(range(5))])
+        # Ties on the sort key are broken by primary key
+        self.assertEqual(self.walk({'page_size': 2, 'sort_by': 'full_name'}), ['STU000', 'STU002', 'STU004', 'STU001', 'STU003'])
+        self.assertEqual(self.walk({'page_size': 2, 'sort_by': 'full_name', 'sort_order': 'desc'}),
+                         ['STU003', 'STU001', 'STU004', 'STU002', 'STU000'])
+
+    def test_pages_through_null_sort_keys(self):
+        """Test that rows with a NULL sort key are paged after the others in either direction"""
+        logins = {'T1': None, 'T2': datetime(2024, 3, 1, tzinfo=dt_timezone.utc), 'T3': None,
+                  'T4': datetime(2024, 1, 1, tzinfo=dt_timezone.utc), 'T5': None}
+        for teacher_id, last_login in logins.items():
+            Teacher.objects.create(teacher_id=teacher_id, full_name=teacher_id, gender='Male', phone=teacher_id,
+                                   email=f'{teacher_id}@test.com', last_login=last_login)
+
+        for page_size in (1, 2):
+            self.assertEqual(self.walk({'page_size': page_size, 'sort_by': 'last_login'}, 'teacher-list', 'teacher_id'),
+                             ['T4', 'T2', 'T1', 'T3', 'T5'])
+            self.assertEqual(self.walk({'page_size': page_size, 'sort_by': 'last_login', 'sort_order': 'desc'},
+                                       'teacher-list', 'teacher_id'),
+                             ['T2', 'T4', 'T5', 'T3', 'T1'])
+
+        # The page before the first NULL row holds the last non-NULL rows
+        first = self.client.get(reverse('teacher-list'), {'page_size': 2, 'sort_by': 'last_login'})
+        second = self.client.get(first.data['next'])
+        self.assertEqual([row['teacher_id'] for row in second.data['results']], ['T1', 'T3'])
+        previous = self.client.get(second.data['previous'])
+        self.assertEqual([row['teacher_id'] for row in previous.data['results']], ['T4', 'T2'])
+
+    def test_count_is_opt_in(self):
+        """Test that a count is only computed when requested"""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('student-list'))
+        self.assertNotIn('count', response.data)
+        self.assertFalse(any('COUNT(' in query['sql'].upper() for query in queries))
+
+        response = self.client.get(reverse('student-list'), {'include_count': 'true'})
+        self.assertEqual(response.data['count'], 5)
+        self.assertTrue(response.data['count_is_exact'])
+
+class StudentListingQueryTestCase(APITestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(username='admin', password='adminpass123', role='Admin')
+        self.client.force_authenticate(user=self.admin)
+        self.subjects = [Subject.objects.create(subject_id=f'SUB{i}', subject_name=f'Subject {i}', credit=3) for i in range(3)]
+
+    def add_students(self, count):
+        for _ in range(count):
+            index = Student.objects.count()
+            test_class = Class.objects.create(class_id=f'C{index}', class_name=f'Class {index}', department='CS', year=2024)
+            student = create_student(f'STU{index:03d}', test_class, full_name=f'Student {index}')
+            for subject in self.subjects:
+                Enrollment.objects.create(enrollment_id=f'E{index}{subject.pk}', student=student, subject=subject, semester='Fall', year=2024)
+
+    def count_list_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('student-list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return len(queries), response
+
+    def test_query_count_independent_of_page_size(self):
+        """Test that listing students does not issue per-row relation queries"""
+        self.add_students(2)
+        small, _ = self.count_list_queries()
+        self.add_students(8)
+        large, response = self.count_list_queries()
+        self.assertEqual(large, small)
+        row = response.data['results'][0]
+        self.assertEqual(row['class_enrolled_name'], 'Class 0')
+        self.assertEqual(row['subjects'], ['Subject 0', 'Subject 1', 'Subject 2'])
+
+class TeacherScopeTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.teacher = Teacher.objects.create(
+            teacher_id='T001',
+            full_name='Test Teacher',
+            gender='Male',
+            phone='1234567890',
+            email='teacher@test.com'
+        )
+        self.user = User.objects.create_user(username='teacher', password='teachpass123', role='Teacher', teacher_profile=self.teacher)
+        self.client.force_authenticate(user=self.user)
+        self.subject = Subject.objects.create(subject_id='MATH101', subject_name='Calculus', credit=3)
+        self.classes = [Class.objects.create(class_id=f'C{i}', class_name=f'Class {i}', department='CS', year=2024) for i in range(3)]
+        for test_class in self.classes:
+            create_student(f'S{test_class.class_id}', test_class)
+
+    def visible_students(self):
+        response = self.client.get(reverse('student-list'))
+        return sorted(row['student_id'] for row in response.data['results'])
+
+    def test_scope_follows_assignments(self):
+        """Test that teacher visibility tracks subject, class and schedule changes"""
+        self.assertEqual(self.visible_students(), [])
+
+        self.subject.assigned_teachers.add(self.teacher)
+        Schedule.objects.create(
+            schedule_id='SCH1', subject=self.subject, class_enrolled=self.classes[0],
+            day_of_week='Monday', start_time='09:00', end_time='10:00'
+        )
+        self.assertEqual(self.visible_students(), ['SC0'])
+
+        self.teacher.classes.add(self.classes[1])
+        self.assertEqual(self.visible_students(), ['SC0', 'SC1'])
+
+        self.teacher.subjects.remove(self.subject)
+        self.assertEqual(self.visible_students(), ['SC1'])
+
+    def test_scope_is_cached(self):
+        """Test that repeated requests do not recompute the teacher's classes"""
+        self.teacher.classes.add(self.classes[2])
+        self.visible_students()
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.visible_students(), ['SC2'])
+        self.assertFalse(any('schedules' in query['sql'] for query in queries))
+
+class SearchTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        role = Role.objects.create(name='Registrar')
+        for name in ('view_student', 'view_teacher', 'view_subject'):
+            role.permissions.add(Permission.objects.create(name=name))
+        self.user = User.objects.create_user(username='registrar', password='registrar123', role='Admin')
+        self.user.roles.add(role)
+        self.client.force_authenticate(user=self.user)
+
+        test_class = Class.objects.create(class_id='CS101', class_name='Computer Science 101', department='CS', year=2024)
+        for student_id, name in [('STU001', 'Alice Johnson'), ('STU002', 'Alicia Keys'), ('STU003', 'Bob Johnson')]:
+            create_student(student_id, test_class, full_name=name, gender='Female')
+        Teacher.objects.create(teacher_id='T001', full_name='Alan Turing', gender='Male', phone='1', email='alan@test.com')
+        Subject.objects.create(subject_id='MATH101', subject_name='Algebra', credit=3)
+
+    def search(self, **params):
+        response = self.client.get(reverse('search'), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [(row['type'], row['id']) for row in response.data['results']]
+
+    def test_prefix_search_across_kinds(self):
+        """Test that prefixes match students, teachers and subjects"""
+        self.assertEqual(sorted(self.search(q='al')), [
+            ('student', 'STU001'), ('student', 'STU002'), ('subject', 'MATH101'), ('teacher', 'T001'),
+        ])
+        self.assertEqual(self.search(q='ali john'), [('student', 'STU001')])
+        self.assertEqual(self.search(q='al', type='teacher'), [('teacher', 'T001')])
+        self.assertEqual(self.search(q='stu003'), [('student', 'STU003')])
+
+    def test_index_follows_changes(self):
+        """Test that saves and deletes keep the index in sync"""
+        student = Student.objects.get(pk='STU003')
+        student.full_name = 'Robert Johnson'
+        student.save()
+        self.assertEqual(self.search(q='robert'), [('student', 'STU003')])
+        self.assertEqual(self.search(q='bob'), [])
+
+        student.delete()
+        self.assertEqual(self.search(q='robert'), [])
+
+        SearchDocument.objects.all().delete()
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(self.search(q='alan'), [('teacher', 'T001')])
+
+    def test_results_respect_student_scope(self):
+        """Test that students only find themselves"""
+        self.user.role = 'Student'
+        self.user.student_profile_id = 'STU002'
+        self.user.save()
+        self.assertEqual(self.search(q='ali'), [('student', 'STU002')])
+
+    def test_scope_applies_before_the_limit(self):
+        """Test that out-of-scope students ranking higher do not crowd out visible ones"""
+        test_class = Class.objects.create(class_id='CS102', class_name='Computer Science 102', department='CS', year=2024)
+        for i in range(10):
+            create_student(f'STU1{i:02d}', test_class, full_name='Johnson Johnson')
+        self.assertEqual(len(self.search(q='johnson', type='student', limit=3)), 3)
+
+        self.user.role = 'Student'
+        self.user.student_profile_id = 'STU003'
+        self.user.save()
+        self.assertEqual(self.search(q='johnson', limit=1), [('student', 'STU003')])
+
+        self.user.student_profile_id = None
+        self.user.save()
+        self.assertEqual(self.search(q='johnson'), [])
+
+class StudentExportTestCase(APITestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(username='admin', password='adminpass123', role='Admin')
+        self.client.force_authenticate(user=self.admin)
+        test_class = Class.objects.create(class_id='CS101', class_name='Computer Science 101', department='CS', year=2024)
+        for i in range(3):
+            create_student(f'STU00{i}', test_class, full_name=f'Student, {i}')
+        self.expected = (
+            'Student ID,Name,Gender,Class,Academic Year,Status\r\n'
+            + ''.join(f'STU00{i},"Student, {i}",Male,Computer Science 101,2024,Active\r\n' for i in range(3))
+        )
+
+    def test_csv_is_streamed(self):
+        """Test that the CSV export streams one joined query"""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('student-export-csv'))
+            content = b''.join(response.streaming_content).decode()
+        self.assertTrue(response.streaming)
+        self.assertEqual(content, self.expected)
+        # One joined read for the rows, plus the bounded size check for background export
+        reads = [query['sql'] for query in queries if 'students' in query['sql'] and 'COUNT(' not in query['sql'].upper()]
+        self.assertEqual(len(reads), 1)
+
+    def test_gzip_variant(self):
+        """Test that the gzip export decompresses to the same CSV"""
+        response = self.client.get(reverse('student-export-csv'), {'compress': 'gzip'})
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        self.assertIn('students.csv.gz', response['Content-Disposition'])
+        self.assertEqual(gzip.decompress(b''.join(response.streaming_content)).decode(), self.expected)
+
+    def read_workbook(self, response):
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        workbook = openpyxl.load_workbook(BytesIO(b''.join(response.streaming_content)), read_only=True)
+        return [list(row) for row in workbook.active.iter_rows(values_only=True)]
+
+    def test_student_excel_export(self):
+        """Test that the Excel export is written from row tuples"""
+        rows = self.read_workbook(self.client.get(reverse('student-export-excel')))
+        self.assertEqual(rows[0], ['Student ID', 'Name', 'Gender', 'Class', 'Academic Year', 'Status'])
+        self.assertEqual(rows[1], ['STU000', 'Student, 0', 'Male', 'Computer Science 101', 2024, 'Active'])
+        self.assertEqual(len(rows), 4)
+
+    def test_final_grade_excel_report(self):
+        """Test that ?format=excel reaches the final grade report"""
+        subject = Subject.objects.create(subject_id='MATH101', subject_name='Calculus', credit=3)
+        for rank, student in enumerate(Student.objects.order_by('student_id'), start=1):
+            FinalGrade.objects.create(final_grade_id=f'FG{rank}', student=student, subject=subject,
+                                      final_score=90 - rank, final_grade='A', rank=rank, semester='Fall', year=2024)
+        response = self.client.get(reverse('finalgrade-export-report'),
+                                   {'format': 'excel', 'subject_id': 'MATH101', 'semester': 'Fall', 'year': 2024})
+        rows = self.read_workbook(response)
+        self.assertEqual(rows[1], [1, 'STU000', 'Student, 0', 89, 'A'])
+        self.assertEqual(len(rows), 4)
+
+class ExportJobTestCase(APITestCase):
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        media_settings = override_settings(MEDIA_ROOT=media_root.name)
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+
+        self.admin = User.objects.create_user(username='admin', password='adminpass123', role='Admin')
+        self.client.force_authenticate(user=self.admin)
+        test_class = Class.objects.create(class_id='CS101', class_name='Computer Science 101', department='CS', year=2024)
+        for i in range(3):
+            create_student(f'STU00{i}', test_class, full_name=f'Student {i}')
+
+    def test_async_export_can_be_polled_and_downloaded(self):
+        """Test that ?async=true queues a job whose result can be downloaded"""
+        response = self.client.get(reverse('student-export-csv'), {'async': 'true'})
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response['Location'], response.data['url'])
+
+        job = self.client.get(response.data['url']).data
+        self.assertEqual(job['status'], 'Completed')
+        download = self.client.get(job['download_url'])
+        self.assertEqual(download['Content-Type'], 'text/csv')
+        content = b''.join(download.streaming_content).decode()
+        self.assertTrue(content.startswith('Student ID,Name,Gender,Class,Academic Year,Status\r\nSTU000,Student 0'))
+
+        other = User.objects.create_user(username='other', password='otherpass123')
+        self.client.force_authenticate(user=other)
+        self.assertEqual(self.client.get(response.data['url']).status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_large_export_is_queued(self):
+        """Test that exports over the threshold return 202 without asking"""
+        with override_settings(EXPORT_JOBS={'ASYNC_THRESHOLD': 2}):
+            response = self.client.get(reverse('student-export-excel'))
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(ExportJob.objects.get().kind, 'students_excel')
+
+        with override_settings(EXPORT_JOBS={'ASYNC_THRESHOLD': 3}):
+            response = self.client.get(reverse('student-export-excel'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_expired_results_are_purged(self):
+        """Test that expired jobs answer 410 and are removed with their files"""
+        response = self.client.get(reverse('student-export-profile-pdf', kwargs={'pk': 'STU000'}), {'async': '1'})
+        job = ExportJob.objects.get(pk=response.data['id'])
+        path = job.file.path
+        self.assertTrue(os.path.exists(path))
+
+        ExportJob.objects.filter(pk=job.pk).update(expires_at=timezone.now() - timedelta(seconds=1))
+        download = self.client.get(response.data['download_url'])
+        self.assertEqual(download.status_code, status.HTTP_410_GONE)
+
+        call_command('purge_exports', stdout=StringIO())
+        self.assertFalse(ExportJob.objects.exists())
+        self.assertFalse(os.path.exists(path))
+
+class ProfileBatchTestCase(APITestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(username='admin', password='adminpass123', role='Admin')
+        self.client.force_authenticate(user=self.admin)
+        self.subject = Subject.objects.create(subject_id='MATH101', subject_name='Calculus', credit=3)
+        self.classes = [Class.objects.create(class_id=f'C{i}', class_name=f'Class {i}', department='CS', year=2024) for i in range(2)]
+
+    def add_students(self, test_class, count):
+        for _ in range(count):
+            index = Student.objects.count()
+            student = create_student(f'STU{index:03d}', test_class, full_name=f'Student {index}')
+            Grade.objects.create(grade_id=f'G{index:03d}', student=student, subject=self.subject, score=80 + index, grade='B')
+
+    def export(self, **params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('student-export-profiles'), params)
+            content = b''.join(response.streaming_content)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return content, len(queries)
+
+    def test_class_zip_in_constant_queries(self):
+        """Test that a class-wide ZIP holds one PDF per student and needs few queries"""
+        self.add_students(self.classes[0], 2)
+        self.add_students(self.classes[1], 1)
+        content, small = self.export(class_id='C0')
+        with zipfile.ZipFile(BytesIO(content)) as archive:
+            self.assertEqual(archive.namelist(), ['STU000_profile.pdf', 'STU001_profile.pdf'])
+            self.assertTrue(archive.read('STU000_profile.pdf').startswith(b'%PDF'))
+
+        self.add_students(self.classes[0], 5)
+        _, large = self.export(class_id='C0')
+        self.assertEqual(large, small)
+
+    def test_merged_pdf(self):
+        """Test that output=pdf returns one merged document"""
+        self.add_students(self.classes[0], 2)
+        content, _ = self.export(class_id='C0', output='pdf')
+        self.assertTrue(content.startswith(b'%PDF'))
+
+    @override_settings(PROFILE_PDF_PARALLEL_THRESHOLD=2)
+    def test_command_renders_in_process_pool(self):
+        """Test that the management command renders across worker processes"""
+        self.add_students(self.classes[0], 3)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'profiles.zip')
+            call_command('export_profiles', path, '--class', 'C0', '--workers', '2', stdout=StringIO())
+            with zipfile.ZipFile(path) as archive:
+                self.assertEqual(len(archive.namelist()), 3)
+
+    @override_settings(PROFILE_PDF_WORKERS=4)
+    def test_small_batches_render_in_process(self):
+        """Test that batches under the parallel threshold never start worker processes"""
+        self.add_students(self.classes[0], 3)
+        with mock.patch('university.report_cards.ProcessPoolExecutor') as pool:
+            content, _ = self.export(class_id='C0')
+        pool.assert_not_called()
+        with zipfile.ZipFile(BytesIO(content)) as archive:
+            self.assertEqual(len(archive.namelist()), 3)
+
+class AcademicSummaryTestCase(APITestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(username='admin', password='adminpass123', role='Admin')
+        self.client.force_authenticate(user=self.admin)
+        self.test_class = Class.objects.create(class_id='C1', class_name='Class 1', department='CS', year=2024)
+        self.math = Subject.objects.create(subject_id='MATH101', subject_name='Calculus', credit=3)
+        self.art = Subject.objects.create(subject_id='ART101', subject_name='Drawing', credit=1)
+        self.students = [
+            create_student(f'STU{index:03d}', self.test_class, full_name=f'Student {index}')
+            for index in range(2)
+        ]
+
+    def grade(self, grade_id, student, subject, score):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Grade.objects.create(grade_id=grade_id, student=student, subject=subject, score=score, grade='B')
+
+    def test_gpa_is_credit_weighted_and_maintained(self):
+        """Test that grade changes update the credit-weighted GPA"""
+        student = self.students[0]
+        self.grade('G1', student, self.math, 90)
+        art = self.grade('G2', student, self.art, 50)
+
+        response = self.client.get(reverse('student-gpa', args=[student.pk]))
+        self.assertEqual(response.data['gpa'], 80)
+        self.assertEqual(response.data['total_credits'], 4)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            art.delete()
+        self.assertEqual(StudentAcademicSummary.objects.get(student=student).gpa, 90)
+
+    def test_final_grades_take_precedence_with_term_gpa(self):
+        """Test that final scores replace raw grade means and are split per term"""
+        student = self.students[0]
+        self.grade('G1', student, self.math, 40)
+        with self.captureOnCommitCallbacks(execute=True):
+            FinalGrade.objects.create(final_grade_id='F1', student=student, subject=self.math, final_score=70,
+                                      final_grade='C', semester='Fall', year=2024)
+        summary = StudentAcademicSummary.objects.get(student=student)
+        self.assertEqual(summary.gpa, 70)
+        self.assertEqual(summary.term_gpa, {'Fall 2024': 70})
+
+    def test_rankings_and_rebuild(self):
+        """Test that rankings read the summary table and the rebuild command restores it"""
+        self.grade('G1', self.students[0], self.math, 60)
+        self.grade('G2', self.students[1], self.math, 95)
+        StudentAcademicSummary.objects.all().delete()
+        call_command('rebuild_academic_summaries', stdout=StringIO())
+
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('grade-rankings'))
+        self.assertEqual([row['student_id'] for row in response.data], ['STU001', 'STU000'])
+        self.assertEqual(response.data[0]['gpa'], 95)
+
+    def test_migration_backfills_summaries(self):
+        """Test that the migration creating the table fills it like the live refresh does"""
+        self.grade('G1', self.students[0], self.math, 40)
+        self.grade('G2', self.students[0], self.art, 80)
+        self.grade('G3', self.students[1], self.art, 65)
+        with self.captureOnCommitCallbacks(execute=True):
+            FinalGrade.objects.create(final_grade_id='F1', student=self.students[0], subject=self.math, final_score=70,
+                                      final_grade='C', semester='Fall', year=2024)
+        expected = {row['student_id']: row for row in StudentAcademicSummary.objects.values('student_id', 'gpa', 'total_credits', 'term_gpa')}
+
+        StudentAcademicSummary.objects.all().delete()
+        migration = importlib.import_module('university.migrations.0015_student_academic_summaries')
+        migration.populate_summaries(django_apps, None)
+        backfilled = {row['student_id']: row for row in StudentAcademicSummary.objects.values('student_id', 'gpa', 'total_credits', 'term_gpa')}
+        self.assertEqual(backfilled, expected)
+        self.assertEqual(backfilled['STU000']['gpa'], 72.5)
+
+class ConditionalGetTestCase(APITestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(username='admin', password='adminpass123', role='Admin')
+        self.client.force_authenticate(user=self.admin)
+        self.test_class = Class.objects.create(class_id='C1', class_name='Class 1', department='CS', year=2024)
+        self.subject = Subject.objects.create(subject_id='MATH101', subject_name='Calculus', credit=3)
+        self.students = [
+            create_student(f'STU{index:03d}', self.test_class, full_name=f'Student {index}')
+            for index in range(2)
+        ]
+
+    def revalidate(self, url, etag):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        return response, len(queries)
+
+    def test_unchanged_detail_is_not_modified(self):
+        """Test that a matching If-None-Match gets a 304 from the change stamps alone"""
+        url = reverse('student-profile', args=['STU000'])
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('ETag', response)
+        self.assertNotIn('Last-Modified', response)
+        self.assertIn('Authorization', response['Vary'])
+
+        not_modified, queries = self.revalidate(url, response['ETag'])
+        self.assertEqual(not_modified.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(not_modified['ETag'], response['ETag'])
+        self.assertEqual(queries, 1)
+
+    def test_child_rows_change_only_their_parent(self):
+        """Test that a grade changes its student's ETag and leaves other students alone"""
+        urls = [reverse('student-detail', args=[student.pk]) for student in self.students]
+        etags = [self.client.get(url)['ETag'] for url in urls]
+
+        Grade.objects.create(grade_id='G1', student=self.students[0], subject=self.subject, score=80, grade='B')
+        self.assertEqual(self.revalidate(urls[0], etags[0])[0].status_code, status.HTTP_200_OK)
+        self.assertEqual(self.revalidate(urls[1], etags[1])[0].status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_list_changes_with_rows_and_user(self):
+        """Test that list ETags change with the data and differ between users"""
+        url = reverse('student-list')
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.revalidate(url, etag)[0].status_code, status.HTTP_304_NOT_MODIFIED)
+
+        other = User.objects.create_user(username='other', password='otherpass123', role='Admin')
+        self.client.force_authenticate(user=other)
+        self.assertEqual(self.revalidate(url, etag)[0].status_code, status.HTTP_200_OK)
+
+        self.client.force_authenticate(user=self.admin)
+        self.test_class.class_name = 'Renamed'
+        self.test_class.save()
+        self.assertEqual(self.revalidate(url, etag)[0].status_code, status.HTTP_200_OK)
+
+    def test_stamps_do_not_depend_on_the_cache(self):
+        """Test that a change made by another worker, with its own cache, still changes the ETag"""
+        url = reverse('student-detail', args=[self.students[0].pk])
+        etag = self.client.get(url)['ETag']
+
+        cache.clear()
+        self.assertEqual(self.revalidate(url, etag)[0].status_code, status.HTTP_304_NOT_MODIFIED)
+        with mock.patch('django.core.cache.cache.set_many'), mock.patch('django.core.cache.cache.set'):
+            Grade.objects.create(grade_id='G1', student=self.students[0], subject=self.subject, score=80, grade='B')
+        self.assertEqual(self.revalidate(url, etag)[0].status_code, status.HTTP_200_OK)
+
+    def test_teacher_scope_changes_etag(self):
+        """Test that a teacher's list ETag changes when their class assignments do"""
+        teacher = Teacher.objects.create(teacher_id='T001', full_name='Test Teacher', gender='Male',
+                                         phone='1234567890', email='teacher@test.com')
+        user = User.objects.create_user(username='teacher', password='teachpass123', role='Teacher', teacher_profile=teacher)
+        self.client.force_authenticate(user=user)
+        url = reverse('student-list')
+        response = self.client.get(url)
+        self.assertEqual(response.data['results'], [])
+
+        teacher.classes.add(self.test_class)
+        response = self.revalidate(url, response['ETag'])[0]
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), 2)
+
+    def test_modified_since_alone_does_not_revalidate(self):
+        """Test that a date-only revalidation always gets the current response"""
+        url = reverse('student-list')
+        self.client.get(url)
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE='Fri, 01 Jan 2100 00:00:00 GMT')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+class StudentImportTestCase(APITestCase):
+    HEADER = 'student_id,full_name,gender,date_of_birth,class_id,academic_year,address\n'
+
+    def setUp(self):
+        role = Role.objects.create(name='Registrar')
+        role.permissions.add(Permission.objects.create(name='add_student'))
+        self.user = User.objects.create_user(username='registrar', password='registrar123', role='Admin')
+        self.user.roles.add(role)
+        self.client.force_authenticate(user=self.user)
+        test_class = Class.objects.create(class_id='C1', class_name='Class 1', department='CS', year=2024)
+        create_student('STU000', test_class, full_name='Existing Student')
+
+    def upload(self, name, content):
+        return self.client.post(reverse('student-import-students'), {'file': SimpleUploadedFile(name, content)}, format='multipart')
+
+    def test_csv_import_reports_failed_rows(self):
+        """Test that valid rows are created in bulk and invalid ones reported by row"""
+        rows = ''.join(f'STU{index:03d},Student {index},Female,2001-02-03,C1,2024,Somewhere\n' for index in range(1, 6))
+        rows += 'STU000,Taken,Male,2000-01-01,C1,2024,Here\n'   # row 7: already exists
+        rows += 'STU001,Again,Male,2000-01-01,C1,2024,Here\n'   # row 8: duplicate in file
+        rows += 'STU100,Bad,Robot,not-a-date,C9,2024,Here\n'    # row 9: invalid fields
+        with mock.patch('university.imports.CHUNK_SIZE', 3), CaptureQueriesContext(connection) as queries:
+            response = self.upload('intake.csv', (self.HEADER + rows).encode())
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['created'], 5)
+        self.assertEqual([error['row'] for error in response.data['errors']], [7, 8, 9])
+        self.assertEqual(set(response.data['errors'][2]['errors']), {'gender', 'date_of_birth', 'class_enrolled'})
+        self.assertEqual(Student.objects.count(), 6)
+        self.assertEqual(SearchDocument.objects.filter(kind='student', object_id='STU003').count(), 1)
+        # No per-row existence checks
+        self.assertLess(sum('FROM "students"' in query['sql'] for query in queries), 5)
+
+    def test_unreadable_tail_keeps_written_chunks_and_reports(self):
+        """Test that a decoding error part-way through reports where reading stopped"""
+        rows = ''.join(f'STU{index:04d},Student {index},Female,2001-02-03,C1,2024,Somewhere\n' for index in range(1, 601))
+        content = (self.HEADER + rows).encode() + b'STU9999,Ren\xe9e,Female,2001-02-03,C1,2024,Somewhere\n'
+        with mock.patch('university.imports.CHUNK_SIZE', 100), \
+                mock.patch('university.imports.dashboard.invalidate_snapshot') as invalidate:
+            response = self.upload('intake.csv', content)
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        created = response.data['created']
+        self.assertGreater(created, 0)
+        self.assertEqual(Student.objects.count(), created + 1)
+        error = response.data['errors'][-1]
+        self.assertEqual(error['row'], created + 2)
+        self.assertIn('file', error['errors'])
+        invalidate.assert_called_once()
+        self.assertTrue(AuditLog.objects.filter(action='CREATE', model_name='Student', details__contains=f'Imported {created} students').exists())
+
+    def test_xlsx_import(self):
+        """Test that Excel uploads are read with export-style headers"""
+        workbook = openpyxl.Workbook()
+        sheet = workbook.active
+        sheet.append(['Student ID', 'Name', 'Gender', 'Date Of Birth', 'Class', 'Academic Year', 'Address'])
+        sheet.append(['STU010', 'Excel Student', 'Other', datetime(2002, 5, 6), 'Class 1', 2024, 'Addr'])
+        buffer = BytesIO()
+        workbook.save(buffer)
+
+        response = self.upload('intake.xlsx', buffer.getvalue())
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Student.objects.get(pk='STU010').class_enrolled_id, 'C1')
+
+    def test_rejects_missing_columns_and_requires_permission(self):
+        """Test that a bad header fails fast and the add_student permission is required"""
+        response = self.upload('intake.csv', b'student_id,full_name\nSTU001,Someone\n')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('Missing columns', response.data['error'])
+
+        self.client.force_authenticate(user=User.objects.create_user(username='plain', password='plain123', role='Admin'))
+        response = self.upload('intake.csv', self.HEADER.encode())
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+class GradeEntryGridTestCase(APITestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(username='admin', password='adminpass123', role='Admin')
+        self.client.force_authenticate(user=self.admin)
+        self.test_class = Class.objects.create(class_id='C1', class_name='Class 1', department='CS', year=2024)
+        self.subject = Subject.objects.create(subject_id='MATH101', subject_name='Calculus', credit=3)
+        self.assessments = [
+            Assessment.objects.create(assessment_id=f'A{index}', name=f'Quiz {index}', subject=self.subject,
+                                      class_enrolled=self.test_class, weight=50, date=f'2024-0{index + 1}-01')
+            for index in range(2)
+        ]
+
+    def add_students(self, count):
+        for _ in range(count):
+            index = Student.objects.count()
+            student = create_student(f'STU{index:03d}', self.test_class, full_name=f'Student {index}')
+            # Every student misses the second assessment
+            Grade.objects.create(grade_id=f'G{index:03d}', student=student, subject=self.subject,
+                                 assessment=self.assessments[0], score=70 + index, grade='C')
+
+    def grid(self, **params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('grade-grade-entry-grid'), {'class_id': 'C1', 'subject_id': 'MATH101', **params})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data, len(queries)
+
+    def test_grid_in_constant_queries(self):
+        """Test that the grid is pivoted from one grade query whatever its size"""
+        self.add_students(2)
+        data, small = self.grid()
+        self.assertEqual(data['grid_data'][1]['grades'], {
+            'A0': {'score': 71, 'grade': 'C', 'remark': None},
+            'A1': None,
+        })
+        self.add_students(4)
+        data, large = self.grid()
+        self.assertEqual(len(data['grid_data']), 6)
+        self.assertEqual(large, small)
+
+    def test_columnar_layout(self):
+        """Test that layout=columnar returns a dense score matrix with nulls for missing cells"""
+        self.add_students(2)
+        data, _ = self.grid(layout='columnar')
+        self.assertEqual(data['assessment_ids'], ['A0', 'A1'])
+        self.assertEqual(data['student_ids'], ['STU000', 'STU001'])
+        self.assertEqual(data['scores'], [[70, None], [71, None]])
+
+    def test_update_grid_bulk_upsert(self):
+        """Test that update_grid inserts and updates cells in bulk and reports bad rows"""
+        self.add_students(3)
+        updates = [
+            {'student_id': 'STU000', 'assessment_id': 'A0', 'score': 95, 'remark': 'Great'},  # update
+            {'student_id': 'STU001', 'assessment_id': 'A1', 'score': 65},                     # insert
+            {'student_id': 'STU002', 'assessment_id': 'A1', 'score': 82},                     # insert
+            {'student_id': 'NOPE', 'assessment_id': 'A1', 'score': 50},
+            {'student_id': 'STU002', 'assessment_id': 'A0', 'score': 'high'},
+        ]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse('grade-update-grid'), {'updates': updates}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual((response.data['created'], response.data['updated'], response.data['failed']), (2, 1, 2))
+        self.assertEqual([error['index'] for error in response.data['errors']], [3, 4])
+        self.assertEqual(Grade.objects.get(student_id='STU000', assessment_id='A0').grade, 'A')
+        inserted = Grade.objects.get(student_id='STU001', assessment_id='A1')
+        self.assertEqual((inserted.grade, inserted.subject_id), ('D', 'MATH101'))
+        self.assertEqual(Grade.objects.filter(grade_id__startswith='G0000').count(), 2)
+        self.assertLess(len(queries), 12)
+        self.assertFalse(any('REGEXP' in query['sql'].upper() for query in queries))
+
+    def test_next_ids_follow_generated_keys(self):
+        """Test that generated keys continue from the highest one and ignore client-chosen keys"""
+        self.add_students(1)
+        for grade_id in ('G000041', 'G9', 'G00004x', 'GX000099', 'FG000500'):
+            Grade.objects.create(grade_id=grade_id, student_id='STU000', subject_id='MATH101', score=50, grade='F')
+        self.assertEqual(next_ids(Grade, 'G', 2), ['G000042', 'G000043'])
+        self.assertEqual(next_ids(Grade, 'FG', 1), ['FG000501'])
+
+        Grade.objects.create(grade_id='G999999', student_id='STU000', subject_id='MATH101', score=50, grade='F')
+        Grade.objects.create(grade_id='G1000004', student_id='STU000', subject_id='MATH101', score=50, grade='F')
+        self.assertEqual(next_ids(Grade, 'G', 1), ['G1000005'])
+
+class GradeBulkCreateTestCase(APITestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(username='admin', password='adminpass123', role='Admin')
+        self.client.force_authenticate(user=self.admin)
+        test_class = Class.objects.create(class_id='C1', class_name='Class 1', department='CS', year=2024)
+        Subject.objects.create(subject_id='MATH101', subject_name='Calculus', credit=3)
+        for index in range(10):
+            create_student(f'STU{index:03d}', test_class, full_name=f'Student {index}')
+
+    def rows(self, count, start=0):
+        return [
+            {'grade_id': f'G{index:03d}', 'student': f'STU{index % 10:03d}', 'subject': 'MATH101', 'score': 80, 'grade': 'B'}
+            for index in range(start, start + count)
+        ]
+
+    def post(self, grades, **extra):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse('grade-bulk-create'), {'grades': grades, **extra}, format='json')
+        return response, len(queries)
+
+    def test_queries_do_not_grow_with_rows(self):
+        """Test that validation and insert take a fixed number of queries"""
+        response, small = self.post(self.rows(2))
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['created'], 2)
+        response, large = self.post(self.rows(20, start=2))
+        self.assertEqual(response.data['created'], 20)
+        self.assertEqual(large, small)
+
+    def test_atomic_mode_rejects_the_batch(self):
+        """Test that by default one invalid row saves nothing and every bad row is reported"""
+        grades = self.rows(3)
+        grades[1]['student'] = 'NOPE'
+        grades[2]['score'] = 150
+        response, _ = self.post(grades)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual([error['index'] for error in response.data['errors']], [1, 2])
+        self.assertIn('student', response.data['errors'][0]['errors'])
+        self.assertFalse(Grade.objects.exists())
+
+    def test_best_effort_mode_saves_valid_rows(self):
+        """Test that best_effort saves the valid rows, including against existing and repeated IDs"""
+        Grade.objects.create(grade_id='G000', student_id='STU000', subject_id='MATH101', score=50, grade='F')
+        grades = self.rows(3) + self.rows(1, start=2)
+        response, _ = self.post(grades, mode='best_effort')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual((response.data['created'], response.data['failed']), (2, 2))
+        self.assertEqual([error['index'] for error in response.data['errors']], [0, 3])
+        self.assertEqual(Grade.objects.count(), 3)
+
+    def test_benchmark_command_rolls_back(self):
+        """Test that the benchmark command runs and leaves no data behind"""
+        out = StringIO()
+        call_command('benchmark_grade_import', '--rows', '50', '--students', '5', stdout=out)
+        self.assertIn('50 grades', out.getvalue())
+        self.assertFalse(Grade.objects.exists())
+
+class CohortFinalGradeTestCase(APITestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(username='admin', password='adminpass123', role='Admin')
+        self.client.force_authenticate(user=self.admin)
+        self.subject = Subject.objects.create(subject_id='MATH101', subject_name='Calculus', credit=3)
+        self.classes = [Class.objects.create(class_id=f'C{i}', class_name=f'Class {i}', department='CS', year=2024) for i in range(2)]
+        for test_class in self.classes:
+            test_class.subjects.add(self.subject)
+        # C0: exam out of 50 (weight 60) and quiz out of 100 (weight 40); C1: one exam
+        Assessment.objects.create(assessment_id='A0', name='Exam', subject=self.subject, class_enrolled=self.classes[0], weight=60, max_score=50)
+        Assessment.objects.create(assessment_id='A1', name='Quiz', subject=self.subject, class_enrolled=self.classes[0], weight=40)
+        Assessment.objects.create(assessment_id='A2', name='Exam', subject=self.subject, class_enrolled=self.classes[1], weight=100)
+
+    def add_student(self, test_class, scores):
+        index = Student.objects.count()
+        student = create_student(f'STU{index:03d}', test_class, full_name=f'Student {index}')
+        for assessment_id, score in scores.items():
+            Grade.objects.create(grade_id=f'G{index:03d}{assessment_id}', student=student, subject=self.subject,
+                                 assessment_id=assessment_id, score=score, grade='B')
+        return student
+
+    def calculate(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse('finalgrade-calculate-final-grades'),
+                                        {'subject_id': 'MATH101', 'semester': 'Fall', 'year': 2024}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data, len(queries)
+
+    def test_weighted_scores_for_the_cohort(self):
+        """Test that final scores weight each class's own assessments and skip missing grades"""
+        full = self.add_student(self.classes[0], {'A0': 45, 'A1': 70})   # (0.9 * 60 + 0.7 * 40) / 100
+        partial = self.add_student(self.classes[0], {'A1': 55})          # quiz only
+        other = self.add_student(self.classes[1], {'A2': 91})
+        self.add_student(self.classes[1], {})                            # no grades, no final grade
+
+        data, _ = self.calculate()
+        results = {row['student']: (round(row['final_score'], 6), row['final_grade']) for row in data['grades']}
+        self.assertEqual(results, {full.pk: (82.0, 'B'), partial.pk: (55.0, 'F'), other.pk: (91.0, 'A')})
+        self.assertEqual(FinalGrade.calculate_final_grade(full, self.subject, 'Fall', 2024)[1], 'B')
+
+    def test_recalculation_upserts_from_two_queries(self):
+        """Test that the engine reads the cohort in two queries and recalculating updates existing rows"""
+        student = self.add_student(self.classes[0], {'A0': 50, 'A1': 100})
+        self.calculate()
+        Grade.objects.filter(student=student, assessment_id='A1').update(score=0)
+        for _ in range(4):
+            self.add_student(self.classes[1], {'A2': 75})
+
+        with self.assertNumQueries(2):
+            grading.compute_final_scores(self.subject)
+        data, _ = self.calculate()
+        self.assertEqual(FinalGrade.objects.count(), 5)
+        self.assertEqual(FinalGrade.objects.get(student=student).final_grade, 'D')
+        self.assertEqual(len(data['grades']), 5)
+
+    def test_concurrent_save_conflicts(self):
+        """Test that a final grade ID taken while saving gives a 409 and writes nothing"""
+        student = self.add_student(self.classes[1], {'A2': 75})
+        FinalGrade.objects.create(final_grade_id='FG999', student=student, subject=self.subject,
+                                  semester='Spring', year=2024, final_score=60, final_grade='D')
+
+        with mock.patch('university.grading.next_ids', return_value=['FG999']):
+            response = self.client.post(reverse('finalgrade-calculate-final-grades'),
+                                        {'subject_id': 'MATH101', 'semester': 'Fall', 'year': 2024}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertFalse(FinalGrade.objects.filter(semester='Fall').exists())
+
+    def ranks(self, **options):
+        FinalGrade.calculate_ranks(self.subject, 'Fall', 2024, **options)
+        return list(FinalGrade.objects.order_by('student_id').values_list('rank', flat=True))
+
+    def test_rank_tie_modes(self):
+        """Test competition, dense and ordinal ranking of tied final scores"""
+        for score in (80, 90, 80, 70):
+            self.add_student(self.classes[1], {'A2': score})
+        self.calculate()
+
+        self.assertEqual(self.ranks(), [2, 1, 2, 4])
+        self.assertEqual(self.ranks(tie_mode='dense'), [2, 1, 2, 3])
+        self.assertEqual(self.ranks(tie_mode='ordinal'), [2, 1, 3, 4])
+        with self.assertRaises(ValueError):
+            FinalGrade.calculate_ranks(self.subject, 'Fall', 2024, tie_mode='olympic')
+
+        response = self.client.post(reverse('finalgrade-calculate-final-grades'),
+                                    {'subject_id': 'MATH101', 'semester': 'Fall', 'year': 2024, 'tie_mode': 'olympic'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_rank_per_class(self):
+        """Test that per-class ranking partitions the subject's final grades by class"""
+        self.add_student(self.classes[0], {'A0': 50, 'A1': 100})
+        self.add_student(self.classes[0], {'A0': 25, 'A1': 50})
+        self.add_student(self.classes[1], {'A2': 75})
+        self.add_student(self.classes[1], {'A2': 95})
+        self.calculate()
+
+        self.assertEqual(self.ranks(), [1, 4, 3, 2])
+        self.assertEqual(self.ranks(per_class=True), [1, 2, 2, 1])
+
+    def test_rank_query_count_is_constant(self):
+        """Test that ranking takes the same number of queries however many students are ranked"""
+        def count_queries(students):
+            FinalGrade.objects.all().delete()
+            for _ in range(students):
+                self.add_student(self.classes[1], {'A2': 60 + Student.objects.count()})
+            grading.save_final_grades(self.subject, 'Fall', 2024, grading.compute_final_scores(self.subject))
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(FinalGrade.calculate_ranks(self.subject, 'Fall', 2024), FinalGrade.objects.count())
+            with self.assertNumQueries(1):
+                self.assertEqual(FinalGrade.calculate_ranks(self.subject, 'Fall', 2024), 0)
+            return len(queries)
+
+        self.assertEqual(count_queries(3), count_queries(30))
+
 class ValidationTestCase(TestCase):
     def test_student_id_uniqueness(self):
         """Test that student IDs must be unique"""
@@ -0,0 +1,138 @@
+"""
+Login attempt throttling.
+
+Failed logins are counted per client IP and per submitted username/email in
+the shared cache using a sliding-window counter: the current fixed window's
+count plus the previous window's count weighted by how much of it still
+overlaps the sliding window. ``check`` only reads those counters, so an
+over-limit attempt is rejected before any user lookup or password hashing.
+
+Individual failures are not audited. Instead, the first failure for an
+identifier opens a summary period; the next failure after it closes is
+reported together with everything collapsed in between.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+DEFAULTS = {
+    'WINDOW': 300,
+    'IP_LIMIT': 20,
+    'IDENTIFIER_LIMIT': 5,
+    'SUMMARY_INTERVAL': 300,
+}
+
+STAT_NAMES = ('allowed', 'rejected', 'failures', 'successes', 'summaries')
+
+
+def _incr(key, timeout):
+    if cache.add(key, 1, timeout):
+        return 1
+    try:
+        return cache.incr(key)
+    except ValueError:
+        # Expired between add() and incr()
+        cache.set(key, 1, timeout)
+        return 1
+
+
+class LoginThrottle:
+    def __init__(self, window=300, ip_limit=20, identifier_limit=5, summary_interval=300):
+        self.window = window
+        self.limits = {'ip': ip_limit, 'identifier': identifier_limit}
+        self.summary_interval = summary_interval
+
+    @classmethod
+    def from_settings(cls):
+        config = {**DEFAULTS, **getattr(settings, 'LOGIN_THROTTLE', {})}
+        return cls(
+            window=config['WINDOW'],
+            ip_limit=config['IP_LIMIT'],
+            identifier_limit=config['IDENTIFIER_LIMIT'],
+            summary_interval=config['SUMMARY_INTERVAL'],
+        )
+
+    @staticmethod
+    def normalize(identifier):
+        return (identifier or '').strip().lower()
+
+    def _key(self, scope, value, window_index):
+        return f'login:{scope}:{value}:{window_index}'
+
+    def _scopes(self, ip, identifier):
+        scopes = [('identifier', self.normalize(identifier))]
+        if ip:
+            scopes.append(('ip', ip))
+        return scopes
+
+    def check(self, ip, identifier):
+        """
+        Return ``None`` if the attempt may proceed, otherwise the number of
+        seconds the client should wait before retrying.
+        """
+        now = time.time()
+        current = int(now // self.window)
+        elapsed = (now % self.window) / self.window
+
+        keys = {}
+        for scope, value in self._scopes(ip, identifier):
+            keys[scope] = (self._key(scope, value, current), self._key(scope, value, current - 1))
+        counts = cache.get_many([key for pair in keys.values() for key in pair])
+
+        for scope, (current_key, previous_key) in keys.items():
+            estimate = counts.get(current_key, 0) + counts.get(previous_key, 0) * (1 - elapsed)
+            if estimate >= self.limits[scope]:
+                self._stat('rejected')
+                self._pending(identifier, 'blocked')
+                return max(1, int(self.window * (1 - elapsed)))
+
+        self._stat('allowed')
+        return None
+
+    def record_failure(self, ip, identifier):
+        """
+        Count a failed attempt. Returns a summary dict when a summary audit
+        record is due, otherwise ``None``.
+        """
+        current = int(time.time() // self.window)
+        for scope, value in self._scopes(ip, identifier):
+            _incr(self._key(scope, value, current), self.window * 2)
+        self._stat('failures')
+        self._pending(identifier, 'failed')
+        return self._take_summary(ip, identifier)
+
+    def record_success(self, identifier):
+        current = int(time.time() // self.window)
+        value = self.normalize(identifier)
+        cache.delete_many([self._key('identifier', value, current), self._key('identifier', value, current - 1)])
+        self._stat('successes')
+
+    def _pending(self, identifier, kind):
+        _incr(f'login:pending:{kind}:{self.normalize(identifier)}', self.summary_interval * 2)
+
+    def _take_summary(self, ip, identifier):
+        value = self.normalize(identifier)
+        if not cache.add(f'login:summary:{value}', 1, self.summary_interval):
+            return None
+        pending_keys = [f'login:pending:failed:{value}', f'login:pending:blocked:{value}']
+        pending = cache.get_many(pending_keys)
+        cache.delete_many(pending_keys)
+        self._stat('summaries')
+        return {
+            'identifier': identifier,
+            'ip': ip,
+            'failed': pending.get(pending_keys[0], 0),
+            'blocked': pending.get(pending_keys[1], 0),
+        }
+
+    def _stat(self, name):
+        _incr(f'login:stats:{name}', None)
+
+    def stats(self):
+        keys = [f'login:stats:{name}' for name in STAT_NAMES]
+        values = cache.get_many(keys)
+        return {name: values.get(key, 0) for name, key in zip(STAT_NAMES, keys)}
+
+
+login_throttle = LoginThrottle.from_settings()
@@ -0,0 +1,113 @@
+"""
+Refresh-token blacklist lookups and pruning.
+
+SimpleJWT checks ``token_blacklist_blacklistedtoken`` on every refresh.
+``BlacklistCache`` keeps the JTIs of unexpired blacklisted tokens in memory
+and catches up incrementally (only rows with a higher primary key than the
+last one seen) at most every ``SYNC_INTERVAL`` seconds. Tokens blacklisted
+through this process are also published to the shared cache immediately,
+so other workers see them without waiting for their next sync.
+
+``prune_expired_tokens`` removes expired outstanding/blacklisted rows in
+small batches so both tables stay proportional to the number of live
+refresh tokens.
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import RefreshToken
+
+BLACKLISTED_KEY = 'jwt:blacklisted:{jti}'
+
+
+class BlacklistCache:
+    def __init__(self, sync_interval=30):
+        self.sync_interval = sync_interval
+        self._expiries = {}
+        self._high_water = 0
+        self._synced_at = None
+        self._lock = threading.Lock()
+
+    def sync(self, force=False):
+        now = time.time()
+        if not force and self._synced_at is not None and now - self._synced_at < self.sync_interval:
+            return
+        with self._lock:
+            rows = (
+                BlacklistedToken.objects.filter(id__gt=self._high_water)
+                .order_by('id')
+                .values_list('id', 'token__jti', 'token__expires_at')
+            )
+            for row_id, jti, expires_at in rows:
+                self._high_water = row_id
+                if expires_at.timestamp() > now:
+                    self._expiries[jti] = expires_at.timestamp()
+            self._expiries = {jti: exp for jti, exp in self._expiries.items() if exp > now}
+            self._synced_at = now
+
+    def add(self, jti, exp):
+        with self._lock:
+            self._expiries[jti] = exp
+        ttl = int(exp - time.time())
+        if ttl > 0:
+            cache.set(BLACKLISTED_KEY.format(jti=jti), True, ttl)
+
+    def contains(self, jti):
+        self.sync()
+        if jti in self._expiries:
+            return True
+        return cache.get(BLACKLISTED_KEY.format(jti=jti), False)
+
+    def reset(self):
+        with self._lock:
+            self._expiries = {}
+            self._high_water = 0
+            self._synced_at = None
+
+
+blacklist_cache = BlacklistCache(
+    sync_interval=getattr(settings, 'TOKEN_BLACKLIST_SYNC_INTERVAL', 30),
+)
+
+
+class CachedBlacklistRefreshToken(RefreshToken):
+    """Refresh token whose blacklist check is served by ``blacklist_cache``."""
+
+    def check_blacklist(self):
+        if blacklist_cache.contains(self.payload[api_settings.JTI_CLAIM]):
+            raise TokenError('Token is blacklisted')
+
+    def blacklist(self):
+        blacklisted = super().blacklist()
+        blacklist_cache.add(self.payload[api_settings.JTI_CLAIM], self.payload['exp'])
+        return blacklisted
+
+
+def prune_expired_tokens(batch_size=1000, pause=0):
+    """
+    Delete expired outstanding tokens (and their blacklist entries) in
+    batches of ``batch_size``. Returns the number of outstanding tokens
+    removed.
+    """
+    pruned = 0
+    while True:
+        ids = list(
+            OutstandingToken.objects.filter(expires_at__lt=timezone.now())
+            .order_by('id')
+            .values_list('id', flat=True)[:batch_size]
+        )
+        if not ids:
+            return pruned
+        with transaction.atomic():
+            BlacklistedToken.objects.filter(token_id__in=ids).delete()
+            OutstandingToken.objects.filter(id__in=ids).delete()
+        pruned += len(ids)
+        if pause:
+            time.sleep(pause)
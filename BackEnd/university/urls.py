@@ -1,17 +1,16 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from rest_framework_simplejwt.views import TokenRefreshView
 from django.views.decorators.csrf import csrf_exempt
 from .views import (
     StudentViewSet, TeacherViewSet, SubjectViewSet,
     ClassViewSet, EnrollmentViewSet, GradeViewSet, PaymentViewSet, ScheduleViewSet, InvoiceViewSet,
-    AssessmentViewSet, FinalGradeViewSet, UserViewSet,
-    login_view, register_view, logout_view, profile_view,
+    AssessmentViewSet, FinalGradeViewSet, UserViewSet, AuditLogViewSet, ExportJobViewSet,
+    login_view, register_view, ClaimsTokenRefreshView, logout_view, profile_view,
     password_reset_request_view, password_reset_confirm_view,
     enable_2fa_view, verify_2fa_view, disable_2fa_view,
     teachers_list_view,
     system_stats_view, system_backup_view, system_settings_view, update_system_settings_view,
-    send_notification_view, system_health_view
+    send_notification_view, system_health_view, search_view
 )
 
 router = DefaultRouter()
@@ -27,6 +26,8 @@ router.register(r'schedules', ScheduleViewSet)
 router.register(r'assessments', AssessmentViewSet)
 router.register(r'final-grades', FinalGradeViewSet)
 router.register(r'users', UserViewSet)
+router.register(r'audit-logs', AuditLogViewSet)
+router.register(r'exports', ExportJobViewSet)
 
 urlpatterns = [
     path('', include(router.urls)),
@@ -37,12 +38,13 @@ urlpatterns = [
     path('auth/register/', register_view, name='register'),
     path('auth/logout/', logout_view, name='logout'),
     path('auth/profile/', profile_view, name='profile'),
-    path('auth/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
+    path('auth/token/refresh/', ClaimsTokenRefreshView.as_view(), name='token_refresh'),
     path('auth/password-reset/', password_reset_request_view, name='password_reset_request'),
     path('auth/password-reset-confirm/', password_reset_confirm_view, name='password_reset_confirm'),
     path('auth/2fa/enable/', enable_2fa_view, name='enable_2fa'),
     path('auth/2fa/verify/', verify_2fa_view, name='verify_2fa'),
     path('auth/2fa/disable/', disable_2fa_view, name='disable_2fa'),
+    path('search/', search_view, name='search'),
     path('admin/system-stats/', system_stats_view, name='system_stats'),
     path('admin/backup/', system_backup_view, name='system_backup'),
     path('admin/settings/', system_settings_view, name='system_settings'),
@@ -2,75 +2,110 @@ from rest_framework import viewsets, status
 from rest_framework.decorators import action, api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.response import Response
-from rest_framework_simplejwt.tokens import RefreshToken
-from rest_framework.exceptions import PermissionDenied
+from rest_framework.renderers import JSONRenderer
+from rest_framework_simplejwt.views import TokenRefreshView
+from rest_framework.exceptions import PermissionDenied, ValidationError
+from django.db import IntegrityError, transaction
 from django.db.models import Sum, Avg, Q, Count, Max
 from django.contrib.auth.models import Group
 from django.contrib.auth import authenticate
-from django.http import HttpResponse
+from django.http import FileResponse
 from django.core.paginator import Paginator
 from django.contrib.auth.decorators import login_required
 from django.utils.decorators import method_decorator
 from django.views.decorators.csrf import csrf_exempt
 from django.shortcuts import render
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
 from django.views.decorators.csrf import csrf_exempt
-import csv
-import openpyxl
 import pyotp
 import qrcode
 from io import BytesIO
+import datetime
 from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import letter
-from reportlab.lib.styles import getSampleStyleSheet
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph
-from .models import Student, Teacher, Subject, Class, Enrollment, Grade, Payment, Schedule, User, Permission, Role, AuditLog, Invoice, Assessment, FinalGrade
+from .models import Student, Teacher, Subject, Class, Enrollment, Grade, Payment, Schedule, User, Permission, Role, AuditLog, Invoice, Assessment, FinalGrade, PasswordResetToken, ExportJob, StudentAcademicSummary, letter_grade, next_ids
 from .serializers import (
     StudentSerializer, TeacherSerializer, SubjectSerializer,
     ClassSerializer, EnrollmentSerializer, GradeSerializer, PaymentSerializer, ScheduleSerializer, InvoiceSerializer,
-    AssessmentSerializer, FinalGradeSerializer, UserSerializer, RoleSerializer, PermissionSerializer
+    AssessmentSerializer, FinalGradeSerializer, UserSerializer, RoleSerializer, PermissionSerializer,
+    AuditLogSerializer, ClaimsTokenRefreshSerializer, ExportJobSerializer
 )
+from .authentication import issue_tokens, revoke_user_tokens, require_permission
+from .conditional import ConditionalGetMixin, conditional_action
+from .rbac import get_teacher_scope
+from .throttling import login_throttle
+from .tokens import CachedBlacklistRefreshToken
+from . import audit, conditional, dashboard, export_jobs, exports, grading, imports, report_cards, search, summaries
 
 def log_audit_action(user, action, model_name, object_id=None, details='', request=None):
     """Helper function to log audit actions"""
     ip_address = request.META.get('REMOTE_ADDR') if request else None
-    user_agent = request.META.get('HTTP_USER_AGENT') if request else None
-
-    AuditLog.objects.create(
-        user=user,
-        action=action,
-        model_name=model_name,
-        object_id=object_id,
-        details=details,
-        ip_address=ip_address,
-        user_agent=user_agent
-    )
+    user_agent = request.META.get('HTTP_USER_AGENT', '') if request else ''
+
+    # Buffered and written in batches off the request path, see audit.py
+    audit.record({
+        'user_id': user.pk if user is not None and user.is_authenticated else None,
+        'action': action,
+        'model_name': model_name,
+        'object_id': object_id,
+        'details': details,
+        'ip_address': ip_address,
+        'user_agent': user_agent,
+        'timestamp': timezone.now(),
+    })
+
+def scope_students(queryset, user):
+    """Restrict a Student queryset to the rows ``user`` may see."""
+    # RBAC: Students can only see their own data, Teachers see their assigned students, Admins see all
+    if user.is_authenticated:
+        if user.role == 'Student':
+            if user.student_profile_id:
+                queryset = queryset.filter(student_id=user.student_profile_id)
+            else:
+                queryset = queryset.none()
+        elif user.role == 'Teacher':
+            if user.teacher_profile_id:
+                # Teachers can see students in classes they teach
+                class_ids = get_teacher_scope(user.teacher_profile_id).class_ids
+                queryset = queryset.filter(class_enrolled_id__in=class_ids)
+            else:
+                queryset = queryset.none()
+        # Admins can see all students
+    # For anonymous users (AllowAny), return all students
+    return queryset
+
+def run_export(request, kind, filename, content_type, writer, respond, queryset=None):
+    """
+    Serve an export within the request via ``respond()``, or for
+    ``?async=true`` and exports over the size threshold queue ``writer`` as a
+    background job and answer 202 with the job's status URL.
+    """
+    wants_async = request.query_params.get('async', '').lower() in ('1', 'true')
+    if request.user.is_authenticated and (wants_async or (queryset is not None and export_jobs.is_large(queryset))):
+        job = export_jobs.submit(kind, filename, content_type, writer, request.user)
+        data = ExportJobSerializer(job, context={'request': request}).data
+        # The action may have negotiated a file renderer; job status is JSON
+        request.accepted_renderer, request.accepted_media_type = JSONRenderer(), JSONRenderer.media_type
+        return Response(data, status=status.HTTP_202_ACCEPTED, headers={'Location': data['url']})
+    return respond()
+
+class EagerLoadingViewSetMixin:
+    """Apply the serializer's declared select_related/prefetch_related plan to the queryset."""
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        serializer_class = self.get_serializer_class()
+        if hasattr(serializer_class, 'setup_eager_loading'):
+            queryset = serializer_class.setup_eager_loading(queryset)
+        return queryset
 
-class StudentViewSet(viewsets.ModelViewSet):
+class StudentViewSet(ConditionalGetMixin, EagerLoadingViewSetMixin, viewsets.ModelViewSet):
     queryset = Student.objects.all()
     serializer_class = StudentSerializer
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
-        queryset = super().get_queryset()
-        user = self.request.user
-
-        # RBAC: Students can only see their own data, Teachers see their assigned students, Admins see all
-        if user.is_authenticated:
-            if user.role == 'Student':
-                if user.student_profile:
-                    queryset = queryset.filter(student_id=user.student_profile.student_id)
-                else:
-                    queryset = queryset.none()
-            elif user.role == 'Teacher':
-                if user.teacher_profile:
-                    # Teachers can see students in classes they teach
-                    teacher_subjects = user.teacher_profile.subjects.all()
-                    class_ids = Schedule.objects.filter(subject__in=teacher_subjects).values_list('class_enrolled', flat=True).distinct()
-                    queryset = queryset.filter(class_enrolled__class_id__in=class_ids)
-                else:
-                    queryset = queryset.none()
-            # Admins can see all students
-        # For anonymous users (AllowAny), return all students
+        queryset = scope_students(super().get_queryset(), self.request.user)
 
         name = self.request.query_params.get('name')
         student_id = self.request.query_params.get('student_id')
@@ -109,10 +144,25 @@ class StudentViewSet(viewsets.ModelViewSet):
         log_audit_action(self.request.user, 'DELETE', 'Student', instance.student_id, f'Deleted student {instance.full_name}', self.request)
         instance.delete()
 
+    @action(detail=False, methods=['post'], url_path='import', permission_classes=[IsAuthenticated, require_permission('add_student')])
+    def import_students(self, request):
+        """Create students from an uploaded CSV/XLSX ``file``; reports the rows that failed."""
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({'error': 'A CSV or Excel file is required'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            report = imports.import_students(upload)
+        except ValueError as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+        log_audit_action(request.user, 'CREATE', 'Student', None,
+                         f"Imported {report['created']} students from {upload.name} ({report['failed']} rows failed)", request)
+        return Response(report, status=status.HTTP_201_CREATED if report['created'] else status.HTTP_400_BAD_REQUEST)
+
     @action(detail=True, methods=['get'])
     def grades(self, request, pk=None):
         student = self.get_object()
-        grades = Grade.objects.filter(student=student)
+        grades = GradeSerializer.setup_eager_loading(Grade.objects.filter(student=student))
         serializer = GradeSerializer(grades, many=True)
 
         # Log view action
@@ -121,138 +171,93 @@ class StudentViewSet(viewsets.ModelViewSet):
         return Response(serializer.data)
 
     @action(detail=True, methods=['get'])
+    @conditional_action()
     def gpa(self, request, pk=None):
         student = self.get_object()
-        grades = Grade.objects.filter(student=student)
-        if grades:
-            avg = grades.aggregate(avg_score=Avg('score'))['avg_score']
-            return Response({'gpa': avg})
-        return Response({'gpa': None})
+        summary = StudentAcademicSummary.objects.filter(student=student).first()
+        if summary:
+            return Response({'gpa': summary.gpa, 'total_credits': summary.total_credits, 'term_gpa': summary.term_gpa})
+        return Response({'gpa': None, 'total_credits': 0, 'term_gpa': {}})
 
     @action(detail=True, methods=['get'])
+    @conditional_action(Subject, Assessment)
     def profile(self, request, pk=None):
         student = self.get_object()
-        grades = Grade.objects.filter(student=student)
-        enrollments = Enrollment.objects.filter(student=student)
+        grades = GradeSerializer.setup_eager_loading(Grade.objects.filter(student=student))
+        enrollments = Enrollment.objects.filter(student=student).select_related('subject')
         subjects = [enrollment.subject for enrollment in enrollments]
 
         profile_data = {
             'student': StudentSerializer(student).data,
             'grades': GradeSerializer(grades, many=True).data,
             'subjects': SubjectSerializer(subjects, many=True).data,
-            'gpa': grades.aggregate(avg_score=Avg('score'))['avg_score'] if grades else None,
+            'gpa': StudentAcademicSummary.objects.filter(student=student).values_list('gpa', flat=True).first(),
         }
         return Response(profile_data)
 
     @action(detail=False, methods=['get'], permission_classes=[AllowAny])
     def export_csv(self, request):
-        students = self.get_queryset()
-        response = HttpResponse(content_type='text/csv')
-        response['Content-Disposition'] = 'attachment; filename="students.csv"'
-
-        writer = csv.writer(response)
-        writer.writerow(['Student ID', 'Name', 'Gender', 'Class', 'Academic Year', 'Status'])
-        for student in students:
-            writer.writerow([
-                student.student_id,
-                student.full_name,
-                student.gender,
-                student.class_enrolled.class_name,
-                student.academic_year,
-                student.study_status,
-            ])
-
-        return response
+        queryset = self.get_queryset()
+        fields, header = zip(*exports.STUDENT_COLUMNS)
+        compress = request.query_params.get('compress') == 'gzip'
+        return run_export(
+            request, 'students_csv',
+            'students.csv.gz' if compress else 'students.csv',
+            'application/gzip' if compress else 'text/csv',
+            writer=lambda fileobj: exports.write_csv(fileobj, header, exports.export_rows(queryset, fields), compress),
+            respond=lambda: exports.csv_response('students.csv', header, exports.export_rows(queryset, fields), compress),
+            queryset=queryset,
+        )
 
     @action(detail=False, methods=['get'])
     def export_excel(self, request):
-        students = self.get_queryset()
-        wb = openpyxl.Workbook()
-        ws = wb.active
-        ws.title = "Students"
-
-        ws.append(['Student ID', 'Name', 'Gender', 'Class', 'Academic Year', 'Status'])
-        for student in students:
-            ws.append([
-                student.student_id,
-                student.full_name,
-                student.gender,
-                student.class_enrolled.class_name,
-                student.academic_year,
-                student.study_status,
-            ])
-
-        response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-        response['Content-Disposition'] = 'attachment; filename="students.xlsx"'
-        wb.save(response)
-        return response
+        queryset = self.get_queryset()
+        fields, header = zip(*exports.STUDENT_COLUMNS)
+        return run_export(
+            request, 'students_excel', 'students.xlsx', exports.XLSX_CONTENT_TYPE,
+            writer=lambda fileobj: exports.write_xlsx(fileobj, 'Students', header, exports.export_rows(queryset, fields)),
+            respond=lambda: exports.xlsx_response('students.xlsx', 'Students', header, exports.export_rows(queryset, fields)),
+            queryset=queryset,
+        )
 
     @action(detail=True, methods=['get'])
     def export_profile_pdf(self, request, pk=None):
         student = self.get_object()
-        grades = Grade.objects.filter(student=student)
-
-        response = HttpResponse(content_type='application/pdf')
-        response['Content-Disposition'] = f'attachment; filename="{student.student_id}_profile.pdf"'
-
-        doc = SimpleDocTemplate(response, pagesize=letter)
-        styles = getSampleStyleSheet()
-        elements = []
-
-        # Title
-        elements.append(Paragraph(f"Student Profile: {student.full_name}", styles['Title']))
-
-        # Student Info
-        student_info = [
-            ['Student ID', student.student_id],
-            ['Name', student.full_name],
-            ['Gender', student.gender],
-            ['Class', student.class_enrolled.class_name],
-            ['Academic Year', str(student.academic_year)],
-            ['Status', student.study_status],
-        ]
-        student_table = Table(student_info)
-        student_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), (0.8, 0.8, 0.8)),
-            ('TEXTCOLOR', (0, 0), (-1, 0), (0, 0, 0)),
-            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-            ('BACKGROUND', (0, 1), (-1, -1), (0.9, 0.9, 0.9)),
-        ]))
-        elements.append(student_table)
-        elements.append(Paragraph("<br/>", styles['Normal']))
-
-        # Grades
-        if grades:
-            elements.append(Paragraph("Academic Results", styles['Heading2']))
-            grade_data = [['Subject', 'Score', 'Grade', 'Remark']]
-            for grade in grades:
-                grade_data.append([
-                    grade.subject.subject_name,
-                    str(grade.score),
-                    grade.grade,
-                    grade.remark or '',
-                ])
-            grade_table = Table(grade_data)
-            grade_table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), (0.8, 0.8, 0.8)),
-                ('TEXTCOLOR', (0, 0), (-1, 0), (0, 0, 0)),
-                ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-                ('BACKGROUND', (0, 1), (-1, -1), (0.9, 0.9, 0.9)),
-            ]))
-            elements.append(grade_table)
-
-            gpa = grades.aggregate(avg_score=Avg('score'))['avg_score']
-            elements.append(Paragraph(f"GPA: {gpa:.2f}" if gpa else "GPA: N/A", styles['Normal']))
-
-        doc.build(elements)
-        return response
+        grades = Grade.objects.filter(student=student).select_related('subject')
+        filename = f'{student.student_id}_profile.pdf'
+
+        def writer(fileobj):
+            gpa = StudentAcademicSummary.objects.filter(student=student).values_list('gpa', flat=True).first()
+            exports.write_student_profile_pdf(fileobj, student, grades, gpa)
+
+        return run_export(
+            request, 'student_profile_pdf', filename, exports.PDF_CONTENT_TYPE,
+            writer=writer, respond=lambda: exports.pdf_response(filename, writer),
+        )
+
+    @action(detail=False, methods=['get'])
+    def export_profiles(self, request):
+        """Profile PDFs for every student matching the list filters (e.g. ?class_id=), as a ZIP or one merged PDF."""
+        queryset = self.get_queryset()
+        if request.query_params.get('output') == 'pdf':
+            filename, content_type = 'student_profiles.pdf', exports.PDF_CONTENT_TYPE
+
+            def writer(fileobj):
+                report_cards.write_profiles_merged(fileobj, report_cards.load_profiles(queryset))
+        else:
+            filename, content_type = 'student_profiles.zip', exports.ZIP_CONTENT_TYPE
+
+            def writer(fileobj):
+                report_cards.write_profiles_zip(fileobj, report_cards.load_profiles(queryset))
+
+        return run_export(
+            request, 'student_profiles', filename, content_type,
+            writer=writer, respond=lambda: exports.file_response(filename, content_type, writer),
+            queryset=queryset,
+        )
 
 @method_decorator(csrf_exempt, name='dispatch')
-class TeacherViewSet(viewsets.ModelViewSet):
+class TeacherViewSet(ConditionalGetMixin, EagerLoadingViewSetMixin, viewsets.ModelViewSet):
     queryset = Teacher.objects.all()
     serializer_class = TeacherSerializer
     permission_classes = [AllowAny]
@@ -291,7 +296,7 @@ class TeacherViewSet(viewsets.ModelViewSet):
     def subjects(self, request, pk=None):
         try:
             teacher = self.get_object()
-            subjects = teacher.subjects.all()
+            subjects = SubjectSerializer.setup_eager_loading(teacher.subjects.all())
             serializer = SubjectSerializer(subjects, many=True)
             return Response(serializer.data)
         except Exception as e:
@@ -304,7 +309,8 @@ class TeacherViewSet(viewsets.ModelViewSet):
     def schedules(self, request, pk=None):
         try:
             teacher = self.get_object()
-            schedules = Schedule.objects.filter(subject__in=teacher.subjects.all())
+            schedule_ids = get_teacher_scope(teacher.pk).schedule_ids
+            schedules = ScheduleSerializer.setup_eager_loading(Schedule.objects.filter(pk__in=schedule_ids))
             serializer = ScheduleSerializer(schedules, many=True)
             return Response(serializer.data)
         except Exception as e:
@@ -317,10 +323,25 @@ class TeacherViewSet(viewsets.ModelViewSet):
     def activity_log(self, request, pk=None):
         try:
             teacher = self.get_object()
+            try:
+                limit = max(min(int(request.query_params.get('limit', 20)), 200), 1)
+            except ValueError:
+                limit = 20
+
+            # Two bounded reads, each served by its own audit_logs index,
+            # instead of an OR that would fall back to scanning the table.
+            logs = AuditLog.objects.select_related('user').order_by('-timestamp', '-id')
+            entries = list(logs.filter(model_name='Teacher', object_id=teacher.teacher_id)[:limit])
+            account_id = User.objects.filter(teacher_profile=teacher).values_list('id', flat=True).first()
+            if account_id is not None:
+                entries += logs.filter(user_id=account_id)[:limit]
+            entries = sorted({entry.id: entry for entry in entries}.values(), key=lambda entry: (entry.timestamp, entry.id), reverse=True)[:limit]
+
             return Response({
                 'created_at': teacher.created_at,
                 'updated_at': teacher.updated_at,
                 'last_login': teacher.last_login,
+                'activity': AuditLogSerializer(entries, many=True).data,
             })
         except Exception as e:
             import logging
@@ -328,7 +349,7 @@ class TeacherViewSet(viewsets.ModelViewSet):
             logger.error(f"Error in TeacherViewSet.activity_log for teacher {pk}: {str(e)}", exc_info=True)
             raise
 
-class SubjectViewSet(viewsets.ModelViewSet):
+class SubjectViewSet(ConditionalGetMixin, EagerLoadingViewSetMixin, viewsets.ModelViewSet):
     queryset = Subject.objects.all()
     serializer_class = SubjectSerializer
     permission_classes = [IsAuthenticated]
@@ -357,7 +378,7 @@ class SubjectViewSet(viewsets.ModelViewSet):
         except Class.DoesNotExist:
             return Response({'error': 'Class not found'}, status=404)
 
-class ClassViewSet(viewsets.ModelViewSet):
+class ClassViewSet(ConditionalGetMixin, EagerLoadingViewSetMixin, viewsets.ModelViewSet):
     queryset = Class.objects.all()
     serializer_class = ClassSerializer
     permission_classes = [IsAuthenticated]
@@ -398,16 +419,16 @@ class ClassViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=['get'])
     def subjects(self, request, pk=None):
         class_obj = self.get_object()
-        schedules = Schedule.objects.filter(class_enrolled=class_obj)
+        schedules = ScheduleSerializer.setup_eager_loading(Schedule.objects.filter(class_enrolled=class_obj))
         serializer = ScheduleSerializer(schedules, many=True)
         return Response(serializer.data)
 
-class EnrollmentViewSet(viewsets.ModelViewSet):
+class EnrollmentViewSet(ConditionalGetMixin, EagerLoadingViewSetMixin, viewsets.ModelViewSet):
     queryset = Enrollment.objects.all()
     serializer_class = EnrollmentSerializer
     permission_classes = [IsAuthenticated]
 
-class AssessmentViewSet(viewsets.ModelViewSet):
+class AssessmentViewSet(ConditionalGetMixin, EagerLoadingViewSetMixin, viewsets.ModelViewSet):
     queryset = Assessment.objects.all()
     serializer_class = AssessmentSerializer
     permission_classes = [IsAuthenticated]
@@ -424,7 +445,7 @@ class AssessmentViewSet(viewsets.ModelViewSet):
 
         return queryset
 
-class GradeViewSet(viewsets.ModelViewSet):
+class GradeViewSet(ConditionalGetMixin, EagerLoadingViewSetMixin, viewsets.ModelViewSet):
     queryset = Grade.objects.all()
     serializer_class = GradeSerializer
     permission_classes = [IsAuthenticated]
@@ -446,18 +467,36 @@ class GradeViewSet(viewsets.ModelViewSet):
 
     @action(detail=False, methods=['post'])
     def bulk_create(self, request):
-        grades_data = request.data.get('grades', [])
-        created_grades = []
-
-        for grade_data in grades_data:
-            serializer = GradeSerializer(data=grade_data)
-            if serializer.is_valid():
-                grade = serializer.save()
-                created_grades.append(serializer.data)
-            else:
-                return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        """
+        Create many grades at once. ``mode`` is ``atomic`` (default: any invalid
+        row rejects the batch) or ``best_effort`` (valid rows are saved and the
+        invalid ones reported).
+        """
+        mode = request.data.get('mode', 'atomic')
+        if mode not in ('atomic', 'best_effort'):
+            return Response({'error': 'mode must be atomic or best_effort'}, status=status.HTTP_400_BAD_REQUEST)
+
+        serializer = GradeSerializer(
+            data=request.data.get('grades', []), many=True,
+            context={**self.get_serializer_context(), 'best_effort': mode == 'best_effort'},
+        )
+        if not serializer.is_valid():
+            errors = serializer.errors
+            if not isinstance(serializer.initial_data, list):
+                return Response(errors, status=status.HTTP_400_BAD_REQUEST)
+            return Response({
+                'created': 0,
+                'failed': len(errors),
+                'errors': [{'index': index, 'errors': detail} for index, detail in sorted(errors.items())],
+            }, status=status.HTTP_400_BAD_REQUEST)
 
-        return Response(created_grades, status=status.HTTP_201_CREATED)
+        grades = serializer.save()
+        row_errors = serializer.row_errors
+        return Response({
+            'created': len(grades),
+            'failed': len(row_errors),
+            'errors': [{'index': index, 'errors': detail} for index, detail in sorted(row_errors.items())],
+        }, status=status.HTTP_201_CREATED if grades or not row_errors else status.HTTP_400_BAD_REQUEST)
 
     @action(detail=False, methods=['get'])
     def grade_entry_grid(self, request):
@@ -473,90 +512,151 @@ class GradeViewSet(viewsets.ModelViewSet):
         except (Class.DoesNotExist, Subject.DoesNotExist):
             return Response({'error': 'Class or Subject not found'}, status=status.HTTP_404_NOT_FOUND)
 
-        students = Student.objects.filter(class_enrolled=class_obj)
-        assessments = Assessment.objects.filter(subject=subject, class_enrolled=class_obj)
+        roster = list(Student.objects.filter(class_enrolled=class_obj).order_by('student_id').values_list('student_id', 'full_name'))
+        assessments = list(AssessmentSerializer.setup_eager_loading(
+            Assessment.objects.filter(subject=subject, class_enrolled=class_obj).order_by('date', 'assessment_id')
+        ))
+        assessment_ids = [assessment.assessment_id for assessment in assessments]
+
+        # One query for every cell, pivoted in memory; if a cell somehow holds
+        # several grades the last one by grade_id wins.
+        cells = {}
+        grades = (
+            Grade.objects.filter(student__class_enrolled=class_obj, assessment__in=assessment_ids)
+            .order_by('grade_id')
+            .values_list('student_id', 'assessment_id', 'score', 'grade', 'remark')
+        )
+        for student_id, assessment_id, score, grade, remark in grades:
+            cells[student_id, assessment_id] = (score, grade, remark)
+
+        assessment_data = AssessmentSerializer(assessments, many=True).data
+        if request.query_params.get('layout') == 'columnar':
+            # Dense matrix: scores[i][j] is the score of student i on assessment j
+            return Response({
+                'assessments': assessment_data,
+                'assessment_ids': assessment_ids,
+                'student_ids': [student_id for student_id, _ in roster],
+                'student_names': [full_name for _, full_name in roster],
+                'scores': [
+                    [cells[student_id, assessment_id][0] if (student_id, assessment_id) in cells else None
+                     for assessment_id in assessment_ids]
+                    for student_id, _ in roster
+                ],
+            })
 
         grid_data = []
-        for student in students:
+        for student_id, full_name in roster:
             student_grades = {}
-            for assessment in assessments:
-                try:
-                    grade = Grade.objects.get(student=student, assessment=assessment)
-                    student_grades[assessment.assessment_id] = {
-                        'score': grade.score,
-                        'grade': grade.grade,
-                        'remark': grade.remark
-                    }
-                except Grade.DoesNotExist:
-                    student_grades[assessment.assessment_id] = None
+            for assessment_id in assessment_ids:
+                cell = cells.get((student_id, assessment_id))
+                student_grades[assessment_id] = {'score': cell[0], 'grade': cell[1], 'remark': cell[2]} if cell else None
 
             grid_data.append({
-                'student_id': student.student_id,
-                'student_name': student.full_name,
+                'student_id': student_id,
+                'student_name': full_name,
                 'grades': student_grades
             })
 
         return Response({
-            'assessments': AssessmentSerializer(assessments, many=True).data,
+            'assessments': assessment_data,
             'grid_data': grid_data
         })
 
     @action(detail=False, methods=['post'])
     def update_grid(self, request):
+        """
+        Upsert grade entry grid cells ({student_id, assessment_id, score,
+        remark}) in one transaction; rows that cannot be applied are reported.
+        """
         updates = request.data.get('updates', [])
-
-        for update in updates:
-            student_id = update.get('student_id')
-            assessment_id = update.get('assessment_id')
-            score = update.get('score')
-            remark = update.get('remark', '')
-
+        if not isinstance(updates, list):
+            return Response({'error': 'updates must be a list'}, status=status.HTTP_400_BAD_REQUEST)
+
+        rows = [update if isinstance(update, dict) else {} for update in updates]
+        students = Student.objects.in_bulk({str(row.get('student_id')) for row in rows if row.get('student_id')})
+        assessments = Assessment.objects.in_bulk({str(row.get('assessment_id')) for row in rows if row.get('assessment_id')})
+
+        errors = []
+        cells = {}  # (student, assessment) -> (score, remark); the last update of a cell wins
+        for index, row in enumerate(rows):
+            student_id, assessment_id = row.get('student_id'), row.get('assessment_id')
+            row_errors = {}
+            if str(student_id) not in students:
+                row_errors['student_id'] = ['Student not found.']
+            if str(assessment_id) not in assessments:
+                row_errors['assessment_id'] = ['Assessment not found.']
             try:
-                student = Student.objects.get(student_id=student_id)
-                assessment = Assessment.objects.get(assessment_id=assessment_id)
-
-                grade, created = Grade.objects.get_or_create(
-                    student=student,
-                    assessment=assessment,
-                    defaults={'score': score, 'remark': remark}
-                )
-
-                if not created:
-                    grade.score = score
-                    grade.remark = remark
-                    grade.save()
-
-                # Calculate letter grade
-                if score >= 90:
-                    grade.grade = 'A'
-                elif score >= 80:
-                    grade.grade = 'B'
-                elif score >= 70:
-                    grade.grade = 'C'
-                elif score >= 60:
-                    grade.grade = 'D'
-                else:
-                    grade.grade = 'F'
-                grade.save()
-
-            except (Student.DoesNotExist, Assessment.DoesNotExist):
+                score = float(row.get('score'))
+            except (TypeError, ValueError):
+                row_errors['score'] = ['A valid number is required.']
+            else:
+                if score < 0 or score > 100:
+                    row_errors['score'] = ['Score must be between 0 and 100.']
+            if row_errors:
+                errors.append({'index': index, 'student_id': student_id, 'assessment_id': assessment_id, 'errors': row_errors})
                 continue
+            cells[str(student_id), str(assessment_id)] = (score, row.get('remark', ''))
+
+        existing = {}
+        if cells:
+            grades = Grade.objects.filter(
+                student_id__in={student_id for student_id, _ in cells},
+                assessment_id__in={assessment_id for _, assessment_id in cells},
+            ).order_by('grade_id')
+            for grade in grades:
+                existing[grade.student_id, grade.assessment_id] = grade
+
+        created, updated = [], []
+        for (student_id, assessment_id), (score, remark) in cells.items():
+            grade = existing.get((student_id, assessment_id))
+            if grade is None:
+                grade = Grade(student_id=student_id, assessment_id=assessment_id, subject_id=assessments[assessment_id].subject_id)
+                created.append(grade)
+            else:
+                updated.append(grade)
+            grade.score = score
+            grade.remark = remark
+            grade.grade = letter_grade(score)
+
+        try:
+            with transaction.atomic():
+                if created:
+                    for grade, grade_id in zip(created, next_ids(Grade, 'G', len(created))):
+                        grade.grade_id = grade_id
+                Grade.objects.bulk_create(created, batch_size=500)
+                Grade.objects.bulk_update(updated, ['score', 'grade', 'remark'], batch_size=500)
+        except IntegrityError:
+            # Grade IDs taken by a concurrent insert; nothing was written
+            return Response({'error': 'The grid changed while saving, please retry'}, status=status.HTTP_409_CONFLICT)
+
+        # bulk_create/bulk_update send no signals
+        summaries.schedule_refresh({grade.student_id for grade in created + updated})
+        conditional.touch_instances(created + updated)
 
-        return Response({'message': 'Grid updated successfully'})
+        return Response({
+            'message': 'Grid updated successfully' if not errors else f'Grid updated with {len(errors)} failed rows',
+            'created': len(created),
+            'updated': len(updated),
+            'failed': len(errors),
+            'errors': errors,
+        }, status=status.HTTP_200_OK if cells or not errors else status.HTTP_400_BAD_REQUEST)
 
     @action(detail=False, methods=['get'])
     def rankings(self, request):
-        students = Student.objects.annotate(avg_score=Avg('grades__score')).order_by('-avg_score')
-        data = [{'student_id': s.student_id, 'name': s.full_name, 'gpa': s.avg_score} for s in students if s.avg_score is not None]
+        summaries = StudentAcademicSummary.objects.filter(gpa__isnull=False).order_by('-gpa', 'student_id')
+        data = [
+            {'student_id': student_id, 'name': full_name, 'gpa': gpa}
+            for student_id, full_name, gpa in summaries.values_list('student_id', 'student__full_name', 'gpa')
+        ]
         return Response(data)
 
     @action(detail=False, methods=['get'])
     def report(self, request):
-        grades = Grade.objects.all()
+        grades = GradeSerializer.setup_eager_loading(Grade.objects.all())
         serializer = GradeSerializer(grades, many=True)
         return Response(serializer.data)
 
-class FinalGradeViewSet(viewsets.ModelViewSet):
+class FinalGradeViewSet(ConditionalGetMixin, EagerLoadingViewSetMixin, viewsets.ModelViewSet):
     queryset = FinalGrade.objects.all()
     serializer_class = FinalGradeSerializer
     permission_classes = [IsAuthenticated]
@@ -566,45 +666,35 @@ class FinalGradeViewSet(viewsets.ModelViewSet):
         subject_id = request.data.get('subject_id')
         semester = request.data.get('semester')
         year = request.data.get('year')
+        tie_mode = request.data.get('tie_mode', 'competition')
+        per_class = str(request.data.get('per_class', '')).lower() in ('1', 'true')
 
         if not subject_id or not semester or not year:
             return Response({'error': 'subject_id, semester, and year are required'}, status=status.HTTP_400_BAD_REQUEST)
+        if tie_mode not in FinalGrade.RANK_FUNCTIONS:
+            return Response({'error': f"tie_mode must be one of {', '.join(FinalGrade.RANK_FUNCTIONS)}"}, status=status.HTTP_400_BAD_REQUEST)
 
         try:
             subject = Subject.objects.get(subject_id=subject_id)
         except Subject.DoesNotExist:
             return Response({'error': 'Subject not found'}, status=status.HTTP_404_NOT_FOUND)
 
-        students = Student.objects.filter(class_enrolled__subjects=subject)
-        calculated_grades = []
-
-        for student in students:
-            result = FinalGrade.calculate_final_grade(student, subject, semester, year)
-            if result:
-                final_score, letter_grade = result
-                final_grade, created = FinalGrade.objects.get_or_create(
-                    student=student,
-                    subject=subject,
-                    semester=semester,
-                    year=year,
-                    defaults={
-                        'final_score': final_score,
-                        'final_grade': letter_grade
-                    }
-                )
-                if not created:
-                    final_grade.final_score = final_score
-                    final_grade.final_grade = letter_grade
-                    final_grade.save()
-
-                calculated_grades.append(FinalGradeSerializer(final_grade).data)
+        results = grading.compute_final_scores(subject)
+        try:
+            saved = grading.save_final_grades(subject, semester, year, results)
+        except IntegrityError:
+            # Final grade IDs or rows taken by a concurrent calculation; nothing was written
+            return Response({'error': 'Final grades changed while saving, please retry'}, status=status.HTTP_409_CONFLICT)
 
         # Calculate rankings
-        FinalGrade.calculate_ranks(subject, semester, year)
+        FinalGrade.calculate_ranks(subject, semester, year, tie_mode=tie_mode, per_class=per_class)
 
+        final_grades = FinalGradeSerializer.setup_eager_loading(
+            FinalGrade.objects.filter(pk__in=[final_grade.pk for final_grade in saved]).order_by('student_id')
+        )
         return Response({
-            'message': f'Calculated final grades for {len(calculated_grades)} students',
-            'grades': calculated_grades
+            'message': f'Calculated final grades for {len(saved)} students',
+            'grades': FinalGradeSerializer(final_grades, many=True).data
         })
 
     @action(detail=False, methods=['get'])
@@ -650,77 +740,40 @@ class FinalGradeViewSet(viewsets.ModelViewSet):
             'pass_rate': round(pass_rate, 2)
         })
 
-    @action(detail=False, methods=['get'])
+    @action(detail=False, methods=['get'], renderer_classes=[JSONRenderer, exports.PDFRenderer, exports.ExcelRenderer])
     def export_report(self, request):
         subject_id = request.query_params.get('subject_id')
         semester = request.query_params.get('semester')
         year = request.query_params.get('year')
         format_type = request.query_params.get('format', 'pdf')
 
-        queryset = FinalGrade.objects.filter(subject_id=subject_id, semester=semester, year=year).order_by('rank')
+        queryset = FinalGrade.objects.filter(subject_id=subject_id, semester=semester, year=year).select_related('student', 'subject').order_by('rank')
 
         if format_type == 'excel':
-            wb = openpyxl.Workbook()
-            ws = wb.active
-            ws.title = "Final Grades Report"
-
-            ws.append(['Rank', 'Student ID', 'Student Name', 'Final Score', 'Final Grade'])
-
-            for fg in queryset:
-                ws.append([
-                    fg.rank,
-                    fg.student.student_id,
-                    fg.student.full_name,
-                    fg.final_score,
-                    fg.final_grade
-                ])
-
-            response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-            response['Content-Disposition'] = f'attachment; filename="final_grades_{subject_id}_{semester}_{year}.xlsx"'
-            wb.save(response)
-            return response
+            fields, header = zip(*exports.FINAL_GRADE_COLUMNS)
+            filename = f'final_grades_{subject_id}_{semester}_{year}.xlsx'
+            return run_export(
+                request, 'final_grades_excel', filename, exports.XLSX_CONTENT_TYPE,
+                writer=lambda fileobj: exports.write_xlsx(fileobj, 'Final Grades Report', header, exports.export_rows(queryset, fields)),
+                respond=lambda: exports.xlsx_response(filename, 'Final Grades Report', header, exports.export_rows(queryset, fields)),
+                queryset=queryset,
+            )
 
         elif format_type == 'pdf':
-            response = HttpResponse(content_type='application/pdf')
-            response['Content-Disposition'] = f'attachment; filename="final_grades_{subject_id}_{semester}_{year}.pdf"'
-
-            doc = SimpleDocTemplate(response, pagesize=letter)
-            styles = getSampleStyleSheet()
-            elements = []
-
-            # Title
-            elements.append(Paragraph(f"Final Grades Report - {semester} {year}", styles['Title']))
-            elements.append(Paragraph(f"Subject: {queryset.first().subject.subject_name if queryset.exists() else 'N/A'}", styles['Heading2']))
-
-            # Table
-            data = [['Rank', 'Student ID', 'Name', 'Final Score', 'Grade']]
-            for fg in queryset:
-                data.append([
-                    str(fg.rank),
-                    fg.student.student_id,
-                    fg.student.full_name,
-                    str(round(fg.final_score, 2)),
-                    fg.final_grade
-                ])
-
-            table = Table(data)
-            table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), (0.8, 0.8, 0.8)),
-                ('TEXTCOLOR', (0, 0), (-1, 0), (0, 0, 0)),
-                ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-                ('BACKGROUND', (0, 1), (-1, -1), (0.9, 0.9, 0.9)),
-            ]))
-            elements.append(table)
-
-            doc.build(elements)
-            return response
+            filename = f'final_grades_{subject_id}_{semester}_{year}.pdf'
+
+            def writer(fileobj):
+                exports.write_final_grades_pdf(fileobj, queryset, semester, year)
+
+            return run_export(
+                request, 'final_grades_pdf', filename, exports.PDF_CONTENT_TYPE,
+                writer=writer, respond=lambda: exports.pdf_response(filename, writer), queryset=queryset,
+            )
 
         else:
             return Response({'error': 'Invalid format. Use "pdf" or "excel"'}, status=status.HTTP_400_BAD_REQUEST)
 
-class PaymentViewSet(viewsets.ModelViewSet):
+class PaymentViewSet(ConditionalGetMixin, EagerLoadingViewSetMixin, viewsets.ModelViewSet):
     queryset = Payment.objects.all()
     serializer_class = PaymentSerializer
     permission_classes = [AllowAny]
@@ -810,7 +863,7 @@ class PaymentViewSet(viewsets.ModelViewSet):
             })
         return Response(data)
 
-class InvoiceViewSet(viewsets.ModelViewSet):
+class InvoiceViewSet(ConditionalGetMixin, EagerLoadingViewSetMixin, viewsets.ModelViewSet):
     queryset = Invoice.objects.all()
     serializer_class = InvoiceSerializer
     permission_classes = [AllowAny]
@@ -830,42 +883,17 @@ class InvoiceViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=['get'])
     def download_pdf(self, request, pk=None):
         invoice = self.get_object()
+        filename = f'invoice_{invoice.invoice_number}.pdf'
 
-        response = HttpResponse(content_type='application/pdf')
-        response['Content-Disposition'] = f'attachment; filename="invoice_{invoice.invoice_number}.pdf"'
-
-        doc = SimpleDocTemplate(response, pagesize=letter)
-        styles = getSampleStyleSheet()
-        elements = []
-
-        # Title
-        elements.append(Paragraph(f"Invoice: {invoice.invoice_number}", styles['Title']))
-
-        # Invoice Info
-        invoice_info = [
-            ['Invoice Number', invoice.invoice_number],
-            ['Student', invoice.student.full_name],
-            ['Student ID', invoice.student.student_id],
-            ['Total Amount', f"${invoice.total_amount}"],
-            ['Issued Date', invoice.issued_date.strftime('%Y-%m-%d')],
-            ['Due Date', invoice.due_date.strftime('%Y-%m-%d')],
-            ['Status', invoice.status],
-        ]
-        invoice_table = Table(invoice_info)
-        invoice_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), (0.8, 0.8, 0.8)),
-            ('TEXTCOLOR', (0, 0), (-1, 0), (0, 0, 0)),
-            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-            ('BACKGROUND', (0, 1), (-1, -1), (0.9, 0.9, 0.9)),
-        ]))
-        elements.append(invoice_table)
-
-        doc.build(elements)
-        return response
+        def writer(fileobj):
+            exports.write_invoice_pdf(fileobj, invoice)
+
+        return run_export(
+            request, 'invoice_pdf', filename, exports.PDF_CONTENT_TYPE,
+            writer=writer, respond=lambda: exports.pdf_response(filename, writer),
+        )
 
-class ScheduleViewSet(viewsets.ModelViewSet):
+class ScheduleViewSet(ConditionalGetMixin, EagerLoadingViewSetMixin, viewsets.ModelViewSet):
     queryset = Schedule.objects.all()
     serializer_class = ScheduleSerializer
     permission_classes = [IsAuthenticated]
@@ -909,7 +937,71 @@ class ScheduleViewSet(viewsets.ModelViewSet):
 
         return Response({'conflicts': conflicts})
 
-class UserViewSet(viewsets.ModelViewSet):
+class AuditLogViewSet(EagerLoadingViewSetMixin, viewsets.ReadOnlyModelViewSet):
+    queryset = AuditLog.objects.all()
+    serializer_class = AuditLogSerializer
+    permission_classes = [IsAuthenticated, require_permission('view_audit_log')]
+
+    @staticmethod
+    def parse_timestamp(name, value):
+        """Parse an ISO datetime or date query parameter, or raise a 400."""
+        try:
+            parsed = parse_datetime(value) or parse_date(value)
+        except ValueError:
+            parsed = None
+        if parsed is None:
+            raise ValidationError({name: 'Enter a valid ISO 8601 date or datetime.'})
+        if not isinstance(parsed, datetime.datetime):
+            parsed = datetime.datetime.combine(parsed, datetime.time.min)
+        return timezone.make_aware(parsed) if timezone.is_naive(parsed) else parsed
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        user_id = self.request.query_params.get('user_id')
+        action = self.request.query_params.get('action')
+        model_name = self.request.query_params.get('model_name')
+        object_id = self.request.query_params.get('object_id')
+        since = self.request.query_params.get('since')
+        until = self.request.query_params.get('until')
+
+        if user_id:
+            try:
+                user_id = int(user_id)
+            except ValueError:
+                raise ValidationError({'user_id': 'A valid integer is required.'})
+            queryset = queryset.filter(user_id=user_id)
+        if action:
+            queryset = queryset.filter(action=action)
+        if model_name:
+            queryset = queryset.filter(model_name=model_name)
+        if object_id:
+            queryset = queryset.filter(object_id=object_id)
+        if since:
+            queryset = queryset.filter(timestamp__gte=self.parse_timestamp('since', since))
+        if until:
+            queryset = queryset.filter(timestamp__lt=self.parse_timestamp('until', until))
+
+        return queryset
+
+class ExportJobViewSet(EagerLoadingViewSetMixin, viewsets.ReadOnlyModelViewSet):
+    queryset = ExportJob.objects.all()
+    serializer_class = ExportJobSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        # Users only see the exports they requested
+        return super().get_queryset().filter(requested_by=self.request.user.pk)
+
+    @action(detail=True, methods=['get'])
+    def download(self, request, pk=None):
+        job = self.get_object()
+        if job.status != 'Completed':
+            return Response({'error': 'Export is not ready', 'status': job.status}, status=status.HTTP_409_CONFLICT)
+        if job.is_expired or not job.file or not job.file.storage.exists(job.file.name):
+            return Response({'error': 'Export has expired'}, status=status.HTTP_410_GONE)
+        return FileResponse(job.file.open('rb'), as_attachment=True, filename=job.filename, content_type=job.content_type)
+
+class UserViewSet(ConditionalGetMixin, EagerLoadingViewSetMixin, viewsets.ModelViewSet):
     queryset = User.objects.all()
     serializer_class = UserSerializer
     permission_classes = [IsAuthenticated]
@@ -962,6 +1054,7 @@ class UserViewSet(viewsets.ModelViewSet):
         user = self.get_object()
         user.is_active = False
         user.save()
+        revoke_user_tokens(user.pk)
         log_audit_action(request.user, 'UPDATE', 'User', user.id, f'Deactivated user {user.username}', request)
         return Response({'message': 'User deactivated successfully'})
 
@@ -988,6 +1081,7 @@ class UserViewSet(viewsets.ModelViewSet):
 
         user.set_password(new_password)
         user.save()
+        revoke_user_tokens(user.pk)
         log_audit_action(request.user, 'UPDATE', 'User', user.id, f'Reset password for user {user.username}', request)
         return Response({'message': 'Password reset successfully'})
 
@@ -1026,20 +1120,17 @@ class UserViewSet(viewsets.ModelViewSet):
         if not self.request.user.has_permission('view_user'):
             return Response({'error': 'Permission denied'}, status=status.HTTP_403_FORBIDDEN)
 
-        total_users = User.objects.count()
-        active_users = User.objects.filter(is_active=True).count()
-        inactive_users = User.objects.filter(is_active=False).count()
-        admin_users = User.objects.filter(role='Admin').count()
-        teacher_users = User.objects.filter(role='Teacher').count()
-        student_users = User.objects.filter(role='Student').count()
+        snapshot = dashboard.get_snapshot()
+        user_stats = snapshot['user_stats']
 
         return Response({
-            'total_users': total_users,
-            'active_users': active_users,
-            'inactive_users': inactive_users,
-            'admin_users': admin_users,
-            'teacher_users': teacher_users,
-            'student_users': student_users
+            'total_users': user_stats['total_users'],
+            'active_users': user_stats['active_users'],
+            'inactive_users': user_stats['inactive_users'],
+            'admin_users': user_stats['admin_count'],
+            'teacher_users': user_stats['teacher_count'],
+            'student_users': user_stats['student_count'],
+            'generated_at': snapshot['generated_at'],
         })
 
 @api_view(['POST'])
@@ -1051,6 +1142,14 @@ def login_view(request):
     if not username or not password:
         return Response({'error': 'Username and password are required'}, status=status.HTTP_400_BAD_REQUEST)
 
+    # Shed brute-force traffic before any user lookup or password hashing
+    ip_address = request.META.get('REMOTE_ADDR')
+    retry_after = login_throttle.check(ip_address, username)
+    if retry_after is not None:
+        response = Response({'error': 'Too many login attempts. Please try again later.'}, status=status.HTTP_429_TOO_MANY_REQUESTS)
+        response['Retry-After'] = str(retry_after)
+        return response
+
     # Try to authenticate by username first, then by email if username contains '@'
     user = None
     if '@' in username:
@@ -1062,16 +1161,17 @@ def login_view(request):
     else:
         user = authenticate(username=username, password=password)
     if user is not None:
-        refresh = RefreshToken.for_user(user)
-        user.last_login_ip = request.META.get('REMOTE_ADDR')
+        login_throttle.record_success(username)
+        tokens = issue_tokens(user)
+        user.last_login_ip = ip_address
         user.save(update_fields=['last_login_ip'])
 
         # Log login action
         log_audit_action(user, 'LOGIN', 'User', str(user.id), f'User {user.username} logged in', request)
 
         return Response({
-            'refresh': str(refresh),
-            'access': str(refresh.access_token),
+            'refresh': tokens['refresh'],
+            'access': tokens['access'],
             'user': {
                 'id': user.id,
                 'username': user.username,
@@ -1082,13 +1182,17 @@ def login_view(request):
             }
         })
     else:
-        # Log failed login attempt
-        try:
-            log_audit_action(None, 'LOGIN', 'User', None, f'Failed login attempt for username: {username}', request)
-        except NameError:
-            pass  # log_audit_action not defined
+        # Repeated failures are collapsed into periodic summary records
+        summary = login_throttle.record_failure(ip_address, username)
+        if summary:
+            log_audit_action(None, 'LOGIN', 'User', None,
+                             f"Failed login attempts for username: {username} "
+                             f"(failed: {summary['failed']}, throttled: {summary['blocked']})", request)
         return Response({'error': 'Invalid credentials'}, status=status.HTTP_401_UNAUTHORIZED)
 
+class ClaimsTokenRefreshView(TokenRefreshView):
+    serializer_class = ClaimsTokenRefreshSerializer
+
 @api_view(['POST'])
 @permission_classes([AllowAny])
 def register_view(request):
@@ -1120,10 +1224,10 @@ def register_view(request):
         last_name=last_name
     )
 
-    refresh = RefreshToken.for_user(user)
+    tokens = issue_tokens(user)
     return Response({
-        'refresh': str(refresh),
-        'access': str(refresh.access_token),
+        'refresh': tokens['refresh'],
+        'access': tokens['access'],
         'user': {
             'id': user.id,
             'username': user.username,
@@ -1140,7 +1244,7 @@ def logout_view(request):
     try:
         refresh_token = request.data.get('refresh')
         if refresh_token:
-            token = RefreshToken(refresh_token)
+            token = CachedBlacklistRefreshToken(refresh_token)
             token.blacklist()
         return Response({'message': 'Successfully logged out'})
     except Exception as e:
@@ -1174,11 +1278,7 @@ def password_reset_request_view(request):
 
     try:
         user = User.objects.get(email=email)
-        # Generate reset token (simplified for demo)
-        from django.utils.crypto import get_random_string
-        reset_token = get_random_string(32)
-        user.reset_token = reset_token
-        user.save()
+        reset_token = PasswordResetToken.issue(user)
 
         # In production, send email here
         print(f"Password reset token for {email}: {reset_token}")
@@ -1196,14 +1296,14 @@ def password_reset_confirm_view(request):
     if not token or not new_password:
         return Response({'error': 'Token and new password are required'}, status=status.HTTP_400_BAD_REQUEST)
 
-    try:
-        user = User.objects.get(reset_token=token)
-        user.set_password(new_password)
-        user.reset_token = None
-        user.save()
-        return Response({'message': 'Password reset successfully'})
-    except User.DoesNotExist:
-        return Response({'error': 'Invalid token'}, status=status.HTTP_400_BAD_REQUEST)
+    user = PasswordResetToken.consume(token)
+    if user is None:
+        return Response({'error': 'Invalid or expired token'}, status=status.HTTP_400_BAD_REQUEST)
+
+    user.set_password(new_password)
+    user.save()
+    revoke_user_tokens(user.pk)
+    return Response({'message': 'Password reset successfully'})
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
@@ -1286,59 +1386,32 @@ def system_stats_view(request):
     # if not request.user.has_permission('view_user'):
     #     return Response({'error': 'Permission denied'}, status=status.HTTP_403_FORBIDDEN)
 
-    # User statistics
-    total_users = User.objects.count()
-    active_users = User.objects.filter(is_active=True).count()
-    admin_count = User.objects.filter(role='Admin').count()
-    teacher_count = User.objects.filter(role='Teacher').count()
-    student_count = User.objects.filter(role='Student').count()
+    # Served from a cached snapshot, see dashboard.py
+    return Response(dashboard.get_snapshot())
 
-    # Student statistics
-    total_students = Student.objects.count()
-    active_students = Student.objects.filter(study_status='Active').count()
-
-    # Teacher statistics
-    total_teachers = Teacher.objects.filter(status='Active').count()
-
-    # Class and subject statistics
-    total_classes = Class.objects.count()
-    total_subjects = Subject.objects.count()
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def search_view(request):
+    """Ranked prefix search over students, teachers and subjects"""
+    query = request.query_params.get('q', '').strip()
+    kinds = [kind for kind in request.query_params.get('type', '').split(',') if kind] or list(search.SOURCES)
+    try:
+        limit = min(max(int(request.query_params.get('limit', 20)), 1), 100)
+    except ValueError:
+        limit = 20
 
-    # Financial statistics
-    total_payments = Payment.objects.filter(status='Paid').aggregate(total=Sum('amount'))['total'] or 0
-    pending_payments = Payment.objects.filter(status='Unpaid').aggregate(total=Sum('amount'))['total'] or 0
+    # Only search the kinds the user may view at all
+    kinds = [kind for kind in kinds if kind in search.SOURCES and request.user.has_permission(f'view_{kind}')]
 
-    # Recent activity
-    recent_users = User.objects.order_by('-date_joined')[:5]
-    recent_students = Student.objects.order_by('-created_at')[:5]
+    # Apply the same row-level scoping as the student listing
+    hits = search.search(query, kinds, limit, scopes={'student': scope_students(Student.objects.all(), request.user)})
 
     return Response({
-        'user_stats': {
-            'total_users': total_users,
-            'active_users': active_users,
-            'admin_count': admin_count,
-            'teacher_count': teacher_count,
-            'student_count': student_count,
-        },
-        'student_stats': {
-            'total_students': total_students,
-            'active_students': active_students,
-        },
-        'teacher_stats': {
-            'total_teachers': total_teachers,
-        },
-        'academic_stats': {
-            'total_classes': total_classes,
-            'total_subjects': total_subjects,
-        },
-        'financial_stats': {
-            'total_payments': float(total_payments),
-            'pending_payments': float(pending_payments),
-        },
-        'recent_activity': {
-            'recent_users': UserSerializer(recent_users, many=True).data,
-            'recent_students': StudentSerializer(recent_students, many=True).data,
-        }
+        'query': query,
+        'results': [
+            {'type': hit['kind'], 'id': hit['object_id'], 'title': hit['title'], 'subtitle': hit['body'], 'score': hit['score']}
+            for hit in hits
+        ],
     })
 
 @api_view(['POST'])
@@ -1424,6 +1497,8 @@ def system_health_view(request):
         'last_backup': '2024-01-15 10:00:00',
         'active_sessions': 127,
         'error_count_24h': 3,
+        'audit_log_writer': audit.writer_stats(),
+        'login_throttle': login_throttle.stats(),
     }
 
     return Response(health_data)